@@ -1,12 +1,12 @@
-from google.cloud import firestore
-import os
 from dotenv import load_dotenv
+from clients import get_db
+from patient_stats import apply_deltas, patient_deltas
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Firestore client
-db = firestore.Client.from_service_account_json(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+db = get_db()
 
 # Sample patient data
 sample_patients = [
@@ -38,8 +38,19 @@ sample_patients = [
     }
 ]
 
-# Add sample data to Firestore
-for patient in sample_patients:
-    doc_ref = db.collection("patients").document(patient["patient_id"])
-    doc_ref.set(patient)
-    print(f"Added patient {patient['patient_id']} to Firestore")
+# Add sample data to Firestore in one batch, with the aggregate counter
+# updates (against any previous version of each patient) in the same commit
+refs = [db.collection("patients").document(patient["patient_id"]) for patient in sample_patients]
+previous = {snapshot.id: snapshot.to_dict() for snapshot in db.get_all(refs) if snapshot.exists}
+batch = db.batch()
+for ref, patient in zip(refs, sample_patients):
+    batch.set(ref, patient)
+    apply_deltas(batch, db, patient_deltas(previous.get(patient["patient_id"]), patient))
+
+try:
+    batch.commit()
+except Exception as e:
+    print(f"Failed to add sample patients: {e}")
+else:
+    for patient in sample_patients:
+        print(f"Added patient {patient['patient_id']} to Firestore")
@@ -0,0 +1,356 @@
+"""Incremental alert engine for patient vitals.
+
+Consumes a stream of patient documents and/or vitals readings, evaluates
+threshold and trend rules with constant-size state per patient, and writes
+de-duplicated, rate-limited alerts to the ``alerts`` collection in batches.
+
+    python alert_engine.py --watch                # follow the patients collection
+    python alert_engine.py vitals.jsonl.gz        # replay {"patient_id", "timestamp", "vitals"} events
+"""
+import sys
+import math
+import time
+import logging
+import operator
+import argparse
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from patient_queries import priority_band
+from patient_table import parse_blood_pressure
+
+logger = logging.getLogger(__name__)
+
+# Thresholds match triage_rules' critical_vitals, plus blood pressure extremes
+THRESHOLD_RULES = [
+    {"name": "hypoxia", "field": "oxygen_saturation", "op": "<", "threshold": 90, "severity": "critical",
+     "message": "SpO2 {value:g}% is below 90%"},
+    {"name": "tachycardia", "field": "heart_rate", "op": ">", "threshold": 120, "severity": "critical",
+     "message": "Heart rate {value:g} bpm is above 120"},
+    {"name": "bradycardia", "field": "heart_rate", "op": "<", "threshold": 40, "severity": "critical",
+     "message": "Heart rate {value:g} bpm is below 40"},
+    {"name": "hyperthermia", "field": "temperature", "op": ">", "threshold": 39.0, "severity": "critical",
+     "message": "Temperature {value:g}°C is above 39°C"},
+    {"name": "hypotension", "field": "systolic", "op": "<", "threshold": 90, "severity": "critical",
+     "message": "Systolic pressure {value:g} mmHg is below 90"},
+    {"name": "hypertensive_crisis", "field": "systolic", "op": ">", "threshold": 180, "severity": "critical",
+     "message": "Systolic pressure {value:g} mmHg is above 180"},
+]
+
+# A trend fires when a vital moved by at least `change` from its extreme within `window` seconds
+TREND_RULES = [
+    {"name": "spo2_falling", "field": "oxygen_saturation", "direction": "falling", "change": 4, "window": 600,
+     "severity": "warning", "message": "SpO2 fell {change:g} points to {value:g}% within {minutes} min"},
+    {"name": "heart_rate_rising", "field": "heart_rate", "direction": "rising", "change": 30, "window": 600,
+     "severity": "warning", "message": "Heart rate rose {change:g} bpm to {value:g} within {minutes} min"},
+    {"name": "systolic_falling", "field": "systolic", "direction": "falling", "change": 30, "window": 900,
+     "severity": "warning", "message": "Systolic pressure fell {change:g} mmHg to {value:g} within {minutes} min"},
+]
+
+_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+_BAND_RANK = {"Low": 0, "Medium": 1, "High": 2}
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def event_time(value):
+    # Event time from epoch seconds or an ISO string; now when missing
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return time.time()
+
+
+def readings(vitals):
+    # Numeric readings from a vitals dict, with blood pressure split in two
+    values = {}
+    for field, value in (vitals or {}).items():
+        if field == "blood_pressure":
+            values["systolic"], values["diastolic"] = parse_blood_pressure(value)
+        else:
+            values[field] = _number(value)
+    return {field: value for field, value in values.items() if not math.isnan(value)}
+
+
+class _Window:
+    """Min and max of one vital over a sliding time window.
+
+    The window is split into a fixed number of buckets, so state stays
+    constant-size however many readings arrive; it covers between
+    (BUCKETS - 1) / BUCKETS of the window and the full window.
+    """
+
+    BUCKETS = 8
+    __slots__ = ("span", "starts", "lows", "highs")
+
+    def __init__(self, window):
+        self.span = window / self.BUCKETS
+        self.starts = [None] * self.BUCKETS
+        self.lows = [math.inf] * self.BUCKETS
+        self.highs = [-math.inf] * self.BUCKETS
+
+    def add(self, t, value):
+        index = int(t // self.span)
+        slot = index % self.BUCKETS
+        start = self.starts[slot]
+        if start is None or start < index:
+            self.starts[slot] = index
+            self.lows[slot] = self.highs[slot] = value
+        elif start == index:
+            if value < self.lows[slot]:
+                self.lows[slot] = value
+            if value > self.highs[slot]:
+                self.highs[slot] = value
+        # Older than the bucket now in this slot: too late to matter
+
+    def extremes(self, t):
+        index = int(t // self.span)
+        low, high = math.inf, -math.inf
+        for slot, start in enumerate(self.starts):
+            if start is not None and index - self.BUCKETS < start <= index:
+                low = min(low, self.lows[slot])
+                high = max(high, self.highs[slot])
+        return low, high
+
+
+class _PatientState:
+    __slots__ = ("windows", "active", "last_alert", "recent", "band")
+
+    def __init__(self, max_per_patient):
+        self.windows = {}
+        self.active = set()
+        self.last_alert = {}
+        self.recent = deque(maxlen=max_per_patient)
+        self.band = None
+
+
+class AlertEngine:
+    """Evaluates alert rules over a stream of vitals; no I/O, single-threaded.
+
+    A rule fires when its condition becomes true and re-arms once it clears
+    (and ``cooldown`` seconds have passed), so a patient who stays hypoxic
+    gets one alert, not one per reading. Non-critical alerts are further
+    limited to ``max_per_patient`` per ``rate_window`` seconds. State for
+    patients idle beyond ``max_patients`` is evicted least-recently-seen first.
+    """
+
+    def __init__(self, threshold_rules=THRESHOLD_RULES, trend_rules=TREND_RULES, cooldown=300.0,
+                 max_per_patient=5, rate_window=600.0, max_patients=100000):
+        self.cooldown = cooldown
+        self.max_per_patient = max_per_patient
+        self.rate_window = rate_window
+        self.max_patients = max_patients
+        self.thresholds = {}
+        for rule in threshold_rules:
+            self.thresholds.setdefault(rule["field"], []).append((rule, _OPERATORS[rule["op"]]))
+        self.trends = {}
+        for rule in trend_rules:
+            self.trends.setdefault(rule["field"], []).append(rule)
+        self._patients = OrderedDict()
+        self.events = 0
+        self.fired = 0
+        self.suppressed = 0
+
+    def _state(self, patient_id):
+        state = self._patients.get(patient_id)
+        if state is None:
+            state = self._patients[patient_id] = _PatientState(self.max_per_patient)
+            if len(self._patients) > self.max_patients:
+                self._patients.popitem(last=False)
+        else:
+            self._patients.move_to_end(patient_id)
+        return state
+
+    def process_vitals(self, patient_id, vitals, timestamp=None, emit=True):
+        """Feed one vitals reading; returns the alerts it raised."""
+        self.events += 1
+        t = event_time(timestamp)
+        state = self._state(patient_id)
+        alerts = []
+        for field, value in readings(vitals).items():
+            for rule, compare in self.thresholds.get(field, ()):
+                self._check(state, patient_id, rule, compare(value, rule["threshold"]), t, emit, alerts,
+                            value=value)
+            for rule in self.trends.get(field, ()):
+                window = state.windows.get(rule["name"])
+                if window is None:
+                    window = state.windows[rule["name"]] = _Window(rule["window"])
+                window.add(t, value)
+                low, high = window.extremes(t)
+                change = high - value if rule["direction"] == "falling" else value - low
+                self._check(state, patient_id, rule, change >= rule["change"], t, emit, alerts,
+                            value=value, change=change, minutes=round(rule["window"] / 60))
+        return alerts
+
+    def process_patient(self, patient, emit=True):
+        """Feed a patient document (e.g. from a change stream); returns the alerts it raised.
+
+        With emit=False state is updated silently, for priming from an initial snapshot.
+        """
+        patient_id = patient.get("patient_id")
+        if not patient_id:
+            return []
+        t = event_time(patient.get("last_updated"))
+        alerts = self.process_vitals(patient_id, patient.get("vitals"), t, emit)
+        state = self._patients[patient_id]
+        band = priority_band(patient.get("triage_score", 0))
+        escalated = band == "High" and (state.band is None or _BAND_RANK[band] > _BAND_RANK[state.band])
+        state.band = band
+        rule = {"name": "priority_escalation", "severity": "critical",
+                "message": "Priority is High (triage score {value:.2f})"}
+        self._check(state, patient_id, rule, escalated, t, emit, alerts, value=patient.get("triage_score", 0))
+        if not escalated:
+            state.active.discard(rule["name"])
+        return alerts
+
+    def _check(self, state, patient_id, rule, firing, t, emit, alerts, **values):
+        name = rule["name"]
+        if not firing:
+            state.active.discard(name)
+            return
+        if name in state.active:
+            return  # Still the same episode
+        state.active.add(name)
+        if t - state.last_alert.get(name, -math.inf) < self.cooldown:
+            self.suppressed += 1
+            return
+        if (rule["severity"] != "critical" and len(state.recent) == state.recent.maxlen
+                and t - state.recent[0] < self.rate_window):
+            self.suppressed += 1
+            return
+        state.last_alert[name] = t
+        state.recent.append(t)
+        if not emit:
+            return
+        self.fired += 1
+        alerts.append({
+            "alert_id": f"{patient_id}-{name}-{int(t)}",  # Stable, so replays overwrite rather than duplicate
+            "patient_id": patient_id,
+            "rule": name,
+            "severity": rule["severity"],
+            "message": rule["message"].format(**values),
+            "value": values.get("value"),
+            "timestamp": datetime.fromtimestamp(t).isoformat(),
+        })
+
+    def stats(self):
+        return {"events": self.events, "fired": self.fired, "suppressed": self.suppressed,
+                "patients": len(self._patients)}
+
+
+class AlertSink:
+    """Writes alerts through a batch_writer.BatchWriter, keyed by alert_id."""
+
+    def __init__(self, writer, db, collection="alerts"):
+        self.writer = writer
+        self.collection = db.collection(collection)
+        self.written = 0
+
+    def write(self, alerts):
+        for alert in alerts:
+            self.writer.set(self.collection.document(alert["alert_id"]), alert)
+            logger.info("Alert for %s: %s", alert["patient_id"], alert["message"],
+                        extra={"fields": {"patient_id": alert["patient_id"], "rule": alert["rule"]}})
+        self.written += len(alerts)
+
+
+def watch_patients(collection, engine, sink):
+    """Follow a patients collection with on_snapshot and alert on changes.
+
+    The initial snapshot only primes per-patient state, so restarting the
+    watcher doesn't re-alert on every existing patient. Returns the watch
+    (call .unsubscribe() to stop).
+    """
+    primed = threading.Event()
+    lock = threading.Lock()  # The engine is single-threaded
+
+    def on_snapshot(docs, changes, read_time):
+        with lock:
+            emit = primed.is_set()
+            for change in changes:
+                if change.type.name != "REMOVED":
+                    sink.write(engine.process_patient(change.document.to_dict(), emit=emit))
+            primed.set()
+
+    return collection.on_snapshot(on_snapshot)
+
+
+def replay(lines, engine, sink):
+    # Events are JSON lines: {"patient_id", "timestamp", "vitals"}
+    import json
+
+    for line in lines:
+        if line.strip():
+            event = json.loads(line)
+            sink.write(engine.process_vitals(event["patient_id"], event.get("vitals"), event.get("timestamp")))
+
+
+class _PrintSink:
+    written = 0
+
+    def write(self, alerts):
+        for alert in alerts:
+            print(f"{alert['timestamp']} {alert['patient_id']} [{alert['severity']}] {alert['message']}")
+        self.written += len(alerts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Raise alerts from patient vitals.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("input", nargs="?", help="Vitals events as JSONL (.gz or - for stdin)")
+    source.add_argument("--watch", action="store_true", help="Follow the patients collection")
+    parser.add_argument("--dry-run", action="store_true", help="Print alerts instead of writing them")
+    parser.add_argument("--cooldown", type=float, default=300.0, help="Seconds before the same alert can repeat")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from clients import get_db
+    from batch_writer import BatchWriter
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    engine = AlertEngine(cooldown=args.cooldown)
+    writer = None
+    if args.dry_run:
+        sink = _PrintSink()
+    else:
+        writer = BatchWriter(get_db())
+        sink = AlertSink(writer, get_db())
+
+    try:
+        if args.watch:
+            watch = watch_patients(get_db().collection("patients"), engine, sink)
+            print("Watching patients for alerts; Ctrl+C to stop", file=sys.stderr)
+            try:
+                while True:
+                    time.sleep(60)
+                    logger.info(f"Alert engine: {engine.stats()}")
+            except KeyboardInterrupt:
+                watch.unsubscribe()
+        else:
+            from ingest import open_input
+
+            start = time.perf_counter()
+            with open_input(args.input) as lines:
+                replay(lines, engine, sink)
+            elapsed = time.perf_counter() - start
+            stats = engine.stats()
+            print(f"{stats['events']} events, {stats['fired']} alerts ({stats['suppressed']} suppressed) "
+                  f"in {elapsed:.1f}s, {stats['events'] / elapsed if elapsed else 0:.0f} events/s", file=sys.stderr)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,19 @@
+import time
+_render_start = time.perf_counter()
+
 import streamlit as st
-from google.cloud import firestore
 from dotenv import load_dotenv
-import os
 import logging
-import pandas as pd
-import time
 from datetime import datetime
-import plotly.express as px
+from clients import get_db
+from patient_sync import PatientCache
+from patient_table import PatientTable
+from patient_queries import fetch_patient_page
+from patient_stats import count_priority_bands, read_stats, save_patient
+from triage_rules import engine as triage_rules
+from symptom_lexicon import lexicon as symptom_lexicon
+from patient_cards import patient_list_html
+from vitals_timeseries import FIELDS as VITAL_SERIES_FIELDS, load_series
 
 # Load environment variables
 load_dotenv()
@@ -20,10 +27,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize Firestore client
+# Firestore client is created once per process and reused by every rerun
 try:
-    db = firestore.Client.from_service_account_json(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
-    logger.info("Firestore client initialized successfully.")
+    db = get_db()
 except Exception as e:
     logger.error(f"Failed to initialize Firestore client: {e}")
     st.error("Failed to initialize Firestore. Please check the logs.")
@@ -145,27 +151,40 @@ with st.sidebar:
     st.markdown("v1.0.0 - SwiftCareAI")
     st.markdown("[Documentation](https://github.com/yourusername/SwiftCareAI)")
     
-    # Auto refresh toggle
+    # Auto refresh toggle; each dashboard panel refreshes on its own interval
     auto_refresh = st.checkbox("Auto-refresh data", value=True)
+    refresh_intervals = {}
     if auto_refresh:
-        refresh_interval = st.slider("Refresh interval (seconds)", 30, 300, 60)
+        with st.expander("Refresh intervals (seconds)"):
+            refresh_intervals = {
+                "metrics": st.slider("Metrics", 5, 300, 30),
+                "patients": st.slider("Patient list", 5, 300, 30),
+                "alerts": st.slider("Alerts", 5, 300, 15),
+                "hospitals": st.slider("Hospital status", 30, 600, 120),
+            }
+
+# Process-wide patient mirror shared by every session and rerun; Firestore
+# reads after the initial load scale with changes, not census size. It loads
+# in the background: dashboard panels only use its version as a change token,
+# so the first page never waits for the whole collection.
+@st.cache_resource
+def get_patient_cache():
+    return PatientCache(db.collection("patients")).start(wait=False)
 
-# Fetch patient data from Firestore
-def fetch_patients():
+# Columnar view of the in-memory mirror: bands and parsed vitals are derived
+# once per data change, and filters and counts run vectorized. Callers need
+# the full census, so this waits for the initial load.
+def fetch_patient_table():
     try:
-        patients_ref = db.collection("patients")
-        patients = patients_ref.stream()
-        patient_list = [patient.to_dict() for patient in patients]
-        
-        # Sort by triage score
-        patient_list.sort(key=lambda x: x.get('triage_score', 0), reverse=True)
-        
-        logger.info(f"Successfully fetched {len(patient_list)} patients")
-        return patient_list
+        cache = get_patient_cache()
+        cache.wait_ready()
+        table = cache.table()
+        logger.info(f"Successfully fetched {len(table)} patients")
+        return table
     except Exception as e:
         logger.error(f"Failed to fetch patients: {e}")
         st.error("Failed to fetch patient data. Please check the logs.")
-        return []
+        return PatientTable.from_patients([])
 
 # Fetch hospital data from Firestore
 def fetch_hospitals():
@@ -178,6 +197,23 @@ def fetch_hospitals():
         st.error("Failed to fetch hospital data. Please check the logs.")
         return []
 
+# Pre-aggregated vitals for one patient: a few chunk documents per view,
+# however many readings the wearables sent
+HISTORY_VIEWS = {
+    "Last 15 minutes (1 s)": ("1s", 15 * 60),
+    "Last 12 hours (1 min)": ("1m", 12 * 3600),
+    "Last 7 days (15 min)": ("15m", 7 * 86400),
+}
+
+def fetch_vitals_series(patient_id, view):
+    resolution, span = HISTORY_VIEWS[view]
+    try:
+        return load_series(db, patient_id, resolution, span)
+    except Exception as e:
+        logger.error(f"Failed to fetch vitals series for {patient_id}: {e}")
+        st.error("Failed to fetch vitals history. Please check the logs.")
+        return None
+
 # Fetch alert data from Firestore
 def fetch_alerts():
     try:
@@ -189,6 +225,46 @@ def fetch_alerts():
         st.error("Failed to fetch alert data. Please check the logs.")
         return []
 
+# Fetch maintained aggregate counters; until they are initialized, counts
+# come from the columnar patient mirror. Priority bands alone don't wait for
+# the mirror to load: server-side count() queries cover them meanwhile.
+def fetch_stats(names=("priority", "symptoms", "hospitals")):
+    try:
+        stats = read_stats(db, names)
+    except Exception as e:
+        logger.error(f"Failed to fetch patient stats: {e}")
+        stats = None
+    if stats is not None:
+        return stats
+
+    stats = {name: {} for name in names}
+    try:
+        needs_table = "symptoms" in names or "hospitals" in names or get_patient_cache().ready
+        table = fetch_patient_table() if needs_table else PatientTable.from_patients([])
+        if "priority" in names:
+            stats["priority"] = table.band_counts() if len(table) else count_priority_bands(db.collection("patients"))
+        if "symptoms" in names:
+            stats["symptoms"] = table.symptom_counts()
+        if "hospitals" in names:
+            stats["hospitals"] = table.hospital_counts()
+    except Exception as e:
+        logger.error(f"Failed to count patients: {e}")
+        st.error("Failed to fetch patient counts. Please check the logs.")
+    return stats
+
+# Run-every interval for a dashboard panel fragment, or None when auto-refresh is off
+def panel_interval(name):
+    return refresh_intervals.get(name) if auto_refresh else None
+
+# Panel data for this session, reloaded only when the panel's version changes
+def panel_data(name, version, load):
+    key = f"panel_{name}"
+    cached = st.session_state.get(key)
+    if cached is None or cached[0] != version:
+        cached = (version, load())
+        st.session_state[key] = cached
+    return cached[1]
+
 # Convert triage score to priority level
 def get_priority_level(score):
     if score > 0.8:
@@ -232,25 +308,15 @@ if page == "Dashboard":
                     "oxygen_saturation": oxygen_saturation
                 }
                 
-                # Calculate initial triage score (simplified example)
-                triage_score = 0.5  # Default medium priority
-                
-                # Convert symptoms to lowercase for case-insensitive matching
-                symptoms_lower = [s.strip().lower() for s in symptoms.split(",")]
-                
-                # High priority conditions
-                high_priority_symptoms = ["chest pain", "chest tightness", "difficulty breathing", "shortness of breath"]
-                if any(symptom in high_priority_symptoms for symptom in symptoms_lower):
-                    triage_score = 0.9  # High priority
-                elif temperature > 39.0 or heart_rate > 120 or oxygen_saturation < 90:
-                    triage_score = 0.9  # High priority
-                elif temperature > 38.0 or heart_rate > 100 or oxygen_saturation < 95:
-                    triage_score = 0.7  # Medium-high priority
+                # Calculate initial triage score with the shared rule engine;
+                # free text is matched against the symptom lexicon
+                entered = [s.strip() for s in symptoms.split(",") if s.strip()]
+                triage_score = triage_rules.score(entered, vitals)
                 
                 # Prepare patient data
                 patient_data = {
                     "patient_id": patient_id,
-                    "symptoms": [s.strip() for s in symptoms.split(",")],
+                    "symptoms": entered,
                     "vitals": vitals,
                     "triage_score": triage_score,
                     "admission_time": datetime.now().isoformat(),
@@ -258,8 +324,11 @@ if page == "Dashboard":
                 }
                 
                 # Add to Firestore
-                db.collection("patients").document(patient_id).set(patient_data)
+                save_patient(db, patient_data)
                 st.success(f"Patient {patient_id} added successfully!")
+                recognized = symptom_lexicon.codes(entered)
+                if recognized:
+                    st.caption(f"Recognized symptoms: {', '.join(recognized)}")
                 
                 # Log the action
                 logger.info(f"New patient added: {patient_id}")
@@ -268,18 +337,21 @@ if page == "Dashboard":
                 logger.error(f"Error adding patient: {e}")
                 st.error(f"Error adding patient: {str(e)}")
     
-    # Auto-refresh functionality
+    # Auto-refresh: each panel is a fragment that reruns on its own timer,
+    # so the form above is never blocked or reset by a refresh
     if auto_refresh:
-        placeholder = st.empty()
-        with placeholder.container():
-            st.info(f"Data auto-refreshes every {refresh_interval} seconds. Last updated: {datetime.now().strftime('%H:%M:%S')}")
+        st.caption(
+            "Panels refresh independently: "
+            + ", ".join(f"{name} every {seconds}s" for name, seconds in refresh_intervals.items())
+        )
     
     # Key metrics row
-    patients = fetch_patients()
-    hospitals = fetch_hospitals()
-    alerts = fetch_alerts()
-    
-    if patients:
+    @st.fragment(run_every=panel_interval("metrics"))
+    def metrics_panel():
+        priority_counts = panel_data("metrics", get_patient_cache().version,
+                                     lambda: fetch_stats(("priority",))["priority"])
+        if not sum(priority_counts.values()):
+            return
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
@@ -288,9 +360,9 @@ if page == "Dashboard":
                 <p>Total Patients</p>
                 <p class="metric-value">%d</p>
             </div>
-            """ % len(patients), unsafe_allow_html=True)
+            """ % sum(priority_counts.values()), unsafe_allow_html=True)
         
-        high_priority = len([p for p in patients if p.get('triage_score', 0) > 0.8])
+        high_priority = priority_counts.get("High", 0)
         with col2:
             st.markdown("""
             <div class="metric-container" style="border-left: 4px solid #e74c3c;">
@@ -299,7 +371,7 @@ if page == "Dashboard":
             </div>
             """ % high_priority, unsafe_allow_html=True)
         
-        medium_priority = len([p for p in patients if 0.5 < p.get('triage_score', 0) <= 0.8])
+        medium_priority = priority_counts.get("Medium", 0)
         with col3:
             st.markdown("""
             <div class="metric-container" style="border-left: 4px solid #f39c12;">
@@ -308,7 +380,7 @@ if page == "Dashboard":
             </div>
             """ % medium_priority, unsafe_allow_html=True)
         
-        low_priority = len([p for p in patients if p.get('triage_score', 0) <= 0.5])
+        low_priority = priority_counts.get("Low", 0)
         with col4:
             st.markdown("""
             <div class="metric-container" style="border-left: 4px solid #2ecc71;">
@@ -317,69 +389,72 @@ if page == "Dashboard":
             </div>
             """ % low_priority, unsafe_allow_html=True)
     
-    # Split screen - Left: Patient List, Right: Alerts & Hospital Status
-    col_left, col_right = st.columns([2, 1])
-    
-    # Left Column - Patient List
-    with col_left:
+    @st.fragment(run_every=panel_interval("patients"))
+    def patient_list_panel():
         st.markdown("### 🚑 Prioritized Patient List")
         
-        if patients:
-            # Filter patients based on sidebar selection
-            filtered_patients = [
-                p for p in patients if get_priority_level(p.get('triage_score', 0)) in priority_filter
-            ]
+        # Cursor-based pagination: ordering, band filters and limit run in
+        # Firestore, so each rerun reads only the page on screen
+        page_size = 50
+        if st.session_state.get("patient_page_filter") != priority_filter:
+            st.session_state.patient_page_filter = list(priority_filter)
+            st.session_state.patient_page_cursors = [None]
+        page_cursors = st.session_state.patient_page_cursors
+        
+        def load_page():
+            try:
+                return fetch_patient_page(db.collection("patients"), priority_filter, page_size, page_cursors[-1])
+            except Exception as e:
+                logger.error(f"Failed to fetch patient page: {e}")
+                st.error("Failed to fetch patient data. Please check the logs.")
+                return [], None
+        
+        # The page is only re-read when the patient mirror reports a change
+        version = (get_patient_cache().version, tuple(priority_filter), len(page_cursors), id(page_cursors[-1]))
+        filtered_patients, next_cursor = panel_data("patients", version, load_page)
+        
+        if filtered_patients:
+            st.caption(f"Page {len(page_cursors)}")
+            # The whole page is one scrollable HTML block built from cached cards
+            st.markdown(patient_list_html(filtered_patients), unsafe_allow_html=True)
             
-            for patient in filtered_patients:
-                triage_score = patient.get('triage_score', 0)
-                priority_level = get_priority_level(triage_score)
-                priority_class = ""
-                
-                if priority_level == "High":
-                    priority_class = "high-priority"
-                elif priority_level == "Medium":
-                    priority_class = "medium-priority"
-                else:
-                    priority_class = "low-priority"
-                
-                st.markdown(f"""
-                <div class="patient-card {priority_class}">
-                    <h3>🆔 Patient ID: {patient.get('patient_id', 'Unknown')}</h3>
-                    <div style="display: flex; justify-content: space-between;">
-                        <div>
-                            <p><strong>Triage Score:</strong> {triage_score:.2f} ({priority_level} Priority)</p>
-                            <p><strong>🩺 Symptoms:</strong> {', '.join(patient.get('symptoms', []))}</p>
-                        </div>
-                        <div>
-                            <p><strong>Vitals:</strong> {', '.join([f"{k}: {v}" for k, v in patient.get('vitals', {}).items()])}</p>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            prev_col, next_col = st.columns(2)
+            with prev_col:
+                if len(page_cursors) > 1 and st.button("Previous page"):
+                    page_cursors.pop()
+                    st.rerun(scope="fragment")
+            with next_col:
+                if next_cursor is not None and st.button(f"Load next {page_size}"):
+                    page_cursors.append(next_cursor)
+                    st.rerun(scope="fragment")
         else:
             st.warning("No patient data found.")
     
-    # Right Column - Alerts & Hospital Status
-    with col_right:
-        # Alerts Section
+    @st.fragment(run_every=panel_interval("alerts"))
+    def alerts_panel():
         st.markdown("### ⚠️ Real-Time Alerts")
         
-        if alerts:
-            for alert in alerts:
-                st.markdown(f"""
+        alerts = fetch_alerts()
+        alerts_html = panel_data("alerts", repr(alerts), lambda: "".join(f"""
                 <div class="alert-card">
                     <p><strong>Patient {alert.get('patient_id', 'Unknown')}</strong></p>
                     <p>{alert.get('message', 'No message')}</p>
                     <small>{alert.get('timestamp', 'Unknown time')}</small>
                 </div>
-                """, unsafe_allow_html=True)
+                """ for alert in alerts))
+        if alerts_html:
+            st.markdown(alerts_html, unsafe_allow_html=True)
         else:
             st.info("No active alerts at this time.")
-        
-        # Hospital Status
+    
+    @st.fragment(run_every=panel_interval("hospitals"))
+    def hospitals_panel():
         st.markdown("### 🏥 Hospital Status")
         
-        if hospitals:
+        hospitals = fetch_hospitals()
+        
+        def build():
+            cards = []
             for hospital in hospitals:
                 capacity = hospital.get('capacity', 0)
                 capacity_color = "#2ecc71"  # Green for good capacity
@@ -389,21 +464,35 @@ if page == "Dashboard":
                 elif capacity > 60:
                     capacity_color = "#f39c12"  # Orange for getting full
                 
-                st.markdown(f"""
+                cards.append(f"""
                 <div style="background-color: #14171f; padding: 15px; border-radius: 10px; margin-bottom: 10px; box-shadow: 0 2px 5px rgba(0,0,0,0.1);">
                     <h4>{hospital.get('name', 'Unknown Hospital')}</h4>
                     <p>Capacity: <span style="color: {capacity_color};">{capacity}%</span></p>
                     <p>Distance: {hospital.get('distance', 'Unknown')} km</p>
                     <p>Specialty: {hospital.get('specialty', 'General')}</p>
                 </div>
-                """, unsafe_allow_html=True)
+                """)
+            return "".join(cards)
+        
+        hospitals_html = panel_data("hospitals", repr(hospitals), build)
+        if hospitals_html:
+            st.markdown(hospitals_html, unsafe_allow_html=True)
         else:
             st.info("No hospital data available.")
     
-    # Auto-refresh functionality
-    if auto_refresh:
-        time.sleep(refresh_interval)
-        st.experimental_rerun()
+    metrics_panel()
+    
+    # Split screen - Left: Patient List, Right: Alerts & Hospital Status
+    col_left, col_right = st.columns([2, 1])
+    
+    # Left Column - Patient List
+    with col_left:
+        patient_list_panel()
+    
+    # Right Column - Alerts & Hospital Status
+    with col_right:
+        alerts_panel()
+        hospitals_panel()
 
 # Patient Details Page
 elif page == "Patient Details":
@@ -447,15 +536,20 @@ elif page == "Patient Details":
                 
                 with tabs[1]:
                     st.subheader("Medical History")
-                    st.info("Medical history would be displayed here in a real application.")
+                    view = st.radio("Vitals history", list(HISTORY_VIEWS), horizontal=True)
+                    series = fetch_vitals_series(patient_id, view)
                     
-                    # Sample medical history chart
-                    history_data = {
-                        'Date': ['2023-01', '2023-04', '2023-07', '2023-10', '2024-01'],
-                        'Blood Pressure': [120, 125, 130, 128, 122]
-                    }
-                    history_df = pd.DataFrame(history_data)
-                    st.line_chart(history_df.set_index('Date'))
+                    if series and series["times"]:
+                        import pandas as pd
+                        
+                        # Per-bucket means, already aggregated when the readings arrived
+                        history_df = pd.DataFrame(
+                            {field.replace("_", " ").title(): series["mean"][field] for field in VITAL_SERIES_FIELDS},
+                            index=[datetime.fromtimestamp(t) for t in series["times"]],
+                        ).dropna(axis=1, how="all")
+                        st.line_chart(history_df)
+                    elif series is not None:
+                        st.info("No vitals readings recorded for this patient in this period.")
                 
                 with tabs[2]:
                     st.subheader("Treatment Plan")
@@ -483,18 +577,18 @@ elif page == "Patient Details":
 
 # Analytics Page
 elif page == "Analytics":
+    # Charting libraries are only needed here; import them on demand
+    import pandas as pd
+    import plotly.express as px
+    
     st.title("📈 Analytics Dashboard")
     
-    patients = fetch_patients()
+    stats = fetch_stats()
     
-    if patients:
+    if sum(stats["priority"].values()):
         # Priority Distribution
         st.subheader("Patient Priority Distribution")
-        priority_counts = {
-            "High": len([p for p in patients if p.get('triage_score', 0) > 0.8]),
-            "Medium": len([p for p in patients if 0.5 < p.get('triage_score', 0) <= 0.8]),
-            "Low": len([p for p in patients if p.get('triage_score', 0) <= 0.5])
-        }
+        priority_counts = {band: stats["priority"].get(band, 0) for band in ("High", "Medium", "Low")}
         
         priority_df = pd.DataFrame({
             'Priority': list(priority_counts.keys()),
@@ -509,16 +603,7 @@ elif page == "Analytics":
         
         # Symptom Distribution
         st.subheader("Common Symptoms")
-        all_symptoms = []
-        for patient in patients:
-            all_symptoms.extend(patient.get('symptoms', []))
-        
-        symptom_counts = {}
-        for symptom in all_symptoms:
-            if symptom in symptom_counts:
-                symptom_counts[symptom] += 1
-            else:
-                symptom_counts[symptom] = 1
+        symptom_counts = stats["symptoms"]
         
         symptom_df = pd.DataFrame({
             'Symptom': list(symptom_counts.keys()),
@@ -530,13 +615,7 @@ elif page == "Analytics":
         
         # Hospital Recommendations
         st.subheader("Hospital Recommendations")
-        hospital_counts = {}
-        for patient in patients:
-            hospital = patient.get('recommended_hospital', 'Unknown')
-            if hospital in hospital_counts:
-                hospital_counts[hospital] += 1
-            else:
-                hospital_counts[hospital] = 1
+        hospital_counts = stats["hospitals"]
         
         hospital_df = pd.DataFrame({
             'Hospital': list(hospital_counts.keys()),
@@ -592,4 +671,6 @@ st.markdown(
     </div>
     """,
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+logger.info(f"{page} page rendered in {(time.perf_counter() - _render_start) * 1000:.0f} ms")
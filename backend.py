@@ -1,106 +1,219 @@
 import os
+import math
+import time
 import logging
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import firebase_admin
-from firebase_admin import credentials, firestore
-import cohere
-import requests
+from clients import get_cohere, get_db, warm_up
+from cache import TTLCache
+from hospital_index import get_index, haversine
+from summary_cache import summary_cache
+from patient_stats import apply_deltas, patient_deltas, save_patient
+from triage_rules import engine as triage_rules
+from metrics import registry as metrics
+from log_setup import configure_logging
+from flow import Flow, Step
+from http_client import CircuitBreaker, CircuitOpenError, HttpClient
+from llm_broker import LLMBroker
+from patient_queries import priority_band
 
 # Load environment variables
 load_dotenv()
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,  # Log level (INFO, DEBUG, WARNING, ERROR, CRITICAL)
-    format="%(asctime)s - %(levelname)s - %(message)s",  # Log format
-    filename="backend.log",  # Log file
-    filemode="a",  # Append mode
-)
+# Set up logging; LOG_MODE=structured moves formatting and file I/O to a
+# background thread and writes sampled, size-capped JSON lines
+if os.getenv("LOG_MODE") == "structured":
+    configure_logging("backend.log", level=os.getenv("LOG_LEVEL", "INFO"))
+else:
+    logging.basicConfig(
+        level=logging.INFO,  # Log level (INFO, DEBUG, WARNING, ERROR, CRITICAL)
+        format="%(asctime)s - %(levelname)s - %(message)s",  # Log format
+        filename="backend.log",  # Log file
+        filemode="a",  # Append mode
+    )
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase only if not already initialized
-try:
-    if not firebase_admin._apps:  # Check if Firebase is not already initialized
-        cred = credentials.Certificate(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
-        firebase_admin.initialize_app(cred)
-        logger.info("Firebase initialized successfully.")
-    else:
-        logger.info("Firebase already initialized.")
-except Exception as e:
-    logger.error(f"Failed to initialize Firebase: {e}")
-    raise
-
-# Initialize Firestore client
-db = firestore.client()
-
-# Initialize Cohere client
-try:
-    co = cohere.Client(os.getenv("COHERE_API_KEY"))
-    logger.info("Cohere client initialized successfully.")
-except Exception as e:
-    logger.error(f"Failed to initialize Cohere client: {e}")
-    raise
+# Firestore and Cohere clients are created lazily by clients.get_db() and
+# clients.get_cohere(); call warm_up() to pay that cost before the first patient
+
+# Expose per-node and per-external-call metrics when a port is configured
+if os.getenv("METRICS_PORT"):
+    metrics.start_http_server(int(os.getenv("METRICS_PORT")))
+
+# Cache of Overpass results keyed by grid cell; hospitals rarely move, so
+# nearby patients share one lookup for up to a day
+HOSPITAL_CACHE_CELL_DEG = float(os.getenv("HOSPITAL_CACHE_CELL_DEG", "0.01"))  # ~1.1 km
+hospital_cache = TTLCache(
+    max_entries=int(os.getenv("HOSPITAL_CACHE_MAX_ENTRIES", "512")),
+    ttl=float(os.getenv("HOSPITAL_CACHE_TTL", "86400")),
+    max_stale=float(os.getenv("HOSPITAL_CACHE_MAX_STALE", "604800")),  # served while Overpass is down
+    path=os.getenv("HOSPITAL_CACHE_PATH", "hospital_cache.sqlite") or None,
+    table="hospitals",
+)
+
+def hospital_cell(latitude, longitude, radius):
+    # Snap a query onto its grid cell. Returns the cache key, the cell centre and
+    # a search radius widened by the cell's half-diagonal so the cached result
+    # covers any point inside the cell.
+    row = math.floor(latitude / HOSPITAL_CACHE_CELL_DEG)
+    col = math.floor(longitude / HOSPITAL_CACHE_CELL_DEG)
+    center_lat = (row + 0.5) * HOSPITAL_CACHE_CELL_DEG
+    center_lon = (col + 0.5) * HOSPITAL_CACHE_CELL_DEG
+    half = HOSPITAL_CACHE_CELL_DEG / 2 * 111320
+    half_diagonal = math.hypot(half, half * math.cos(math.radians(center_lat)))
+    key = f"{HOSPITAL_CACHE_CELL_DEG}:{row}:{col}:{radius}"
+    return key, center_lat, center_lon, int(radius + half_diagonal)
+
+# Shared keep-alive session for Overpass with strict timeouts; after repeated
+# failures the circuit opens and lookups fail fast to cached data
+OVERPASS_URL = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+overpass = HttpClient(
+    "overpass",
+    connect_timeout=float(os.getenv("OVERPASS_CONNECT_TIMEOUT", "3.05")),
+    read_timeout=float(os.getenv("OVERPASS_READ_TIMEOUT", "10")),
+    max_retries=int(os.getenv("OVERPASS_MAX_RETRIES", "2")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("OVERPASS_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("OVERPASS_BREAKER_RESET", "30")),
+    ),
+)
 
 # Function to find hospitals using OpenStreetMap Overpass API
 def find_hospitals(latitude, longitude, radius=5000):
-    overpass_url = "https://overpass-api.de/api/interpreter"
+    key, latitude, longitude, query_radius = hospital_cell(latitude, longitude, radius)
+    cached = hospital_cache.get(key)
+    if cached is not None:
+        return cached
+
+    import requests
+
     query = f"""
-    [out:json];
-    node["amenity"="hospital"](around:{radius},{latitude},{longitude});
+    [out:json][timeout:{int(overpass.timeout[1])}];
+    node["amenity"="hospital"](around:{query_radius},{latitude},{longitude});
     out body;
     >;
     out skel qt;
     """
     try:
-        response = requests.get(overpass_url, params={"data": query})
+        response = overpass.get(OVERPASS_URL, params={"data": query})
         response.raise_for_status()  # Raise an exception for HTTP errors
         logger.info("Successfully fetched hospitals from OpenStreetMap.")
-        return response.json()
-    except requests.exceptions.RequestException as e:
+        hospitals = response.json()
+        hospital_cache.set(key, hospitals)
+        return hospitals
+    except CircuitOpenError:
+        logger.warning("Overpass circuit open; skipping OpenStreetMap lookup.")
+    except (requests.exceptions.RequestException, ValueError) as e:
         logger.error(f"Failed to fetch hospitals from OpenStreetMap: {e}")
-        return None
+    # Expired results for this cell are better than none while Overpass is down
+    return hospital_cache.get_stale(key)
+
+def cohere_generate(prompt, **params):
+    with metrics.track("external", "cohere"):
+        response = get_cohere().generate(prompt=prompt, **params)
+    return response.generations[0].text
+
+def cohere_generate_batch(prompts, **params):
+    with metrics.track("external", "cohere_batch"):
+        responses = get_cohere().batch_generate(prompts=prompts, return_exceptions=True, **params)
+    return [r if isinstance(r, Exception) else r.generations[0].text for r in responses]
+
+def cohere_has_batch():
+    # Newer SDKs dropped batch_generate; the broker then sends prompts one by
+    # one. Checked when a batch is formed, not at import, so the client is still
+    # created on first use and one installed later with set_client() counts.
+    return hasattr(get_cohere(), "batch_generate")
+
+# All Cohere calls go through one broker: identical in-flight prompts share a
+# call, near-simultaneous prompts are batched, and a token bucket keeps us under
+# the API rate limit while high-acuity patients skip the queue
+llm = LLMBroker(
+    cohere_generate,
+    cohere_generate_batch,
+    rate=float(os.getenv("COHERE_RATE_LIMIT", "10")),  # calls per second; 0 disables
+    burst=int(os.getenv("COHERE_BURST", "10")),
+    reserve=int(os.getenv("COHERE_PRIORITY_RESERVE", "2")),
+    batch_window=float(os.getenv("COHERE_BATCH_WINDOW", "0.02")),
+    max_batch=int(os.getenv("COHERE_MAX_BATCH", "16")),
+    max_concurrency=int(os.getenv("COHERE_MAX_CONCURRENCY", "8")),
+    name="cohere",
+    batch_available=cohere_has_batch,
+)
+
+def generate_summary(prompt, priority=False, **params):
+    return llm.generate(prompt, priority=priority, timeout=TRIAGE_TIMEOUT, **params)
 
 class DataIngestionNode:
-    def process(self, input_data):
+    def __init__(self, writer=None):
+        # Optional batch_writer.BatchWriter; when set, saves are buffered and
+        # committed in WriteBatches instead of one round-trip per patient
+        self.writer = writer
+
+    def submit(self, input_data):
+        # Buffered save; returns a Future that resolves once the batch commits
+        db = get_db()
+        doc_ref = db.collection("patients").document(input_data["patient_id"])
+        # Counter increments are computed at commit time, against the previous
+        # documents read once per flush, and commit in the patient's WriteBatch
+        future = self.writer.set(
+            doc_ref, input_data, derive=lambda batch, old, new: apply_deltas(batch, db, patient_deltas(old, new))
+        )
+        patient_id = input_data["patient_id"]
+        future.add_done_callback(
+            lambda f: logger.error(f"Failed to save patient data {patient_id}: {f.exception()}")
+            if f.exception() else None
+        )
+        return future
+
+    def save(self, input_data):
+        # Returns the Future of a buffered save, or None once saved directly
         try:
-            # Save patient data to Firestore
-            doc_ref = db.collection("patients").document(input_data["patient_id"])
-            doc_ref.set(input_data)
-            logger.info(f"Patient data saved successfully: {input_data}")
-            return input_data
+            if self.writer is not None:
+                future = self.submit(input_data)
+                logger.info("Patient data queued for saving: %s", input_data["patient_id"],
+                            extra={"fields": {"patient_id": input_data["patient_id"]}})
+                logger.debug("Patient payload: %s", input_data)
+                return future
+
+            # Save patient data and update the aggregate counters atomically
+            with metrics.track("external", "firestore_save"):
+                save_patient(get_db(), input_data)
+            logger.info("Patient data saved successfully: %s", input_data["patient_id"],
+                        extra={"fields": {"patient_id": input_data["patient_id"]}})
+            logger.debug("Patient payload: %s", input_data)
+            return None
         except Exception as e:
             logger.error(f"Failed to save patient data: {e}")
             raise
 
+    def process(self, input_data):
+        self.save(input_data)
+        return input_data
+
 class TriageNode:
     def process(self, input_data):
         try:
             # Use Cohere to analyze symptoms
             raw_symptoms = input_data.get("symptoms", [])
             symptoms = [s.lower().strip() for s in raw_symptoms]
-            logger.info(f"Processing symptoms: {raw_symptoms}")
-            logger.info(f"Normalized symptoms: {symptoms}")
-            
-            response = co.generate(
-                prompt=f"Summarize and prioritize these symptoms: {', '.join(symptoms)}.",
-                max_tokens=50
-            )
-            summary = response.generations[0].text
-
-            # Assign a triage score based on symptoms
-            high_priority_symptoms = ["chest pain", "chest-pain", "chestpain"]
-            has_high_priority = any(symptom in high_priority_symptoms for symptom in symptoms)
-            logger.info(f"Has high priority symptoms: {has_high_priority}")
+            logger.debug("Processing symptoms: %s (normalized: %s)", raw_symptoms, symptoms)
             
-            if has_high_priority:
-                triage_score = 0.9  # High priority
-                logger.info("Assigned HIGH priority triage score: 0.9")
-            else:
-                triage_score = 0.5  # Medium priority
-                logger.info("Assigned MEDIUM priority triage score: 0.5")
+            # Assign a triage score from the shared symptom and vitals rules
+            triage_score = triage_rules.score(symptoms, input_data.get("vitals"))
 
+            # Identical symptom sets share one cached summary; high-acuity
+            # patients take the broker's priority lane
+            summary = summary_cache.get_or_generate(
+                symptoms,
+                partial(generate_summary, priority=priority_band(triage_score) == "High"),
+                max_tokens=50,
+            )
             result = {"triage_score": triage_score, "symptom_summary": summary}
-            logger.info(f"Triage result: {result}")
+            logger.info("Assigned triage score: %s", triage_score,
+                        extra={"fields": {"patient_id": input_data.get("patient_id"), "triage_score": triage_score}})
+            logger.debug("Triage result: %s", result)
             return result
         except Exception as e:
             logger.error(f"Failed to assign triage score: {e}")
@@ -111,46 +224,172 @@ class ResourceAllocationNode:
         try:
             # Mock patient location (latitude, longitude)
             patient_location = (37.7749, -122.4194)  # San Francisco
+            recommended_hospital = "No hospital found"
 
-            # Find the nearest hospital using OpenStreetMap
-            hospitals = find_hospitals(*patient_location)
-            if hospitals and "elements" in hospitals:
-                recommended_hospital = hospitals["elements"][0]["tags"].get("name", "No hospital found")
+            # Prefer the offline index so allocation works without connectivity
+            index = get_index()
+            nearest = index.nearest(*patient_location, k=1, radius=5000) if index else []
+            if nearest:
+                recommended_hospital = nearest[0][1].get("name") or recommended_hospital
             else:
-                recommended_hospital = "No hospital found"
+                # Fall back to OpenStreetMap and pick the closest tagged hospital
+                hospitals = find_hospitals(*patient_location)
+                candidates = [
+                    element for element in (hospitals or {}).get("elements", [])
+                    if element.get("tags") and "lat" in element and "lon" in element
+                ]
+                if candidates:
+                    closest = min(
+                        candidates,
+                        key=lambda element: haversine(*patient_location, element["lat"], element["lon"]),
+                    )
+                    recommended_hospital = closest["tags"].get("name", recommended_hospital)
 
-            logger.info(f"Recommended hospital: {recommended_hospital}")
+            logger.info("Recommended hospital: %s", recommended_hospital,
+                        extra={"fields": {"hospital": recommended_hospital}})
             return {"recommended_hospital": recommended_hospital}
         except Exception as e:
             logger.error(f"Failed to allocate resources: {e}")
             raise
 
+# Per-node time limits; a node that overruns falls back instead of stalling the patient
+TRIAGE_TIMEOUT = float(os.getenv("TRIAGE_TIMEOUT", "20"))
+ALLOCATION_TIMEOUT = float(os.getenv("ALLOCATION_TIMEOUT", "15"))
+
+def triage_fallback(error, patient):
+    # The score comes from local rules, so only the LLM summary is lost
+    symptoms = [s.lower().strip() for s in patient.get("symptoms", [])]
+    return {"triage": {
+        "triage_score": triage_rules.score(symptoms, patient.get("vitals")),
+        "symptom_summary": "Summary unavailable.",
+    }}
+
+def allocation_fallback(error, patient):
+    return {"allocation": {"recommended_hospital": "No hospital found"}}
+
 class TriageFlow:
-    def __init__(self):
-        self.data_ingestion_node = DataIngestionNode()
+    def __init__(self, writer=None, max_workers=32):
+        self.data_ingestion_node = DataIngestionNode(writer)
         self.triage_node = TriageNode()
         self.resource_allocation_node = ResourceAllocationNode()
+        # Triage (Cohere) and allocation (index/Overpass) don't depend on each
+        # other, so they run concurrently; ingestion waits for both
+        self.flow = Flow([
+            Step("TriageNode", lambda patient: {"triage": self.triage_node.process(patient)},
+                 inputs=["patient"], outputs=["triage"],
+                 timeout=TRIAGE_TIMEOUT, fallback=triage_fallback),
+            Step("ResourceAllocationNode", lambda patient: {"allocation": self.resource_allocation_node.process(patient)},
+                 inputs=["patient"], outputs=["allocation"],
+                 timeout=ALLOCATION_TIMEOUT, fallback=allocation_fallback),
+            Step("DataIngestionNode", self._ingest,
+                 inputs=["patient", "triage", "allocation"], outputs=["record", "saved"]),
+        ], max_workers=max_workers)
+
+    def _ingest(self, patient, triage, allocation):
+        # Combine all data; last_updated lets dashboards sync incrementally
+        complete_data = {
+            **patient,
+            **triage,
+            **allocation,
+            "last_updated": datetime.now().isoformat(),
+        }
+        return {"record": complete_data, "saved": self.data_ingestion_node.save(complete_data)}
 
     def run(self, input_data):
+        return self.submit(input_data)[0]
+
+    def submit(self, input_data):
+        # The record and, with a writer, the Future of its buffered save (None
+        # when saved directly); callers that must know the record is stored,
+        # like ingest's offsets, wait on it
         try:
-            # Step 1: Assign triage score first
-            triage_result = self.triage_node.process(input_data)
-            # Step 2: Get hospital recommendation
-            allocation_result = self.resource_allocation_node.process(triage_result)
-            # Step 3: Combine all data
-            complete_data = {**input_data, **triage_result, **allocation_result}
-            # Step 4: Save complete data to Firestore
-            self.data_ingestion_node.process(complete_data)
-            
+            context = self.flow.run({"patient": input_data})
+            logger.info("Triage flow completed successfully.")
+            return context["record"], context["saved"]
+        except Exception as e:
+            logger.error(f"Triage flow failed: {e}")
+            raise
+
+    async def arun(self, input_data):
+        try:
+            complete_data = (await self.flow.arun({"patient": input_data}))["record"]
             logger.info("Triage flow completed successfully.")
             return complete_data
         except Exception as e:
             logger.error(f"Triage flow failed: {e}")
             raise
 
+    def _run_timed(self, index, input_data):
+        # Run one patient and capture its outcome instead of raising, so one
+        # bad record never takes down the rest of the batch
+        start = time.perf_counter()
+        try:
+            result, error = self.run(input_data), None
+        except Exception as e:
+            result, error = None, str(e)
+        return self._outcome(index, input_data, result, error, start)
+
+    async def _arun_timed(self, index, input_data):
+        start = time.perf_counter()
+        try:
+            result, error = await self.arun(input_data), None
+        except Exception as e:
+            result, error = None, str(e)
+        return self._outcome(index, input_data, result, error, start)
+
+    @staticmethod
+    def _outcome(index, input_data, result, error, start):
+        return {
+            "index": index,
+            "patient_id": input_data.get("patient_id") if isinstance(input_data, dict) else None,
+            "ok": error is None,
+            "result": result,
+            "error": error,
+            "elapsed": time.perf_counter() - start,
+        }
+
+    def run_many(self, patients, max_concurrency=8):
+        # Run many patients at once; the Cohere, Overpass and Firestore calls
+        # are network-bound, so threads let them overlap across patients.
+        # Results come back in input order with per-patient timing.
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        patients = list(patients)
+        if not patients:
+            return []
+        workers = min(max_concurrency, len(patients))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="triage") as pool:
+            results = list(pool.map(self._run_timed, range(len(patients)), patients))
+        failed = sum(1 for r in results if not r["ok"])
+        logger.info(f"Batch triage completed: {len(results) - failed} succeeded, {failed} failed.")
+        return results
+
+    async def arun_many(self, patients, max_concurrency=8):
+        # asyncio variant of run_many for callers that already run an event loop
+        import asyncio
+
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        patients = list(patients)
+        if not patients:
+            return []
+        # Each patient runs its flow on the event loop (blocking steps use the
+        # flow's own pool); the semaphore bounds how many are in flight
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_one(index, input_data):
+            async with semaphore:
+                return await self._arun_timed(index, input_data)
+
+        results = await asyncio.gather(*(run_one(i, p) for i, p in enumerate(patients)))
+        failed = sum(1 for r in results if not r["ok"])
+        logger.info(f"Batch triage completed: {len(results) - failed} succeeded, {failed} failed.")
+        return list(results)
+
 # Example usage
 if __name__ == "__main__":
     try:
+        warm_up()
         flow = TriageFlow()
         input_data = {
             "patient_id": "123",
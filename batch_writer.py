@@ -0,0 +1,252 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import Future
+
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects write batches with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+
+class BatchWriter:
+    """Buffers Firestore writes and commits them as WriteBatches.
+
+    A batch is committed when ``max_batch_size`` writes are buffered or
+    ``flush_interval`` seconds after the oldest buffered write, whichever comes
+    first. Each write returns a Future that resolves once its batch commits.
+    Failed batches are retried with backoff and then split in half, so one bad
+    document only fails its own future. Batches carrying ``firestore.Increment``
+    are not retried after an ambiguous failure (timeout, unavailable), since the
+    commit may already have been applied.
+
+    Works with any client exposing ``batch()`` -> object with
+    ``set``/``update``/``delete``/``commit`` (and ``get_all()`` for ``derive``),
+    e.g. the Firestore emulator or an in-memory fake.
+    """
+
+    def __init__(self, db, max_batch_size=MAX_BATCH_SIZE, flush_interval=1.0, max_retries=3, backoff=0.2):
+        if not 1 <= max_batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(f"max_batch_size must be between 1 and {MAX_BATCH_SIZE}")
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.committed = 0
+        self.failed = 0
+        self.batches = 0
+        self._buffer = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._commit_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+
+    def set(self, doc_ref, data, merge=False, derive=None):
+        """Buffer a set. ``derive(batch, previous, current)`` runs at commit time
+        with the document's data before and after this write (previous may be
+        None) and may add writes through ``batch.set``/``update``/``delete``;
+        they commit in the same WriteBatch. Buffers are committed one at a time
+        in order, so previous is never stale within this process.
+        """
+        return self._add(("set", doc_ref, data, {"merge": merge} if merge else {}), derive)
+
+    def update(self, doc_ref, data, derive=None):
+        # derive as for set()
+        return self._add(("update", doc_ref, data, {}), derive)
+
+    def delete(self, doc_ref):
+        return self._add(("delete", doc_ref, None, {}))
+
+    def flush(self):
+        # Commit everything buffered so far on the calling thread. The buffer is
+        # taken under the commit lock, so buffers commit in the order they were
+        # taken whichever thread flushes them.
+        with self._commit_lock:
+            with self._cond:
+                pending = self._take()
+            self._commit(pending)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _add(self, op, derive=None):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchWriter is closed")
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append((op, derive, future))
+            # Wake the writer thread to start the flush timer, or to commit a full batch
+            if len(self._buffer) == 1 or len(self._buffer) >= self.max_batch_size:
+                self._cond.notify()
+        return future
+
+    def _take(self):
+        # Caller holds the condition
+        pending, self._buffer, self._oldest = self._buffer, [], None
+        return pending
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if len(self._buffer) >= self.max_batch_size:
+                        break
+                    if self._buffer:
+                        remaining = self._oldest + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+    def _commit(self, pending):
+        # Caller holds the commit lock
+        entries = self._expand(pending)
+        # A write and its derived writes always share a WriteBatch
+        chunk, size = [], 0
+        for ops, future in entries:
+            if chunk and size + len(ops) > self.max_batch_size:
+                self._commit_chunk(chunk)
+                chunk, size = [], 0
+            chunk.append((ops, future))
+            size += len(ops)
+        self._commit_chunk(chunk)
+
+    def _expand(self, pending):
+        # (ops, future) per buffered write, running derive callbacks against
+        # the documents' data before the flush, read in one get_all
+        derived = {op[1].path: op[1] for op, derive, _ in pending if derive is not None}
+        if not derived:
+            return [([op], future) for op, _, future in pending]
+        try:
+            with metrics.track("external", "firestore_get_all"):
+                current = {snapshot.reference.path: snapshot.to_dict() if snapshot.exists else None
+                           for snapshot in self.db.get_all(list(derived.values()))}
+        except Exception as e:
+            for _, derive, future in pending:
+                if derive is not None:
+                    future.set_exception(e)
+            pending = [entry for entry in pending if entry[1] is None]
+            derived, current = {}, {}
+
+        entries = []
+        for op, derive, future in pending:
+            method, doc_ref, data, kwargs = op
+            ops = _Ops([op])
+            if doc_ref.path in derived:
+                previous = current[doc_ref.path]
+                if method == "delete":
+                    after = None
+                elif method == "update" or kwargs.get("merge"):
+                    after = {**(previous or {}), **data}
+                else:
+                    after = data
+                if derive is not None:
+                    try:
+                        derive(ops, previous, after)
+                    except Exception as e:
+                        future.set_exception(e)
+                        continue
+                # Later writes to the same document in this flush see this one
+                current[doc_ref.path] = after
+            entries.append((ops, future))
+        return entries
+
+    def _commit_chunk(self, chunk):
+        if not chunk:
+            return
+        error = None
+        for attempt in range(self.max_retries + 1):
+            try:
+                batch = self.db.batch()
+                for ops, _ in chunk:
+                    for method, doc_ref, data, kwargs in ops:
+                        if method == "delete":
+                            batch.delete(doc_ref)
+                        else:
+                            getattr(batch, method)(doc_ref, data, **kwargs)
+                with metrics.track("external", "firestore_batch"):
+                    batch.commit()
+                self.batches += 1
+                self.committed += len(chunk)
+                for _, future in chunk:
+                    future.set_result(True)
+                return
+            except Exception as e:
+                error = e
+                if _ambiguous(e) and any(_increments(data) for ops, _ in chunk for _, _, data, _ in ops):
+                    # The commit may have been applied; retrying (or splitting)
+                    # would apply its counter increments twice
+                    logger.error(f"Batch of {len(chunk)} writes with increments failed ambiguously, "
+                                 f"not retrying: {e}")
+                    self.failed += len(chunk)
+                    for _, future in chunk:
+                        future.set_exception(e)
+                    return
+                if attempt < self.max_retries:
+                    metrics.count_retry("external", "firestore_batch")
+                    time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+        if len(chunk) > 1:
+            # Batches are atomic; split to isolate the failing write(s)
+            logger.warning(f"Batch of {len(chunk)} writes failed, splitting: {error}")
+            mid = len(chunk) // 2
+            self._commit_chunk(chunk[:mid])
+            self._commit_chunk(chunk[mid:])
+            return
+
+        logger.error(f"Failed to commit write after {self.max_retries + 1} attempts: {error}")
+        self.failed += 1
+        chunk[0][1].set_exception(error)
+
+
+def _ambiguous(error):
+    # Failures after which a commit may or may not have been applied
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return False
+    return isinstance(error, (exceptions.DeadlineExceeded, exceptions.ServiceUnavailable,
+                              exceptions.InternalServerError, exceptions.Unknown))
+
+
+def _increments(value):
+    # Whether a write carries a firestore.Increment, which is not idempotent
+    if type(value).__name__ == "Increment":
+        return True
+    return isinstance(value, dict) and any(_increments(v) for v in value.values())
+
+
+class _Ops(list):
+    # The writes for one buffered entry; derive callbacks add to it like a WriteBatch
+    def set(self, doc_ref, data, merge=False):
+        self.append(("set", doc_ref, data, {"merge": merge} if merge else {}))
+
+    def update(self, doc_ref, data):
+        self.append(("update", doc_ref, data, {}))
+
+    def delete(self, doc_ref):
+        self.append(("delete", doc_ref, None, {}))
@@ -0,0 +1,97 @@
+"""Throughput of the alert engine on a synthetic vitals stream.
+
+Simulates monitors streaming readings for many patients (random walks, with
+a share of patients deteriorating) and reports events per second on one
+core, alerts raised and alerts suppressed by de-duplication and rate limits.
+Optionally writes through a BatchWriter into the in-memory Firestore fake.
+
+    python benchmarks/bench_alerts.py --patients 2000 --events 200000 --sink
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alert_engine import AlertEngine, AlertSink  # noqa: E402
+from batch_writer import BatchWriter  # noqa: E402
+from fakes import FakeFirestore  # noqa: E402
+
+
+def vitals_stream(patients, events, interval, deteriorating, rng):
+    # (patient_id, vitals, timestamp) tuples, one reading per patient per `interval` seconds
+    state = {}
+    for i in range(patients):
+        state[f"P{i:06d}"] = {
+            "heart_rate": rng.gauss(85, 10),
+            "oxygen_saturation": rng.gauss(97, 1.5),
+            "temperature": rng.gauss(37, 0.5),
+            "systolic": rng.gauss(125, 12),
+            "drift": -0.3 if rng.random() < deteriorating else 0.0,
+        }
+    ids = list(state)
+    start = time.time() - events / patients * interval
+    for n in range(events):
+        patient_id = ids[n % patients]
+        s = state[patient_id]
+        s["heart_rate"] += rng.gauss(0, 2) - 2 * s["drift"]
+        s["oxygen_saturation"] = min(100.0, s["oxygen_saturation"] + rng.gauss(0, 0.4) + s["drift"])
+        s["temperature"] += rng.gauss(0, 0.05)
+        s["systolic"] += rng.gauss(0, 2) + 3 * s["drift"]
+        yield patient_id, {
+            "heart_rate": round(s["heart_rate"]),
+            "oxygen_saturation": round(s["oxygen_saturation"]),
+            "temperature": round(s["temperature"], 1),
+            "blood_pressure": f"{round(s['systolic'])}/{round(s['systolic'] * 0.65)}",
+        }, start + n // patients * interval
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between readings per patient")
+    parser.add_argument("--deteriorating", type=float, default=0.05, help="Share of patients trending worse")
+    parser.add_argument("--sink", action="store_true", help="Write alerts through a BatchWriter to a fake")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Generate up front so only the engine is timed
+    events = list(vitals_stream(args.patients, args.events, args.interval, args.deteriorating, rng))
+    engine = AlertEngine()
+    db = writer = sink = None
+    if args.sink:
+        db = FakeFirestore()
+        writer = BatchWriter(db)
+        sink = AlertSink(writer, db)
+
+    start = time.perf_counter()
+    for patient_id, vitals, timestamp in events:
+        alerts = engine.process_vitals(patient_id, vitals, timestamp)
+        if sink is not None and alerts:
+            sink.write(alerts)
+    if writer is not None:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    results = {**engine.stats(), "seconds": elapsed, "events_per_second": args.events / elapsed}
+    if db is not None:
+        results["alerts_stored"] = len(db.docs)
+        results["batches"] = writer.batches
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.events} events for {args.patients} patients in {elapsed:.2f}s: "
+          f"{results['events_per_second']:,.0f} events/s")
+    print(f"  alerts raised {results['fired']}, suppressed {results['suppressed']}")
+    if db is not None:
+        print(f"  stored {results['alerts_stored']} alerts in {results['batches']} batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Batch hospital assignment: solve time, incremental re-solve time and quality.
+
+Places synthetic patients and hospitals around San Francisco, then compares
+the capacity-aware solver against picking each patient's nearest hospital on
+its own (what ResourceAllocationNode does), which ignores beds entirely.
+
+    python benchmarks/bench_allocation.py --patients 300 --hospitals 30
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from bench_suite import make_patient  # noqa: E402
+from hospital_allocation import Allocator, cost_matrix, free_beds  # noqa: E402
+
+SPECIALTIES = ["General", "General", "Cardiology", "Neurology", "Pulmonology", "Trauma"]
+
+
+def make_hospitals(count, rng):
+    return [{
+        "name": f"Hospital {j:03d}",
+        "lat": 37.75 + rng.uniform(-0.25, 0.25),
+        "lon": -122.3 + rng.uniform(-0.25, 0.25),
+        "beds": rng.randint(20, 120),
+        "capacity": rng.randint(60, 98),  # Occupancy percent, as the dashboard shows it
+        "specialty": rng.choice(SPECIALTIES),
+    } for j in range(count)]
+
+
+def make_patients(count, rng):
+    patients = []
+    for i in range(count):
+        patient = make_patient(i, rng)
+        patient["location"] = {"lat": 37.75 + rng.uniform(-0.2, 0.2), "lon": -122.3 + rng.uniform(-0.2, 0.2)}
+        patients.append(patient)
+    return patients
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=300)
+    parser.add_argument("--hospitals", type=int, default=30)
+    parser.add_argument("--changes", type=int, default=20, help="Capacity changes to re-solve")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hospitals = make_hospitals(args.hospitals, rng)
+    patients = make_patients(args.patients, rng)
+    beds = np.array([free_beds(hospital) for hospital in hospitals])
+
+    start = time.perf_counter()
+    costs, _ = cost_matrix(patients, hospitals)
+    nearest = costs.argmin(axis=1)
+    nearest_ms = (time.perf_counter() - start) * 1000
+    overflow = int(np.maximum(np.bincount(nearest, minlength=len(hospitals)) - beds, 0).sum())
+
+    start = time.perf_counter()
+    allocator = Allocator(hospitals)
+    allocator.add(patients)
+    solve_ms = (time.perf_counter() - start) * 1000
+    solved = allocator.stats()
+
+    resolve = []
+    for _ in range(args.changes):
+        hospital = rng.choice(hospitals)
+        started = time.perf_counter()
+        allocator.set_capacity(hospital["name"], rng.randint(0, 15))
+        resolve.append((time.perf_counter() - started) * 1000)
+
+    results = {
+        "patients": args.patients,
+        "hospitals": args.hospitals,
+        "free_beds": int(beds.sum()),
+        "nearest": {"ms": nearest_ms, "cost": float(costs[np.arange(len(patients)), nearest].sum()),
+                    "over_capacity": overflow},
+        "solver": {"ms": solve_ms, "cost": solved["total_cost"], "unassigned": solved["unassigned"],
+                   "moves": solved["moves"]},
+        "resolve_ms": {"median": float(np.median(resolve)) if resolve else None,
+                       "max": max(resolve) if resolve else None},
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.patients} patients, {args.hospitals} hospitals, {results['free_beds']} free beds")
+    print(f"  nearest only:   {nearest_ms:7.1f} ms, {overflow} patients sent to hospitals without a bed")
+    print(f"  capacity-aware: {solve_ms:7.1f} ms, {solved['unassigned']} unassigned, "
+          f"weighted cost {solved['total_cost']:.0f} km")
+    if resolve:
+        print(f"  re-solve after a capacity change: median {results['resolve_ms']['median']:.1f} ms, "
+              f"max {results['resolve_ms']['max']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
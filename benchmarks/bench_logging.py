@@ -0,0 +1,120 @@
+"""Per-patient logging overhead on the request thread: classic vs structured mode.
+
+Replays the log calls one TriageFlow.run makes, before (eager f-strings of the
+full patient dict, synchronous FileHandler) and after (lazy %-args and
+structured fields through log_setup's background QueueListener).
+
+    python benchmarks/bench_logging.py --patients 20000
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_setup import configure_logging  # noqa: E402
+
+logger = logging.getLogger("backend")
+
+
+def sample_patient(i):
+    return {
+        "patient_id": f"P{i:06d}",
+        "symptoms": ["chest pain", "shortness of breath", "sweating"],
+        "vitals": {"blood_pressure": "140/90", "heart_rate": 110, "temperature": 37.8, "oxygen_saturation": 94},
+        "triage_score": 0.9,
+        "symptom_summary": "Severe chest pain radiating to the left arm with dyspnea and diaphoresis. " * 8,
+        "recommended_hospital": "City General Hospital",
+    }
+
+
+def classic_calls(patient):
+    # The log lines TriageFlow.run emitted per patient before structured mode
+    symptoms = patient["symptoms"]
+    logger.info(f"Processing symptoms: {symptoms}")
+    logger.info(f"Normalized symptoms: {symptoms}")
+    logger.info(f"Has high priority symptoms: {True}")
+    logger.info("Assigned HIGH priority triage score: 0.9")
+    result = {"triage_score": patient["triage_score"], "symptom_summary": patient["symptom_summary"]}
+    logger.info(f"Triage result: {result}")
+    logger.info(f"Recommended hospital: {patient['recommended_hospital']}")
+    logger.info(f"Patient data saved successfully: {patient}")
+    logger.info("Triage flow completed successfully.")
+
+
+def structured_calls(patient):
+    # The log lines TriageFlow.run emits per patient now
+    patient_id = patient["patient_id"]
+    logger.debug("Processing symptoms: %s (normalized: %s)", patient["symptoms"], patient["symptoms"])
+    result = {"triage_score": patient["triage_score"], "symptom_summary": patient["symptom_summary"]}
+    logger.info("Assigned triage score: %s", patient["triage_score"],
+                extra={"fields": {"patient_id": patient_id, "triage_score": patient["triage_score"]}})
+    logger.debug("Triage result: %s", result)
+    logger.info("Recommended hospital: %s", patient["recommended_hospital"],
+                extra={"fields": {"hospital": patient["recommended_hospital"]}})
+    logger.info("Patient data saved successfully: %s", patient_id, extra={"fields": {"patient_id": patient_id}})
+    logger.debug("Patient payload: %s", patient)
+    logger.info("Triage flow completed successfully.")
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run(mode, patients, path):
+    reset_root()
+    listener = None
+    if mode == "classic":
+        handler = logging.FileHandler(path, mode="w")
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+        calls = classic_calls
+    else:
+        listener = configure_logging(path)
+        calls = structured_calls
+
+    start = time.perf_counter()
+    for patient in patients:
+        calls(patient)
+    hot_path = time.perf_counter() - start
+    if listener is not None:
+        listener.stop()
+    total = time.perf_counter() - start
+    reset_root()
+    return {
+        "mode": mode,
+        "patients": len(patients),
+        "per_patient_us": hot_path / len(patients) * 1e6,
+        "including_drain_us": total / len(patients) * 1e6,
+        "log_bytes_per_patient": os.path.getsize(path) / len(patients),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    patients = [sample_patient(i) for i in range(args.patients)]
+    with tempfile.TemporaryDirectory() as tmp:
+        results = [run(mode, patients, os.path.join(tmp, f"{mode}.log")) for mode in ("classic", "structured")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for r in results:
+        print(f"{r['mode']:>10}: {r['per_patient_us']:8.1f} us/patient on request thread "
+              f"({r['including_drain_us']:.1f} incl. drain), {r['log_bytes_per_patient']:.0f} log bytes/patient")
+
+
+if __name__ == "__main__":
+    main()
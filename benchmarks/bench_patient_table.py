@@ -0,0 +1,117 @@
+"""Memory and query cost of the patient mirror: list of dicts vs PatientTable.
+
+Builds a synthetic census (default 50k patients, shaped like Firestore
+documents), then reports memory for each representation and timings for the
+dashboard's counting, filtering and sorting work.
+
+    python benchmarks/bench_patient_table.py --patients 50000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import make_patient  # noqa: E402
+from patient_queries import priority_band  # noqa: E402
+from patient_table import PatientTable, parse_blood_pressure  # noqa: E402
+
+
+def measure(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def allocated(build):
+    # Bytes allocated (and still held) while building a structure
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return value, size
+
+
+def dict_ops(patients):
+    # What the dashboard did per rerun with raw dicts
+    return {
+        "band_counts": lambda: Counter(priority_band(p.get("triage_score", 0)) for p in patients),
+        "filter_high_chest_pain": lambda: [
+            p for p in patients
+            if priority_band(p.get("triage_score", 0)) == "High"
+            and "chest pain" in {" ".join(str(s).lower().split()) for s in p.get("symptoms", [])}
+        ],
+        "hypertensive": lambda: [
+            p for p in patients if parse_blood_pressure(p.get("vitals", {}).get("blood_pressure"))[0] >= 140
+        ],
+        "symptom_counts": lambda: Counter(
+            " ".join(str(s).lower().split()) for p in patients for s in p.get("symptoms", [])
+        ),
+        "sort_by_score": lambda: sorted(patients, key=lambda p: p.get("triage_score", 0), reverse=True),
+    }
+
+
+def table_ops(table):
+    return {
+        "band_counts": table.band_counts,
+        "filter_high_chest_pain": lambda: table.filter(bands=["High"], symptom="chest pain"),
+        "hypertensive": lambda: table.mask() & (table["systolic"] >= 140),
+        "symptom_counts": table.symptom_counts,
+        "sort_by_score": table.order,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--patients", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable results")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Round-trip through JSON so the dicts hold distinct objects, as decoded documents do
+    raw = json.dumps([make_patient(i, rng) for i in range(args.patients)])
+    patients, dict_bytes = allocated(lambda: json.loads(raw))
+    table, table_bytes = allocated(lambda: PatientTable.from_patients(patients))
+    _, build_ms = measure(lambda: PatientTable.from_patients(patients), 1)
+
+    results = {
+        "patients": args.patients,
+        "memory": {
+            "dicts_bytes": dict_bytes,
+            "table_bytes": table.memory_usage()["total"],
+            "table_allocated_bytes": table_bytes,
+            "table_columns": table.memory_usage(),
+        },
+        "build_table_ms": build_ms,
+        "ops_ms": {},
+    }
+    dicts, columns = dict_ops(patients), table_ops(table)
+    for name in dicts:
+        _, before = measure(dicts[name])
+        _, after = measure(columns[name])
+        results["ops_ms"][name] = {"dicts": before, "table": after, "speedup": before / after if after else None}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    memory = results["memory"]
+    print(f"{args.patients} patients")
+    print(f"  list of dicts: {memory['dicts_bytes'] / 2**20:8.1f} MiB")
+    print(f"  PatientTable:  {memory['table_bytes'] / 2**20:8.1f} MiB "
+          f"({memory['dicts_bytes'] / memory['table_bytes']:.0f}x smaller), built in {build_ms:.0f} ms")
+    for name, timing in results["ops_ms"].items():
+        print(f"  {name:<24} {timing['dicts']:8.2f} ms -> {timing['table']:7.2f} ms ({timing['speedup']:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Offline benchmark suite: Firestore, Cohere and Overpass replaced by local fakes.
+
+Scenarios:
+  flow       single-patient TriageFlow.run latency, cold and warm caches
+  ingest     bulk JSONL ingest throughput, direct and BatchWriter-buffered
+  dashboard  patient mirror load, sort, first page, card rendering and
+             aggregate reads at each --sizes census (the calls app.py makes)
+  backfill   fix_triage_scores rescoring throughput
+
+Latency and failure rates of each fake are configurable. Results are written
+as JSON and can be compared against an earlier run:
+
+    python benchmarks/bench_suite.py --out results.json
+    python benchmarks/bench_suite.py --scenarios dashboard --sizes 100,1000,10000 --compare results.json
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import contextlib
+import statistics
+import subprocess
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fakes import FakeCohere, FakeFirestore, Latency  # noqa: E402
+from overpass_stub import OverpassStub  # noqa: E402
+
+SCENARIOS = ("flow", "ingest", "dashboard", "backfill")
+SYMPTOMS = [
+    "chest pain", "shortness of breath", "headache", "dizziness", "nausea", "fever", "cough",
+    "fatigue", "abdominal pain", "back pain", "sweating", "vomiting", "rash", "sore throat", "confusion",
+]
+HOSPITALS = ["City General Hospital", "Community Medical Center", "St. Mary's", "Bayview Clinic"]
+
+
+def make_patient(i, rng, scored=True):
+    patient = {
+        "patient_id": f"P{i:06d}",
+        "symptoms": rng.sample(SYMPTOMS, rng.randint(1, 3)),
+        "vitals": {
+            "heart_rate": rng.randint(55, 140),
+            "blood_pressure": f"{rng.randint(95, 170)}/{rng.randint(60, 105)}",
+            "temperature": round(rng.uniform(36.0, 40.0), 1),
+            "oxygen_saturation": rng.randint(85, 100),
+        },
+    }
+    if scored:
+        patient.update({
+            "triage_score": rng.choice([0.5, 0.7, 0.9]),
+            "symptom_summary": "Synthetic patient",
+            "recommended_hospital": rng.choice(HOSPITALS),
+            "last_updated": (datetime(2025, 1, 1) + timedelta(seconds=i)).isoformat(),
+        })
+    return patient
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50) * 1000,
+        "p95_ms": pick(0.95) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def series_means(before, after):
+    # Mean latency per tracked node/external call between two registry snapshots
+    previous = {(s["kind"], s["name"]): s for s in before}
+    means = {}
+    for s in after:
+        old = previous.get((s["kind"], s["name"]), {"count": 0, "sum": 0.0})
+        count = s["count"] - old["count"]
+        if count:
+            means[f"{s['kind']}.{s['name']}_ms"] = (s["sum"] - old["sum"]) / count * 1000
+    return means
+
+
+class Suite:
+    def __init__(self, args, stub):
+        self.args = args
+        self.stub = stub
+        self.rng = random.Random(args.seed)
+
+        import clients
+        self.clients = clients
+        self.cohere = FakeCohere(Latency(args.cohere_latency, args.cohere_latency / 4, args.cohere_errors, args.seed))
+        clients.set_client("cohere", self.cohere)
+
+    def fresh_db(self, latency=True):
+        args = self.args
+        db = FakeFirestore(Latency(args.firestore_latency if latency else 0.0, args.firestore_latency / 4,
+                                   args.firestore_errors if latency else 0.0, args.seed))
+        self.clients.set_client("db", db)
+        return db
+
+    def clear_caches(self):
+        import backend
+        from summary_cache import summary_cache
+        backend.hospital_cache.clear()
+        summary_cache.cache.clear()
+
+    def flow(self):
+        import backend
+        from metrics import registry
+
+        self.fresh_db()
+        flow = backend.TriageFlow()
+        patients = [make_patient(i, self.rng, scored=False) for i in range(self.args.flow_patients)]
+        results = {}
+        for label, clear in (("cold", True), ("warm", False)):
+            before = registry.snapshot()
+            samples, failed = [], 0
+            for patient in patients:
+                if clear:
+                    self.clear_caches()
+                start = time.perf_counter()
+                try:
+                    flow.run(patient)
+                except Exception:
+                    failed += 1
+                samples.append(time.perf_counter() - start)
+            results[label] = {**percentiles(samples), "failed": failed,
+                              "breakdown": series_means(before, registry.snapshot())}
+        return {"patients": len(patients), **results}
+
+    def ingest(self):
+        import backend
+        import ingest
+        from batch_writer import BatchWriter
+
+        count = self.args.ingest_records
+        lines = [json.dumps(make_patient(i, self.rng, scored=False)) + "\n" for i in range(count)]
+        results = {}
+        for mode in ("direct", "buffered"):
+            db = self.fresh_db()
+            self.clear_caches()
+            writer = BatchWriter(db) if mode == "buffered" else None
+            flow = backend.TriageFlow(writer)
+            with tempfile.TemporaryDirectory() as tmp:
+                start = time.perf_counter()
+                stats = ingest.ingest(iter(lines), flow, io.StringIO(), io.StringIO(), os.path.join(tmp, "offset"),
+                                      workers=self.args.workers, window=self.args.workers * 4, report_every=1e9,
+                                      flush=writer.flush if writer is not None else None)
+                if writer is not None:
+                    writer.close()
+                elapsed = time.perf_counter() - start
+            results[mode] = {
+                "records": stats["processed"],
+                "failed": stats["failed"],
+                "elapsed_s": elapsed,
+                "records_per_sec": stats["processed"] / elapsed if elapsed else 0.0,
+                "firestore": db.stats(),
+            }
+        return results
+
+    def dashboard(self):
+        import patient_cards
+        from patient_queries import PRIORITY_BANDS, fetch_patient_page
+        from patient_stats import count_priority_bands, read_stats, rebuild_stats
+        from patient_sync import PatientCache
+
+        results = {}
+        for size in self.args.sizes:
+            db = self.fresh_db(latency=False)
+            db.load("patients", [make_patient(i, self.rng) for i in range(size)])
+            rebuild_stats(db)
+            db.latency = Latency(self.args.firestore_latency, self.args.firestore_latency / 4, 0.0, self.args.seed)
+            collection = db.collection("patients")
+
+            cache, load = timed(lambda: PatientCache(collection, initial_timeout=60).start())
+            patients, sort = timed(cache.patients)
+            (page, _), first_page = timed(fetch_patient_page, collection, list(PRIORITY_BANDS), 50)
+            patient_cards._cards.clear()
+            _, render_page_cold = timed(patient_cards.patient_list_html, page)
+            _, render_page_warm = timed(patient_cards.patient_list_html, page)
+            patient_cards._cards.clear()
+            _, render_all = timed(patient_cards.patient_list_html, patients)
+            _, stats = timed(read_stats, db)
+            _, counts = timed(count_priority_bands, collection)
+            cache.stop()
+            results[str(size)] = {
+                "mirror_load_ms": load * 1000,
+                "sort_ms": sort * 1000,
+                "first_page_ms": first_page * 1000,
+                "render_page_cold_ms": render_page_cold * 1000,
+                "render_page_warm_ms": render_page_warm * 1000,
+                "render_all_ms": render_all * 1000,
+                "read_stats_ms": stats * 1000,
+                "count_bands_ms": counts * 1000,
+            }
+        return results
+
+    def backfill(self):
+        import fix_triage_scores
+
+        size = self.args.backfill_patients
+        db = self.fresh_db(latency=False)
+        patients = [make_patient(i, self.rng) for i in range(size)]
+        for patient in patients:
+            patient["triage_score"] = 0.1  # Stale score; every document gets rewritten
+        db.load("patients", patients)
+        db.latency = Latency(self.args.firestore_latency, self.args.firestore_latency / 4,
+                             self.args.firestore_errors, self.args.seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats, elapsed = timed(fix_triage_scores.update_triage_scores, chunk_size=500,
+                                   workers=self.args.workers, checkpoint_path=None)
+        return {
+            "patients": size,
+            "changed": stats["changed"],
+            "written": stats["written"],
+            "elapsed_s": elapsed,
+            "docs_per_sec": stats["scanned"] / elapsed if elapsed else 0.0,
+            "firestore": db.stats(),
+        }
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}{key}."))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix[:-1]: value}
+    return {}
+
+
+def compare(baseline, current):
+    old, new = flatten(baseline["scenarios"]), flatten(current["scenarios"])
+    print(f"\n{'metric':<60} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{key:<60} {before:12.2f} {after:12.2f} {change:>8}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--sizes", default="100,1000,10000", help="Dashboard census sizes")
+    parser.add_argument("--flow-patients", type=int, default=30)
+    parser.add_argument("--ingest-records", type=int, default=500)
+    parser.add_argument("--backfill-patients", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--firestore-latency", type=float, default=0.01, help="Seconds per Firestore call")
+    parser.add_argument("--firestore-errors", type=float, default=0.0, help="Fraction of Firestore calls that fail")
+    parser.add_argument("--cohere-latency", type=float, default=0.4)
+    parser.add_argument("--cohere-errors", type=float, default=0.0)
+    parser.add_argument("--cohere-rate", type=float, default=0.0, help="Broker calls/s (0 = unlimited)")
+    parser.add_argument("--overpass-latency", type=float, default=0.25)
+    parser.add_argument("--overpass-errors", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results file to diff against")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {sorted(unknown)}")
+
+    stub = OverpassStub(latency=args.overpass_latency, jitter=args.overpass_latency / 4,
+                        error_rate=args.overpass_errors).start()
+    tmp = tempfile.mkdtemp(prefix="swiftcare-bench-")
+    # Everything the backend reads at import time: no disk caches, no offline
+    # index (so allocation exercises Overpass), and the stub as the endpoint
+    os.environ.update({
+        "OVERPASS_URL": stub.url,
+        "HOSPITAL_INDEX_PATH": os.path.join(tmp, "missing-index.json.gz"),
+        "HOSPITAL_CACHE_PATH": "",
+        "SUMMARY_CACHE_PATH": "",
+        "COHERE_RATE_LIMIT": str(args.cohere_rate),
+    })
+    os.environ.pop("METRICS_PORT", None)
+    os.environ.pop("LOG_MODE", None)
+    # Keep the backend's basicConfig from appending to backend.log
+    logging.basicConfig(level=logging.WARNING, handlers=[logging.NullHandler()])
+
+    from metrics import registry
+    registry.add_hook(lambda *_: None)  # Enable per-node timing for the breakdowns
+
+    suite = Suite(args, stub)
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "scenarios": {},
+    }
+    for name in scenarios:
+        print(f"Running {name}...", file=sys.stderr)
+        start = time.perf_counter()
+        try:
+            results["scenarios"][name] = getattr(suite, name)()
+        except Exception as e:
+            # e.g. injected errors the code under test doesn't retry
+            results["scenarios"][name] = {"error": repr(e)}
+            print(f"  failed: {e!r}", file=sys.stderr)
+        print(f"  done in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    results["overpass_stub"] = stub.stats()
+    results["cohere"] = suite.cohere.stats()
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["scenarios"], indent=2))
+    print(f"Results written to {args.out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""In-process stand-ins for Firestore and Cohere with injectable latency and failures.
+
+They implement the subset of each client API this project uses, so backend,
+ingest, the backfill and the dashboard helpers run unchanged once installed
+with clients.set_client(). See overpass_stub.py for the Overpass side.
+"""
+import copy
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+
+class InjectedError(Exception):
+    pass
+
+
+class Latency:
+    """Sleeps ``mean`` +/- ``jitter`` seconds per call and fails ``error_rate`` of calls."""
+
+    def __init__(self, mean=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.mean = mean
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, what):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.mean + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise InjectedError(f"Injected failure in {what}")
+
+
+# --- Firestore -------------------------------------------------------------
+
+def _resolve(current, value):
+    # Field transforms (firestore.Increment) are applied against the stored value
+    if type(value).__name__ == "Increment":
+        return (current if isinstance(current, (int, float)) else 0) + value.value
+    if isinstance(value, dict):
+        return {k: _resolve((current or {}).get(k) if isinstance(current, dict) else None, v)
+                for k, v in value.items()}
+    return value
+
+
+def _merge(current, data):
+    merged = dict(current or {})
+    for key, value in data.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = _resolve(merged.get(key), value)
+    return merged
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = reference.db.update_times.get(reference.path) if self.exists else None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    def get(self, transaction=None):
+        self.db.latency("get")
+        with self.db.lock:
+            self.db.reads += 1
+            return FakeSnapshot(self, copy.deepcopy(self.db.docs.get(self.path)))
+
+    def set(self, data, merge=False):
+        self.db.latency("set")
+        with self.db.lock:
+            self.db.apply([("set", self, data, merge)])
+
+    def update(self, data):
+        self.db.latency("update")
+        with self.db.lock:
+            self.db.apply([("update", self, data, False)])
+
+    def delete(self):
+        self.db.latency("delete")
+        with self.db.lock:
+            self.db.apply([("delete", self, None, False)])
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), orders=(), limit=None, start_after=None):
+        self.collection = collection
+        self.filters = list(filters)
+        self.orders = list(orders)
+        self._limit = limit
+        self._start_after = start_after
+
+    def _copy(self, **changes):
+        state = {"filters": self.filters, "orders": self.orders, "limit": self._limit,
+                 "start_after": self._start_after, **changes}
+        return FakeQuery(self.collection, **state)
+
+    def where(self, field, op, value):
+        return self._copy(filters=self.filters + [(field, op, value)])
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self.orders + [(field, direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(start_after=snapshot)
+
+    def count(self):
+        def get():
+            self.collection.db.latency("count")
+            return [[SimpleNamespace(alias="count", value=len(self._matches()))]]
+        return SimpleNamespace(get=get)
+
+    def _matches(self):
+        ops = {
+            "==": lambda a, b: a == b, "<": lambda a, b: a < b, "<=": lambda a, b: a <= b,
+            ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+        }
+        db = self.collection.db
+        prefix = self.collection.path + "/"
+        with db.lock:
+            rows = [
+                (path, data) for path, data in db.docs.items()
+                if path.startswith(prefix) and "/" not in path[len(prefix):]
+                and all(field in data and ops[op](data[field], value) for field, op, value in self.filters)
+            ]
+        # Firestore skips documents missing an ordered field, then orders by
+        # the requested fields and finally document ID
+        rows = [row for row in rows if all(f == "__name__" or f in row[1] for f, _ in self.orders)]
+        orders = self.orders + [("__name__", "ASCENDING")]
+        for field, direction in reversed(orders):
+            rows.sort(key=lambda row, f=field: row[0] if f == "__name__" else row[1].get(f),
+                      reverse=direction == "DESCENDING")
+        return rows
+
+    def stream(self):
+        db = self.collection.db
+        db.latency("query")
+        rows = self._matches()
+        if self._start_after is not None:
+            ids = [path for path, _ in rows]
+            try:
+                rows = rows[ids.index(self._start_after.reference.path) + 1:]
+            except ValueError:
+                rows = []
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        with db.lock:
+            db.reads += len(rows)
+        for path, data in rows:
+            yield FakeSnapshot(FakeDocument(db, path), copy.deepcopy(data))
+
+    get = stream
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        return FakeDocument(self.db, f"{self.path}/{doc_id or '%020x' % random.getrandbits(80)}")
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def on_snapshot(self, callback):
+        # Delivers the current contents once as ADDED changes; later writes are
+        # not pushed, which is all the benchmarks need
+        added = SimpleNamespace(name="ADDED")
+        snapshots = list(self.stream())
+        callback(snapshots, [SimpleNamespace(type=added, document=s) for s in snapshots], None)
+        return SimpleNamespace(unsubscribe=lambda: None)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+        self.preconditions = []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(("set", ref, data, merge))
+
+    def update(self, ref, data, option=None):
+        self.ops.append(("update", ref, data, False))
+        if option is not None:
+            self.preconditions.append((ref, option.last_update_time))
+
+    def delete(self, ref):
+        self.ops.append(("delete", ref, None, False))
+
+    def commit(self):
+        if len(self.ops) > 500:
+            raise ValueError("Batch exceeds 500 writes")
+        self.db.latency("commit")
+        with self.db.lock:
+            for ref, update_time in self.preconditions:
+                if self.db.update_times.get(ref.path) != update_time:
+                    from google.api_core.exceptions import FailedPrecondition
+                    raise FailedPrecondition(f"{ref.path} was modified since {update_time}")
+            self.db.apply(self.ops)
+            self.db.commits += 1
+        return []
+
+
+class FakeTransaction(FakeBatch):
+    # Just enough of google.cloud.firestore's Transaction for @firestore.transactional
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._id = None
+
+    def _clean_up(self):
+        self.ops = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = random.getrandbits(64).to_bytes(8, "big")
+
+    def _commit(self):
+        self.commit()
+        self._clean_up()
+        return []
+
+    def _rollback(self):
+        self._clean_up()
+
+
+class FakeFirestore:
+    """Thread-safe in-memory document store keyed by full document path."""
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.docs = {}
+        self.update_times = {}  # Path -> write sequence number, standing in for update_time
+        self._clock = 0
+        self.lock = threading.RLock()
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self)
+
+    def write_option(self, last_update_time):
+        return SimpleNamespace(last_update_time=last_update_time)
+
+    def get_all(self, references):
+        # One round trip for many documents, like Client.get_all
+        self.latency("get_all")
+        with self.lock:
+            self.reads += len(references)
+            return [FakeSnapshot(ref, copy.deepcopy(self.docs.get(ref.path))) for ref in references]
+
+    def apply(self, ops):
+        # Caller holds the lock. All-or-nothing, like a WriteBatch commit.
+        staged = {}
+        for method, ref, data, merge in ops:
+            current = staged[ref.path] if ref.path in staged else self.docs.get(ref.path)
+            if method == "delete":
+                staged[ref.path] = None
+            elif method == "update":
+                if current is None:
+                    raise KeyError(f"No document to update: {ref.path}")
+                staged[ref.path] = _merge(current, copy.deepcopy(data))
+            elif merge:
+                staged[ref.path] = _merge(current, copy.deepcopy(data))
+            else:
+                staged[ref.path] = _resolve(None, copy.deepcopy(data))
+        for path, data in staged.items():
+            self._clock += 1
+            if data is None:
+                self.docs.pop(path, None)
+                self.update_times.pop(path, None)
+            else:
+                self.docs[path] = data
+                self.update_times[path] = self._clock
+        self.writes += len(ops)
+
+    def load(self, collection, records, key="patient_id"):
+        # Seed documents directly, without latency
+        with self.lock:
+            for record in records:
+                self._clock += 1
+                self.docs[f"{collection}/{record[key]}"] = copy.deepcopy(record)
+                self.update_times[f"{collection}/{record[key]}"] = self._clock
+
+    def stats(self):
+        return {"reads": self.reads, "writes": self.writes, "commits": self.commits, "calls": self.latency.calls,
+                "injected_errors": self.latency.errors}
+
+
+# --- Cohere ----------------------------------------------------------------
+
+class FakeCohere:
+    """generate() and, optionally, batch_generate() with Cohere-shaped responses."""
+
+    def __init__(self, latency=None, batch=True):
+        self.latency = latency or Latency()
+        self.generations = 0
+        if batch:
+            self.batch_generate = self._batch_generate
+
+    @staticmethod
+    def _response(prompt):
+        text = f"Summary of: {prompt[prompt.find(':') + 1:].strip()}"
+        return SimpleNamespace(generations=[SimpleNamespace(text=text)])
+
+    def generate(self, prompt, **params):
+        self.latency("generate")
+        self.generations += 1
+        return self._response(prompt)
+
+    def _batch_generate(self, prompts, return_exceptions=False, **params):
+        # One round trip for the whole batch
+        self.latency("batch_generate")
+        self.generations += len(prompts)
+        return [self._response(prompt) for prompt in prompts]
+
+    def stats(self):
+        return {"calls": self.latency.calls, "generations": self.generations, "injected_errors": self.latency.errors}
@@ -0,0 +1,127 @@
+"""Local stand-in for the Overpass API with injectable latency and failures.
+
+Answers hospital queries with a few synthetic hospitals around the queried
+point. Point the backend at it with OVERPASS_URL:
+
+    python benchmarks/overpass_stub.py --port 8089 --latency 0.2 --error-rate 0.1
+    OVERPASS_URL=http://127.0.0.1:8089/api/interpreter python backend.py
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AROUND = re.compile(r"around:(\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)")
+
+
+def fake_hospitals(latitude, longitude, count=5, seed=None):
+    rng = random.Random(seed if seed is not None else f"{latitude:.3f},{longitude:.3f}")
+    return {
+        "elements": [
+            {
+                "type": "node",
+                "id": 1000 + i,
+                "lat": latitude + rng.uniform(-0.03, 0.03),
+                "lon": longitude + rng.uniform(-0.03, 0.03),
+                "tags": {"amenity": "hospital", "name": f"Stub Hospital {i + 1}"},
+            }
+            for i in range(count)
+        ]
+    }
+
+
+class OverpassStub(ThreadingHTTPServer):
+    """Stub server; latency, error_rate and hang_rate can be changed while it runs."""
+
+    daemon_threads = True
+
+    def __init__(self, port=0, host="127.0.0.1", latency=0.0, jitter=0.0, error_rate=0.0,
+                 hang_rate=0.0, hang_seconds=30.0):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/interpreter"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="overpass-stub", daemon=True).start()
+        return self
+
+    def process_request_thread(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request_thread(request, client_address)
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "connections": self.connections}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection reuse is observable
+
+    def do_GET(self):
+        stub = self.server
+        with stub._lock:
+            stub.requests += 1
+        roll = random.random()
+        if roll < stub.hang_rate:
+            time.sleep(stub.hang_seconds)
+        time.sleep(max(0.0, stub.latency + random.uniform(-stub.jitter, stub.jitter)))
+        if roll >= 1 - stub.error_rate:
+            with stub._lock:
+                stub.errors += 1
+            self._send(503, b'{"error": "injected failure"}')
+            return
+
+        query = parse_qs(urlparse(self.path).query).get("data", [""])[0]
+        match = AROUND.search(query)
+        latitude, longitude = (float(match.group(2)), float(match.group(3))) if match else (0.0, 0.0)
+        self._send(200, json.dumps(fake_hospitals(latitude, longitude)).encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds on top of --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that stall")
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    args = parser.parse_args()
+
+    stub = OverpassStub(args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        hang_rate=args.hang_rate, hang_seconds=args.hang_seconds)
+    print(f"Overpass stub listening on {stub.url}")
+    try:
+        stub.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
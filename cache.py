@@ -0,0 +1,195 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Two-tier key/value cache: an in-memory LRU backed by an optional SQLite file.
+
+    Entries expire after ``ttl`` seconds. Expired entries can still be read with
+    ``get_stale`` for ``max_stale`` more seconds; the disk tier drops them after
+    that. Values must be JSON-serializable when a disk tier is configured.
+    """
+
+    def __init__(self, max_entries=1024, ttl=3600, path=None, table="cache", max_stale=7 * 86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.path = path
+        self.table = table
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if path:
+            try:
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} "
+                    "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+                )
+                # Recently expired rows stay for stale reads after a restart
+                self._conn.execute(f"DELETE FROM {table} WHERE expires_at <= ?", (time.time() - max_stale,))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # The disk tier is an optimization; fall back to memory only
+                logger.error(f"Failed to open cache file {path}: {e}")
+                self._conn = None
+
+    def get(self, key, default=None):
+        with self._lock:
+            found = self._lookup(key, time.time())
+            if found is None:
+                self.misses += 1
+                return default
+            _, from_disk, value = found
+            if from_disk:
+                self.disk_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def get_stale(self, key, default=None):
+        # Also returns entries that expired less than max_stale seconds ago, for
+        # serving last-known data while an upstream is down. Only stale hits are
+        # counted, so a fallback read after a missed get() isn't a second miss.
+        now = time.time()
+        with self._lock:
+            found = self._lookup(key, now - self.max_stale)
+            if found is None:
+                return default
+            expires_at, _, value = found
+            if expires_at <= now:
+                self.stale_hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, expires_at, value) VALUES (?, ?, ?)",
+                        (key, expires_at, json.dumps(value)),
+                    )
+                    self._conn.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    logger.error(f"Failed to write cache file {self.path}: {e}")
+
+    def delete(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self.table}")
+                self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._memory),
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def _lookup(self, key, oldest):
+        # Caller holds the lock. (expires_at, from_disk, value) for an entry
+        # expiring after `oldest`, or None
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] > oldest:
+            self._memory.move_to_end(key)
+            return entry[0], False, entry[1]
+        # Expired entries stay until LRU eviction so stale reads can use them
+
+        if self._conn is not None:
+            try:
+                row = self._conn.execute(
+                    f"SELECT expires_at, value FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to read cache file {self.path}: {e}")
+                row = None
+            if row is not None and row[0] > oldest:
+                value = json.loads(row[1])
+                self._remember(key, row[0], value)
+                return row[0], True, value
+        return None
+
+    def _remember(self, key, expires_at, value):
+        # Caller holds the lock
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in flight
+    wait and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
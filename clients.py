@@ -0,0 +1,100 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Process-wide API clients, created on first use rather than at import time so
+# scripts and dashboard reruns don't pay for credential parsing and channel setup
+_clients = {}
+_lock = threading.Lock()
+_timings = {}
+_process_start = time.perf_counter()
+
+
+def _create_db():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:  # Check if Firebase is not already initialized
+        cred = credentials.Certificate(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+        firebase_admin.initialize_app(cred)
+        logger.info("Firebase initialized successfully.")
+    return firestore.client()
+
+
+def _create_cohere():
+    import cohere
+
+    return cohere.Client(os.getenv("COHERE_API_KEY"))
+
+
+_FACTORIES = {"db": _create_db, "cohere": _create_cohere}
+
+
+def get_client(name):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(name)
+        if client is None:
+            start = time.perf_counter()
+            try:
+                client = _FACTORIES[name]()
+            except Exception as e:
+                logger.error(f"Failed to initialize {name} client: {e}")
+                raise
+            _timings[name] = time.perf_counter() - start
+            _clients[name] = client
+            logger.info(f"{name} client initialized in {_timings[name] * 1000:.0f} ms.")
+    return client
+
+
+def set_client(name, client):
+    # Install a ready-made client (e.g. an in-process fake for benchmarks);
+    # None drops it so the next get_client() creates a real one
+    with _lock:
+        if client is None:
+            _clients.pop(name, None)
+        else:
+            _clients[name] = client
+
+
+def get_db():
+    return get_client("db")
+
+
+def get_cohere():
+    return get_client("cohere")
+
+
+def warm_up(names=("db", "cohere"), background=False):
+    """Create clients ahead of the first request.
+
+    With background=True the work runs on a daemon thread and the thread is
+    returned; otherwise the startup report is returned.
+    """
+    def run():
+        for name in names:
+            try:
+                get_client(name)
+            except Exception:
+                pass  # Already logged; the first real call will raise
+        logger.info(f"Startup report: {startup_report()}")
+
+    if background:
+        thread = threading.Thread(target=run, name="client-warm-up", daemon=True)
+        thread.start()
+        return thread
+    run()
+    return startup_report()
+
+
+def startup_report():
+    # Seconds spent creating each client, plus time since this module was imported
+    return {
+        "clients": {name: round(seconds, 4) for name, seconds in _timings.items()},
+        "since_start": round(time.perf_counter() - _process_start, 4),
+    }
@@ -1,44 +1,162 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
+import json
+import time
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
+from clients import get_db
+from patient_stats import apply_deltas, patient_deltas
+from triage_rules import engine as triage_rules
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Firebase if not already initialized
-if not firebase_admin._apps:
-    cred = credentials.Certificate(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
-    firebase_admin.initialize_app(cred)
+# Each changed patient costs one write; leave room in the 500-op batch limit
+# for the merged counter increments
+WRITES_PER_BATCH = 450
 
-# Get Firestore client
-db = firestore.client()
+def load_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
 
-def update_triage_scores():
-    # Get all patients
+def save_checkpoint(path, checkpoint):
+    # Write-then-rename so a crash never leaves a half-written checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def rescore(snapshots, now):
+    # (snapshot, changes) for every patient whose score changes under the
+    # current rules, scored in one vectorized pass
+    records = [snapshot.to_dict() for snapshot in snapshots]
+    new_scores = triage_rules.score_many(records).tolist() if records else []
+    return [
+        (snapshot, {"triage_score": new_triage_score, "last_updated": now})
+        for snapshot, data, new_triage_score in zip(snapshots, records, new_scores)
+        if new_triage_score != data.get("triage_score")
+    ]
+
+def commit_updates(db, updates, attempts=3):
+    # updates: list of (snapshot, changes); counter deltas for the whole batch
+    # are merged so they cost one write per aggregate. Each update requires the
+    # document to be unchanged since it was read, so a patient re-ingested
+    # meanwhile never gets a score (or counter deltas) from stale data; on a
+    # conflict the batch is re-read and rescored.
+    from google.api_core.exceptions import FailedPrecondition
+
+    for attempt in range(attempts):
+        batch = db.batch()
+        deltas = {}
+        for snapshot, changes in updates:
+            batch.update(snapshot.reference, changes,
+                         option=db.write_option(last_update_time=snapshot.update_time))
+            data = snapshot.to_dict()
+            for name, delta in patient_deltas(data, {**data, **changes}).items():
+                deltas.setdefault(name, Counter()).update(delta)
+        apply_deltas(batch, db, {name: {k: v for k, v in delta.items() if v} for name, delta in deltas.items()})
+        try:
+            batch.commit()
+            return len(updates)
+        except FailedPrecondition:
+            if attempt == attempts - 1:
+                raise
+            snapshots = db.get_all([snapshot.reference for snapshot, _ in updates])
+            updates = rescore([snapshot for snapshot in snapshots if snapshot.exists], datetime.now().isoformat())
+            if not updates:
+                return 0
+
+def update_triage_scores(chunk_size=500, workers=8, checkpoint_path=".backfill_checkpoint.json",
+                         dry_run=False, resume=True):
+    db = get_db()
     patients_ref = db.collection("patients")
-    patients = patients_ref.stream()
-    
-    for patient in patients:
-        data = patient.to_dict()
-        symptoms = [s.lower().strip() for s in data.get('symptoms', [])]
-        print(f"\nPatient {data.get('patient_id')}:")
-        print(f"Symptoms: {symptoms}")
-        print(f"Current triage score: {data.get('triage_score')}")
-        
-        # Check for chest pain
-        has_chest_pain = any(s in ['chest pain', 'chest-pain', 'chestpain'] for s in symptoms)
-        
-        # Update triage score if needed
-        new_triage_score = 0.9 if has_chest_pain else 0.5
-        if new_triage_score != data.get('triage_score'):
-            print(f"Updating triage score to: {new_triage_score}")
-            patients_ref.document(patient.id).update({
-                'triage_score': new_triage_score
-            })
-        else:
-            print("Triage score is correct")
+    checkpoint = load_checkpoint(checkpoint_path) if resume and not dry_run else {}
+    last_id = checkpoint.get("last_id")
+    stats = {"scanned": checkpoint.get("scanned", 0), "changed": checkpoint.get("changed", 0), "written": 0}
+    if last_id:
+        print(f"Resuming after patient document {last_id} ({stats['scanned']} already scanned)")
+
+    # Chunks whose writes are still in flight, oldest first; the checkpoint only
+    # advances past a chunk once all of its batches have committed
+    pending = deque()
+    resumed_at = stats["scanned"]
+    start = time.perf_counter()
+
+    def settle_oldest():
+        chunk_last_id, futures, scanned, changed = pending.popleft()
+        for future in futures:
+            stats["written"] += future.result()
+        if not dry_run and checkpoint_path:
+            save_checkpoint(checkpoint_path, {"last_id": chunk_last_id, "scanned": scanned, "changed": changed})
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        cursor = patients_ref.document(last_id).get() if last_id else None
+        while True:
+            # Read one page in document-ID order
+            query = patients_ref.order_by("__name__").limit(chunk_size)
+            if cursor is not None:
+                query = query.start_after(cursor)
+            snapshots = list(query.stream())
+            if not snapshots:
+                break
+            cursor = snapshots[-1]
+
+            # Score the whole chunk in one vectorized pass
+            updates = rescore(snapshots, datetime.now().isoformat())
+            if dry_run:
+                for snapshot, changes in updates:
+                    print(f"{snapshot.id}: {snapshot.get('triage_score')} -> {changes['triage_score']}")
+            stats["scanned"] += len(snapshots)
+            stats["changed"] += len(updates)
+
+            futures = []
+            if not dry_run:
+                futures = [
+                    pool.submit(commit_updates, db, updates[i:i + WRITES_PER_BATCH])
+                    for i in range(0, len(updates), WRITES_PER_BATCH)
+                ]
+            pending.append((cursor.id, futures, stats["scanned"], stats["changed"]))
+
+            # Backpressure: keep at most a couple of chunks in flight per worker
+            while pending and (len(pending) > workers * 2 or all(f.done() for f in pending[0][1])):
+                settle_oldest()
+
+            elapsed = time.perf_counter() - start
+            print(f"Scanned {stats['scanned']} | changed {stats['changed']} | written {stats['written']} | "
+                  f"{(stats['scanned'] - resumed_at) / elapsed if elapsed else 0:.0f} docs/s")
+
+            if len(snapshots) < chunk_size:
+                break
+
+        while pending:
+            settle_oldest()
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed"] = elapsed
+    print(f"\nDone in {elapsed:.1f}s: scanned {stats['scanned']}, changed {stats['changed']}, "
+          f"written {stats['written']}{' (dry run)' if dry_run else ''}")
+    if not dry_run and checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return stats
 
 if __name__ == "__main__":
-    update_triage_scores()
+    parser = argparse.ArgumentParser(description="Rescore every patient with the current triage rules.")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Patients read and scored per page")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent batch commits")
+    parser.add_argument("--checkpoint", default=".backfill_checkpoint.json", help="Resume checkpoint file")
+    parser.add_argument("--dry-run", action="store_true", help="Print score changes without writing")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    update_triage_scores(
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        dry_run=args.dry_run,
+        resume=not args.restart,
+    )
     print("\nTriage scores have been updated.")
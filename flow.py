@@ -0,0 +1,192 @@
+import time
+import logging
+import inspect
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StepTimeout(TimeoutError):
+    pass
+
+
+class Step:
+    """One node in a flow.
+
+    ``run`` is called with the step's declared inputs as keyword arguments and
+    must return a dict holding its declared outputs. If it raises or exceeds
+    ``timeout`` seconds and a ``fallback`` is given, ``fallback(error, **inputs)``
+    supplies the outputs instead; otherwise the flow fails.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), timeout=None, fallback=None):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.timeout = timeout
+        self.fallback = fallback
+
+    def __repr__(self):
+        return f"Step({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+    def call(self, context):
+        with metrics.track("node", self.name):
+            return self._check(self.run(**{key: context[key] for key in self.inputs}))
+
+    def recover(self, context, error):
+        if self.fallback is None:
+            raise error
+        logger.warning(f"Step {self.name} failed ({error!r}); using fallback.")
+        return self._check(self.fallback(error, **{key: context[key] for key in self.inputs}))
+
+    def _check(self, result):
+        missing = [key for key in self.outputs if key not in (result or {})]
+        if missing:
+            raise ValueError(f"Step {self.name} did not produce {missing}")
+        return {key: result[key] for key in self.outputs}
+
+
+class Flow:
+    """Dependency-aware executor: steps whose inputs are available run concurrently.
+
+    Dependencies are derived from the declared inputs and outputs; a step
+    starts as soon as everything it reads is in the context, so independent
+    steps overlap and a chain A -> B still runs in order.
+    """
+
+    def __init__(self, steps, max_workers=32):
+        self.steps = list(steps)
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        producers = {}
+        for step in self.steps:
+            for key in step.outputs:
+                if key in producers:
+                    raise ValueError(f"Output {key!r} produced by both {producers[key].name} and {step.name}")
+                producers[key] = step
+        self.producers = producers
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(step):
+            if step.name in done:
+                return
+            if step.name in visiting:
+                raise ValueError(f"Flow has a dependency cycle through {step.name}")
+            visiting.add(step.name)
+            for key in step.inputs:
+                if key in self.producers:
+                    visit(self.producers[key])
+            visiting.discard(step.name)
+            done.add(step.name)
+
+        for step in self.steps:
+            visit(step)
+
+    @property
+    def pool(self):
+        # Shared across runs so concurrent flows don't each spin up threads
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="flow")
+        return self._pool
+
+    def _external_inputs(self, context):
+        missing = {key for step in self.steps for key in step.inputs
+                   if key not in self.producers and key not in context}
+        if missing:
+            raise KeyError(f"Flow inputs not provided: {sorted(missing)}")
+
+    def run(self, inputs):
+        """Run the flow on a thread pool and return the final context dict."""
+        context = dict(inputs)
+        self._external_inputs(context)
+        pending = list(self.steps)
+        running = {}  # future -> (step, deadline)
+        try:
+            while pending or running:
+                for step in [s for s in pending if all(key in context for key in s.inputs)]:
+                    pending.remove(step)
+                    deadline = time.monotonic() + step.timeout if step.timeout is not None else None
+                    running[self.pool.submit(step.call, context.copy())] = (step, deadline)
+                if not running:
+                    raise RuntimeError(f"Flow stalled; unresolved steps: {pending}")
+
+                deadlines = [d for _, d in running.values() if d is not None]
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                now = time.monotonic()
+                for future in list(running):
+                    step, deadline = running[future]
+                    if future in done:
+                        del running[future]
+                        try:
+                            context.update(future.result())
+                        except Exception as e:
+                            context.update(step.recover(context, e))
+                    elif deadline is not None and now >= deadline:
+                        # The thread can't be interrupted; abandon its result
+                        del running[future]
+                        future.cancel()
+                        context.update(step.recover(
+                            context, StepTimeout(f"Step {step.name} timed out after {step.timeout}s")
+                        ))
+        finally:
+            for future in running:
+                future.cancel()
+        return context
+
+    async def arun(self, inputs):
+        """asyncio variant: coroutine steps are awaited, plain steps run in the pool."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        context = dict(inputs)
+        self._external_inputs(context)
+        pending = list(self.steps)
+        running = {}  # task -> step
+
+        async def execute(step, snapshot):
+            if inspect.iscoroutinefunction(step.run):
+                with metrics.track("node", step.name):
+                    result = step._check(await step.run(**{key: snapshot[key] for key in step.inputs}))
+            else:
+                result = await loop.run_in_executor(self.pool, step.call, snapshot)
+            return result
+
+        try:
+            while pending or running:
+                for step in [s for s in pending if all(key in context for key in s.inputs)]:
+                    pending.remove(step)
+                    coro = execute(step, context.copy())
+                    if step.timeout is not None:
+                        coro = asyncio.wait_for(coro, step.timeout)
+                    running[asyncio.ensure_future(coro)] = step
+                if not running:
+                    raise RuntimeError(f"Flow stalled; unresolved steps: {pending}")
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    step = running.pop(task)
+                    try:
+                        context.update(task.result())
+                    except asyncio.TimeoutError:
+                        context.update(step.recover(
+                            context, StepTimeout(f"Step {step.name} timed out after {step.timeout}s")
+                        ))
+                    except Exception as e:
+                        context.update(step.recover(context, e))
+        finally:
+            for task in running:
+                task.cancel()
+        return context
@@ -0,0 +1,431 @@
+"""Capacity-aware batch assignment of patients to hospitals.
+
+Minimizes the total acuity-weighted travel distance (plus a penalty where a
+hospital lacks the specialty a patient's symptoms call for) subject to each
+hospital's free beds. Patients that don't fit are left unassigned, lowest
+acuity first.
+
+The solver is a min-cost flow specialized to this shape: patients are added
+one at a time along shortest augmenting paths over the hospital nodes (moving
+already-placed patients between hospitals when that is cheaper), so every
+intermediate assignment is optimal and capacity changes or discharges are
+re-solved incrementally instead of from scratch.
+
+    python hospital_allocation.py             # assign pending patients
+    python hospital_allocation.py --watch     # also re-solve as hospital capacity changes
+"""
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from hospital_index import EARTH_RADIUS_M
+from patient_queries import priority_band
+from patient_stats import apply_deltas, patient_deltas
+from symptom_lexicon import lexicon
+
+logger = logging.getLogger(__name__)
+
+UNASSIGNED = "No hospital found"
+ACUITY_WEIGHTS = {"High": 4.0, "Medium": 2.0, "Low": 1.0}
+SPECIALTIES = {
+    "Cardiology": {"chest pain", "palpitations", "irregular heartbeat"},
+    "Neurology": {"confusion", "seizure", "slurred speech", "numbness", "severe headache"},
+    "Pulmonology": {"shortness of breath", "difficulty breathing", "wheezing"},
+    "Trauma": {"bleeding", "fracture", "head injury", "burn"},
+}
+SPECIALTY_PENALTY_KM = 15.0  # Extra distance we'd accept to reach the right specialty
+UNASSIGNED_PENALTY_KM = 500.0  # Cost of leaving a patient without a bed
+DEFAULT_LOCATION = (37.7749, -122.4194)  # Same mock location as ResourceAllocationNode
+_TOLERANCE = 1e-9
+
+
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """Great-circle distances in km between every point in (lat1, lon1) and every point in (lat2, lon2)."""
+    import numpy as np
+
+    phi1 = np.radians(np.asarray(lat1, dtype=np.float64))[:, None]
+    phi2 = np.radians(np.asarray(lat2, dtype=np.float64))[None, :]
+    dlam = np.radians(np.asarray(lon2, dtype=np.float64))[None, :] - np.radians(np.asarray(lon1, dtype=np.float64))[:, None]
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M / 1000 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def free_beds(hospital, default=10):
+    # Explicit free beds, else total beds less the occupancy percentage the dashboard shows
+    if hospital.get("available_beds") is not None:
+        return max(0, int(hospital["available_beds"]))
+    if hospital.get("beds") is not None:
+        return max(0, int(hospital["beds"] * (100 - hospital.get("capacity", 0)) / 100))
+    return default
+
+
+def needed_specialty(patient):
+    symptoms = set(lexicon.codes(patient.get("symptoms")))
+    for specialty, triggers in SPECIALTIES.items():
+        if symptoms & triggers:
+            return specialty
+    return None
+
+
+def _location(record):
+    location = record.get("location") or {}
+    lat = record.get("lat", location.get("lat", location.get("latitude")))
+    lon = record.get("lon", location.get("lon", location.get("longitude")))
+    return (float(lat), float(lon)) if lat is not None and lon is not None else None
+
+
+def cost_matrix(patients, hospitals):
+    """Acuity-weighted cost (in km) of sending each patient to each hospital.
+
+    Hospitals without coordinates use their stored ``distance`` (km) for every
+    patient, as the dashboard does; patients without a location are placed at
+    DEFAULT_LOCATION. Returns (costs, weights).
+    """
+    import numpy as np
+
+    n, h = len(patients), len(hospitals)
+    weights = np.array([ACUITY_WEIGHTS[priority_band(p.get("triage_score", 0))] for p in patients])
+    points = [_location(p) or DEFAULT_LOCATION for p in patients]
+    sites = [_location(hospital) for hospital in hospitals]
+    distance = np.zeros((n, h))
+    located = [j for j, site in enumerate(sites) if site is not None]
+    if located and n:
+        distance[:, located] = haversine_matrix(
+            [lat for lat, _ in points], [lon for _, lon in points],
+            [sites[j][0] for j in located], [sites[j][1] for j in located],
+        )
+    for j, site in enumerate(sites):
+        if site is None:
+            distance[:, j] = float(hospitals[j].get("distance") or UNASSIGNED_PENALTY_KM)
+
+    offered = [{s.strip() for s in str(hospital.get("specialty") or "General").split(",")} for hospital in hospitals]
+    penalty = np.zeros((n, h))
+    for i, patient in enumerate(patients):
+        specialty = needed_specialty(patient)
+        if specialty:
+            penalty[i] = [0.0 if specialty in names else SPECIALTY_PENALTY_KM for names in offered]
+    return weights[:, None] * (distance + penalty), weights
+
+
+class Allocator:
+    """Incremental capacity-constrained assignment of patients to hospitals.
+
+    Column ``h`` (one past the last hospital) is a virtual "unassigned" hospital
+    with unlimited room and a cost of UNASSIGNED_PENALTY_KM, so the problem is
+    always feasible. ``transfer[j, k]`` holds the cheapest cost of moving one of
+    hospital j's patients to hospital k (``mover[j, k]`` says which); shortest
+    paths over that small dense matrix are the augmenting paths.
+    """
+
+    def __init__(self, hospitals, default_beds=10):
+        import numpy as np
+
+        self.hospitals = list(hospitals)
+        self.names = [hospital.get("name", f"Hospital {j}") for j, hospital in enumerate(self.hospitals)]
+        h = len(self.hospitals)
+        self.capacity = np.array([free_beds(hospital, default_beds) for hospital in self.hospitals] + [0],
+                                 dtype=np.int64)
+        self.load = np.zeros(h + 1, dtype=np.int64)
+        self.patients = []  # Patient dicts by row
+        self.rows = {}  # patient_id -> row
+        self.costs = np.zeros((0, h + 1))
+        self.where = np.zeros(0, dtype=np.int64)  # Column per row; -1 once removed
+        self.transfer = np.full((h + 1, h + 1), np.inf)
+        self.mover = np.full((h + 1, h + 1), -1, dtype=np.int64)
+        self.moves = 0
+        self._lock = threading.Lock()
+
+    @property
+    def _unassigned(self):
+        return len(self.hospitals)
+
+    def _has_room(self, column):
+        return column == self._unassigned or self.load[column] < self.capacity[column]
+
+    def _room(self):
+        room = self.load < self.capacity
+        room[self._unassigned] = True
+        return room
+
+    def _refresh(self, columns):
+        # Recompute transfer rows for hospitals whose patients changed
+        import numpy as np
+
+        for j in set(columns):
+            members = np.flatnonzero(self.where == j)
+            if not len(members):
+                self.transfer[j] = np.inf
+                self.mover[j] = -1
+                continue
+            delta = self.costs[members] - self.costs[members, j][:, None]
+            best = np.argmin(delta, axis=0)
+            self.transfer[j] = delta[best, np.arange(delta.shape[1])]
+            self.mover[j] = members[best]
+            self.transfer[j, j] = np.inf
+
+    def _shortest(self, start):
+        # Bellman-Ford from a start distance vector; transfer costs can be
+        # negative but the current assignment is optimal, so there's no negative cycle
+        import numpy as np
+
+        dist = start.copy()
+        pred = np.full(len(dist), -1, dtype=np.int64)
+        # Only columns whose distance just improved can improve others
+        frontier = np.flatnonzero(np.isfinite(dist) & np.isfinite(self.transfer).any(axis=1))
+        for _ in range(len(dist)):
+            if not len(frontier):
+                break
+            candidates = dist[frontier, None] + self.transfer[frontier]
+            via = np.argmin(candidates, axis=0)
+            best = candidates[via, np.arange(len(dist))]
+            better = best < dist - _TOLERANCE
+            dist[better] = best[better]
+            pred[better] = frontier[via[better]]
+            frontier = np.flatnonzero(better)
+        return dist, pred
+
+    def _path(self, pred, end, source=None):
+        # Columns from the head of a shortest path (or `source`) to `end`
+        path = [end]
+        while pred[path[-1]] >= 0 and len(path) <= len(pred):
+            path.append(int(pred[path[-1]]))
+        if source is not None:
+            path.append(source)
+        return path[::-1]
+
+    def _move(self, path):
+        # Shift one patient along each hop of the path, using the movers chosen
+        # before any of them moved
+        movers = [self.mover[j, k] for j, k in zip(path, path[1:])]
+        for row, j, k in zip(movers, path, path[1:]):
+            self.where[row] = k
+            self.load[j] -= 1
+            self.load[k] += 1
+            self.moves += 1
+        self._refresh(path)
+
+    def add(self, patients):
+        """Place new patients (re-adding a known patient_id re-places it)."""
+        import numpy as np
+
+        with self._lock:
+            patients = [p for p in patients if p.get("patient_id")]
+            for patient in patients:
+                self._remove(patient["patient_id"])
+            if not patients:
+                return
+            costs, weights = cost_matrix(patients, self.hospitals)
+            first = len(self.patients)
+            self.patients.extend(patients)
+            self.costs = np.vstack([self.costs, np.hstack([costs, weights[:, None] * UNASSIGNED_PENALTY_KM])])
+            self.where = np.concatenate([self.where, np.full(len(patients), -1, dtype=np.int64)])
+            for offset, patient in enumerate(patients):
+                self.rows[patient["patient_id"]] = first + offset
+            # Highest acuity first keeps later augmenting paths short
+            for offset in np.argsort(-weights, kind="stable"):
+                self._augment(first + int(offset))
+
+    def _augment(self, row):
+        import numpy as np
+
+        # Shortest path from the new patient to any column with room; placed
+        # patients along the path each shift one hop to make space
+        costs = self.costs[row]
+        cheapest = int(costs.argmin())
+        if self._has_room(cheapest):
+            # Any chain of moves ends in a column with room and, the current
+            # assignment being optimal, costs at least the direct placement
+            self.where[row] = cheapest
+            self.load[cheapest] += 1
+            self._refresh([cheapest])
+            return
+        dist, pred = self._shortest(costs.copy())
+        end = int(np.argmin(np.where(self._room(), dist, np.inf)))
+        path = self._path(pred, end)
+        self._move(path)
+        self.where[row] = path[0]
+        self.load[path[0]] += 1
+        self._refresh([path[0]])
+
+    def remove(self, patient_id):
+        """Discharge a patient and let others move into the freed bed."""
+        with self._lock:
+            self._remove(patient_id)
+
+    def _remove(self, patient_id):
+        row = self.rows.pop(patient_id, None)
+        if row is None or self.where[row] < 0:
+            return
+        column = self.where[row]
+        self.where[row] = -1
+        self.load[column] -= 1
+        self._refresh([column])
+        self._fill()
+
+    def set_capacity(self, name, beds):
+        """Change a hospital's free beds and re-solve incrementally."""
+        import numpy as np
+
+        with self._lock:
+            j = self.names.index(name)
+            self.capacity[j] = max(0, int(beds))
+            # Over capacity: push patients out along the cheapest chains of moves
+            while self.load[j] > self.capacity[j]:
+                start = self.transfer[j].copy()
+                dist, pred = self._shortest(start)
+                room = self._room()
+                room[j] = False
+                end = int(np.argmin(np.where(room, dist, np.inf)))
+                self._move(self._path(pred, end, source=j))
+            self._fill()
+
+    def _fill(self):
+        # Beds opened up: while some chain of moves into a hospital with room
+        # lowers the total cost, apply the cheapest. Each pass is one
+        # Bellman-Ford on the reversed graph from every column with room.
+        import numpy as np
+
+        rows = np.arange(len(self.capacity))
+        while True:
+            dist = np.where(self._room(), 0.0, np.inf)
+            succ = np.full(len(rows), -1, dtype=np.int64)
+            for _ in range(len(rows)):
+                candidates = self.transfer + dist[None, :]
+                via = np.argmin(candidates, axis=1)
+                better = candidates[rows, via] < dist - _TOLERANCE
+                if not better.any():
+                    break
+                dist[better] = candidates[rows, via][better]
+                succ[better] = via[better]
+            start = int(np.argmin(dist))
+            if dist[start] >= -_TOLERANCE:
+                return
+            path = [start]
+            while succ[path[-1]] >= 0 and len(path) <= len(rows):
+                path.append(int(succ[path[-1]]))
+            self._move(path)
+
+    def assignments(self):
+        """patient_id -> hospital name (UNASSIGNED when no bed was available)."""
+        with self._lock:
+            return {patient_id: self._name(self.where[row]) for patient_id, row in self.rows.items()}
+
+    def _name(self, column):
+        return UNASSIGNED if column == self._unassigned else self.names[column]
+
+    def total_cost(self):
+        import numpy as np
+
+        rows = np.flatnonzero(self.where >= 0)
+        return float(self.costs[rows, self.where[rows]].sum())
+
+    def stats(self):
+        return {
+            "patients": len(self.rows),
+            "hospitals": len(self.hospitals),
+            "unassigned": int(self.load[self._unassigned]),
+            "moves": self.moves,
+            "total_cost": self.total_cost(),
+        }
+
+
+def allocate(patients, hospitals, default_beds=10):
+    """One-shot batch assignment: patient_id -> hospital name."""
+    allocator = Allocator(hospitals, default_beds)
+    allocator.add(patients)
+    return allocator.assignments()
+
+
+def pending_patients(collection):
+    # Patients still waiting for a hospital
+    for doc in collection.stream():
+        patient = doc.to_dict()
+        if patient.get("recommended_hospital") in (None, "", UNASSIGNED):
+            yield patient
+
+
+def write_assignments(writer, collection, assignments, previous):
+    # Only patients whose hospital changed are written. The per-hospital
+    # counters move in the same batch, and last_updated lets polling mirrors
+    # (patient_sync) pick the change up.
+    changed = 0
+    for patient_id, hospital in assignments.items():
+        if previous.get(patient_id) != hospital:
+            writer.update(
+                collection.document(patient_id),
+                {"recommended_hospital": hospital, "last_updated": datetime.now().isoformat()},
+                derive=lambda batch, old, new: apply_deltas(batch, writer.db, patient_deltas(old, new)),
+            )
+            changed += 1
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Assign pending patients to hospitals by capacity and acuity.")
+    parser.add_argument("--all", action="store_true", help="Re-assign every patient, not just pending ones")
+    parser.add_argument("--default-beds", type=int, default=10, help="Free beds for hospitals that don't report any")
+    parser.add_argument("--watch", action="store_true", help="Keep running and re-solve when hospitals change")
+    parser.add_argument("--dry-run", action="store_true", help="Print assignments instead of writing them")
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    from clients import get_db
+    from batch_writer import BatchWriter
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    db = get_db()
+    patients_ref = db.collection("patients")
+    hospitals = [doc.to_dict() for doc in db.collection("hospitals").stream()]
+    patients = ([doc.to_dict() for doc in patients_ref.stream()] if args.all
+                else list(pending_patients(patients_ref)))
+
+    start = time.perf_counter()
+    allocator = Allocator(hospitals, args.default_beds)
+    allocator.add(patients)
+    elapsed = time.perf_counter() - start
+    assignments = allocator.assignments()
+    print(f"Assigned {len(patients)} patients across {len(hospitals)} hospitals in {elapsed * 1000:.1f} ms: "
+          f"{allocator.stats()}", file=sys.stderr)
+    if args.dry_run:
+        for patient_id, hospital in sorted(assignments.items()):
+            print(f"{patient_id}\t{hospital}")
+        return
+
+    writer = BatchWriter(db)
+    previous = {p.get("patient_id"): p.get("recommended_hospital") for p in patients}
+    try:
+        write_assignments(writer, patients_ref, assignments, previous)
+        if not args.watch:
+            return
+        lock = threading.Lock()
+
+        def on_snapshot(docs, changes, read_time):
+            with lock:
+                nonlocal assignments
+                for change in changes:
+                    hospital = change.document.to_dict()
+                    if change.type.name == "MODIFIED" and hospital.get("name") in allocator.names:
+                        allocator.set_capacity(hospital["name"], free_beds(hospital, args.default_beds))
+                updated = allocator.assignments()
+                changed = write_assignments(writer, patients_ref, updated, assignments)
+                if changed:
+                    logger.info(f"Hospital capacity changed; re-assigned {changed} patients")
+                assignments = updated
+
+        watch = db.collection("hospitals").on_snapshot(on_snapshot)
+        print("Watching hospital capacity; Ctrl+C to stop", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            watch.unsubscribe()
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import gzip
+import math
+import heapq
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+DEFAULT_INDEX_PATH = os.getenv("HOSPITAL_INDEX_PATH", "hospital_index.json.gz")
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Great-circle distance in meters
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlam = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _to_xyz(lat, lon):
+    # Unit-sphere coordinates; straight-line (chord) distance between two points
+    # is monotonic in their haversine distance, so a plain 3-D KD-tree works
+    phi, lam = math.radians(lat), math.radians(lon)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def _chord(meters):
+    return 2 * math.sin(min(meters / EARTH_RADIUS_M, math.pi) / 2)
+
+
+class HospitalIndex:
+    """In-process KD-tree over hospital locations answering k-nearest queries."""
+
+    def __init__(self, hospitals):
+        # hospitals: list of {"name", "lat", "lon", ...} dicts
+        self.hospitals = [h for h in hospitals if h.get("lat") is not None and h.get("lon") is not None]
+        self._points = [_to_xyz(h["lat"], h["lon"]) for h in self.hospitals]
+        # Flat tree: node -> (point index, split axis, left node, right node)
+        self._nodes = []
+        self._root = self._build(list(range(len(self._points))), 0)
+
+    def __len__(self):
+        return len(self.hospitals)
+
+    def _build(self, indices, depth):
+        if not indices:
+            return -1
+        axis = depth % 3
+        indices.sort(key=lambda i: self._points[i][axis])
+        mid = len(indices) // 2
+        node = len(self._nodes)
+        self._nodes.append(None)
+        left = self._build(indices[:mid], depth + 1)
+        right = self._build(indices[mid + 1:], depth + 1)
+        self._nodes[node] = (indices[mid], axis, left, right)
+        return node
+
+    def nearest(self, latitude, longitude, k=1, radius=None):
+        """Return up to k (distance_m, hospital) pairs, nearest first, within radius meters."""
+        if not self._nodes or k < 1:
+            return []
+        target = _to_xyz(latitude, longitude)
+        bound = _chord(radius) ** 2 if radius is not None else float("inf")
+        best = []  # max-heap of (-squared chord, point index)
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            index, axis, left, right = self._nodes[node]
+            point = self._points[index]
+            d2 = (point[0] - target[0]) ** 2 + (point[1] - target[1]) ** 2 + (point[2] - target[2]) ** 2
+            if d2 <= bound:
+                if len(best) < k:
+                    heapq.heappush(best, (-d2, index))
+                elif d2 < -best[0][0]:
+                    heapq.heapreplace(best, (-d2, index))
+            limit = bound if len(best) < k else min(bound, -best[0][0])
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            if diff * diff <= limit:
+                stack.append(far)
+            stack.append(near)
+
+        results = []
+        for _, index in sorted(best, key=lambda item: -item[0]):
+            hospital = self.hospitals[index]
+            results.append((haversine(latitude, longitude, hospital["lat"], hospital["lon"]), hospital))
+        return results
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        # Compact columnar layout; the tree itself is rebuilt on load
+        payload = {
+            "version": 1,
+            "names": [h.get("name") for h in self.hospitals],
+            "lat": [round(h["lat"], 6) for h in self.hospitals],
+            "lon": [round(h["lon"], 6) for h in self.hospitals],
+            "osm_id": [h.get("osm_id") for h in self.hospitals],
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(payload, f, separators=(",", ":"))
+        logger.info(f"Saved hospital index with {len(self)} hospitals to {path}")
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            payload = json.load(f)
+        hospitals = [
+            {"name": name, "lat": lat, "lon": lon, "osm_id": osm_id}
+            for name, lat, lon, osm_id in zip(payload["names"], payload["lat"], payload["lon"], payload["osm_id"])
+        ]
+        return cls(hospitals)
+
+    @classmethod
+    def from_overpass(cls, data):
+        hospitals = []
+        for element in (data or {}).get("elements", []):
+            tags = element.get("tags") or {}
+            if tags.get("amenity") != "hospital":
+                continue
+            lat = element.get("lat", (element.get("center") or {}).get("lat"))
+            lon = element.get("lon", (element.get("center") or {}).get("lon"))
+            hospitals.append({"name": tags.get("name"), "lat": lat, "lon": lon, "osm_id": element.get("id")})
+        return cls(hospitals)
+
+    @classmethod
+    def from_geojson(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        hospitals = []
+        for feature in data.get("features", []):
+            geometry = feature.get("geometry") or {}
+            properties = feature.get("properties") or {}
+            if geometry.get("type") != "Point":
+                continue
+            lon, lat = geometry["coordinates"][:2]
+            hospitals.append({
+                "name": properties.get("name"),
+                "lat": lat,
+                "lon": lon,
+                "osm_id": properties.get("osm_id", feature.get("id")),
+            })
+        return cls(hospitals)
+
+
+_index = None
+_index_loaded = False
+
+
+def get_index(path=DEFAULT_INDEX_PATH):
+    # Lazily load the prebuilt index once per process; None when no file exists
+    global _index, _index_loaded
+    if not _index_loaded:
+        _index_loaded = True
+        if os.path.exists(path):
+            try:
+                _index = HospitalIndex.load(path)
+                logger.info(f"Loaded hospital index with {len(_index)} hospitals from {path}")
+            except Exception as e:
+                logger.error(f"Failed to load hospital index {path}: {e}")
+    return _index
+
+
+def fetch_overpass_area(south, west, north, east, timeout=180):
+    import requests
+
+    query = f"""
+    [out:json][timeout:{timeout}];
+    nwr["amenity"="hospital"]({south},{west},{north},{east});
+    out center tags;
+    """
+    response = requests.get("https://overpass-api.de/api/interpreter", params={"data": query}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh the offline hospital index.")
+    parser.add_argument("--out", default=DEFAULT_INDEX_PATH, help="Index file to write")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--bbox", nargs=4, type=float, metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+                        help="Refresh from Overpass for this bounding box")
+    source.add_argument("--geojson", help="Build from a GeoJSON extract of hospital points")
+    source.add_argument("--overpass-json", help="Build from a saved Overpass JSON response")
+    args = parser.parse_args(argv)
+
+    if args.bbox:
+        index = HospitalIndex.from_overpass(fetch_overpass_area(*args.bbox))
+    elif args.geojson:
+        index = HospitalIndex.from_geojson(args.geojson)
+    else:
+        with open(args.overpass_json, encoding="utf-8") as f:
+            index = HospitalIndex.from_overpass(json.load(f))
+
+    if not len(index):
+        print("No hospitals found; index not written.", file=sys.stderr)
+        return 1
+    index.save(args.out)
+    print(f"Wrote {len(index)} hospitals to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import time
+import random
+import logging
+import threading
+
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth another attempt; anything else is returned to the caller as-is
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Fail fast after repeated failures.
+
+    Opens after ``failure_threshold`` consecutive failed requests. Once
+    ``reset_timeout`` seconds have passed a single probe request is let through
+    (half-open); its outcome closes the circuit or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning(f"Circuit opened after {self._failures} consecutive failures.")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class HttpClient:
+    """Shared keep-alive session with strict timeouts, jittered retries and a circuit breaker.
+
+    Safe to share across threads; connections are pooled per host, so repeated
+    calls reuse one TLS connection instead of handshaking every time.
+    """
+
+    def __init__(self, name, connect_timeout=3.05, read_timeout=10.0, max_retries=2, backoff=0.25,
+                 max_backoff=5.0, pool_size=16, breaker=None):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._session = None
+        self._adapter = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.short_circuits = 0
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    # Retries are handled here so they share the breaker and metrics
+                    self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+                    session = requests.Session()
+                    session.mount("http://", self._adapter)
+                    session.mount("https://", self._adapter)
+                    self._session = session
+        return self._session
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Send a request, retrying connection errors, timeouts and retryable statuses.
+
+        Raises CircuitOpenError without touching the network while the circuit
+        is open. Non-retryable responses (e.g. 404) are returned for the caller
+        to check; they don't count against the breaker.
+        """
+        import requests
+
+        if not self.breaker.allow():
+            self.short_circuits += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        kwargs.setdefault("timeout", self.timeout)
+        session = self.session
+        self.requests += 1
+        error = None
+        for attempt in range(self.max_retries + 1):
+            delay = None
+            try:
+                with metrics.track("external", self.name):
+                    response = session.request(method, url, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                error = requests.exceptions.HTTPError(
+                    f"{response.status_code} from {self.name}", response=response
+                )
+                delay = _retry_after(response)
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except Exception:
+                # Not transient (bad URL, TLS config...); still settle the breaker
+                self.failures += 1
+                self.breaker.record_failure()
+                raise
+
+            if attempt < self.max_retries:
+                metrics.count_retry("external", self.name)
+                self.retries += 1
+                if delay is None:
+                    delay = self.backoff * (2 ** attempt) * (0.5 + random.random())
+                time.sleep(min(delay, self.max_backoff))
+
+        self.failures += 1
+        self.breaker.record_failure()
+        raise error
+
+    def connection_stats(self):
+        # Connections opened vs requests sent across the pooled hosts; a ratio
+        # near 1.0 means keep-alive isn't working
+        opened = sent = 0
+        if self._adapter is not None:
+            pools = self._adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    opened += pool.num_connections
+                    sent += pool.num_requests
+        return {"connections_opened": opened, "requests_sent": sent}
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "retries": self.retries,
+            "short_circuits": self.short_circuits,
+            "circuit": self.breaker.state,
+            **self.connection_stats(),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+                self._adapter = None
+
+
+def _retry_after(response):
+    # Honour a numeric Retry-After header on 429/503
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,180 @@
+"""Stream JSON Lines patient intake through the triage flow.
+
+    python ingest.py intake.jsonl.gz --out results.jsonl --errors errors.jsonl
+    cat intake.jsonl | python ingest.py - --out results.jsonl
+
+Records are read lazily and processed with bounded concurrency; at most
+``--window`` records are in flight, so memory stays constant regardless of
+input size. Results are written in input order, and the last fully written
+line is saved to ``<out>.offset`` so an interrupted run resumes where it stopped.
+With ``--buffered``, a record only counts once its WriteBatch has committed; a
+failed commit goes to the errors file like any other failure.
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def open_input(path):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_records(lines, skip=0):
+    # Yields (line_number, record, error) for every non-blank line after `skip`
+    for line_number, line in enumerate(lines, start=1):
+        if line_number <= skip or not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict) or "patient_id" not in record:
+                raise ValueError("record must be a JSON object with a patient_id")
+            yield line_number, record, None
+        except ValueError as e:
+            yield line_number, None, f"Invalid record: {e}"
+
+
+def load_offset(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    return 0
+
+
+def save_offset(path, line_number):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(line_number))
+    os.replace(tmp_path, path)
+
+
+def process_record(flow, record):
+    # (result, buffered save Future or None, error, elapsed)
+    start = time.perf_counter()
+    try:
+        result, saved = flow.submit(record)
+        return result, saved, None, time.perf_counter() - start
+    except Exception as e:
+        return None, None, str(e), time.perf_counter() - start
+
+
+def finished(future):
+    # Processed and, when buffered, committed
+    return future is None or (future.done() and (future.result()[1] is None or future.result()[1].done()))
+
+
+def ingest(lines, flow, out, errors, offset_path, skip=0, workers=8, window=64, report_every=5.0, flush=None):
+    # flush (e.g. BatchWriter.flush) is called when the oldest record is only
+    # waiting for its buffered save, instead of waiting out the flush interval
+    stats = {"processed": 0, "succeeded": 0, "failed": 0}
+    in_flight = deque()
+    start = last_report = time.perf_counter()
+    last_line = skip
+
+    def drain_oldest():
+        nonlocal last_line
+        line_number, record, future, parse_error = in_flight.popleft()
+        if future is None:
+            result, error, elapsed = None, parse_error, 0.0
+        else:
+            result, saved, error, elapsed = future.result()
+            if saved is not None:
+                if not saved.done() and flush is not None:
+                    flush()
+                try:
+                    saved.result()
+                except Exception as e:
+                    result, error = None, f"Failed to save: {e}"
+        if error is None:
+            out.write(json.dumps({"line": line_number, "elapsed": round(elapsed, 4), "result": result},
+                                 default=str) + "\n")
+            stats["succeeded"] += 1
+        else:
+            errors.write(json.dumps({"line": line_number, "error": error, "record": record}, default=str) + "\n")
+            stats["failed"] += 1
+        stats["processed"] += 1
+        last_line = line_number
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest") as pool:
+        for line_number, record, error in read_records(lines, skip):
+            if error is not None:
+                # Keep the parse error in sequence so offsets stay contiguous
+                in_flight.append((line_number, None, None, error))
+            else:
+                in_flight.append((line_number, record, pool.submit(process_record, flow, record), None))
+
+            # Backpressure: stop reading until the oldest record finishes
+            while in_flight and (len(in_flight) >= window or finished(in_flight[0][2])):
+                drain_oldest()
+
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                out.flush()
+                errors.flush()
+                save_offset(offset_path, last_line)
+                print(f"{stats['processed']} records ({stats['failed']} failed), "
+                      f"{stats['processed'] / (now - start):.1f} records/s", file=sys.stderr)
+                last_report = now
+
+        while in_flight:
+            drain_oldest()
+
+    out.flush()
+    errors.flush()
+    save_offset(offset_path, last_line)
+    stats["elapsed"] = time.perf_counter() - start
+    stats["records_per_sec"] = stats["processed"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream JSON Lines intake through the triage flow.")
+    parser.add_argument("input", help="JSONL file, .jsonl.gz file, or - for stdin")
+    parser.add_argument("--out", default="ingest_results.jsonl", help="Results JSONL (appended on resume)")
+    parser.add_argument("--errors", default="ingest_errors.jsonl", help="Errors JSONL (appended on resume)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent triage flows")
+    parser.add_argument("--window", type=int, default=64, help="Maximum records in flight")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved offset and start from line 1")
+    parser.add_argument("--buffered", action="store_true", help="Batch Firestore writes with BatchWriter")
+    args = parser.parse_args(argv)
+
+    from backend import TriageFlow
+    from clients import get_db, warm_up
+
+    offset_path = f"{args.out}.offset"
+    skip = 0 if args.restart or args.input == "-" else load_offset(offset_path)
+    if skip:
+        print(f"Resuming after line {skip}", file=sys.stderr)
+    mode = "w" if skip == 0 else "a"
+
+    warm_up()
+    writer = None
+    if args.buffered:
+        from batch_writer import BatchWriter
+        writer = BatchWriter(get_db())
+    flow = TriageFlow(writer)
+
+    try:
+        with open_input(args.input) as lines, open(args.out, mode) as out, open(args.errors, mode) as errors:
+            stats = ingest(lines, flow, out, errors, offset_path, skip=skip,
+                           workers=args.workers, window=max(args.window, args.workers),
+                           flush=writer.flush if writer is not None else None)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    print(f"Ingested {stats['processed']} records ({stats['succeeded']} ok, {stats['failed']} failed) "
+          f"in {stats['elapsed']:.1f}s, {stats['records_per_sec']:.1f} records/s", file=sys.stderr)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+import json
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import registry as metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Refills at ``rate`` tokens per second up to ``capacity``. Not thread-safe; callers lock."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, n=1, reserve=0):
+        # Seconds until n tokens can be taken while leaving `reserve` behind
+        self._refill()
+        missing = n + reserve - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, n=1):
+        self.tokens -= n
+
+
+class _Request:
+    __slots__ = ("key", "prompt", "params", "future", "priority", "enqueued_at")
+
+    def __init__(self, key, prompt, params, priority):
+        self.key = key
+        self.prompt = prompt
+        self.params = params
+        self.future = Future()
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+
+class LLMBroker:
+    """Request broker in front of a text-generation API.
+
+    - Identical in-flight prompts (same text and parameters) share one call.
+    - Requests are rate limited by a token bucket (one token per API call).
+      High-priority requests are served first and may use the last ``reserve``
+      tokens, so a burst of routine work can't delay a critical patient.
+    - When ``generate_batch`` is given, requests with the same parameters that
+      arrive within ``batch_window`` seconds go out as one call. An optional
+      ``batch_available()`` is checked before each batch is gathered; while it
+      returns False (or raises) requests go one by one.
+
+    ``generate(prompt, **params)`` returns the text; ``generate_batch(prompts,
+    **params)`` returns one text (or exception) per prompt.
+    """
+
+    def __init__(self, generate, generate_batch=None, rate=None, burst=10, reserve=2,
+                 batch_window=0.02, max_batch=16, max_concurrency=8, name="llm", batch_available=None):
+        self.generate_one = generate
+        self.generate_batch = generate_batch
+        self.batch_available = batch_available
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.reserve = min(reserve, burst - 1) if rate else 0
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_concurrency = max_concurrency
+        self.name = name
+        self._high = deque()
+        self._normal = deque()
+        self._inflight = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._dispatcher = None
+        self._pool = None
+        self.running = 0
+        self.submitted = 0
+        self.coalesced = 0
+        self.api_calls = 0
+        self.batched_requests = 0
+        self.throttled = 0
+
+        metrics.add_gauge("llm_queue_depth", lambda: len(self._high), broker=name, lane="high")
+        metrics.add_gauge("llm_queue_depth", lambda: len(self._normal), broker=name, lane="normal")
+        metrics.add_gauge("llm_running", lambda: self.running, broker=name)
+
+    def submit(self, prompt, priority=False, **params):
+        """Queue a prompt and return a Future for its text."""
+        key = (prompt, json.dumps(params, sort_keys=True, default=str))
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LLMBroker is closed")
+            self.submitted += 1
+            request = self._inflight.get(key)
+            if request is not None:
+                self.coalesced += 1
+                if priority and not request.priority and request in self._normal:
+                    # A critical patient joined a routine request; move it up
+                    self._normal.remove(request)
+                    request.priority = True
+                    self._high.append(request)
+                    self._cond.notify_all()
+                return request.future
+
+            request = _Request(key, prompt, params, priority)
+            self._inflight[key] = request
+            (self._high if priority else self._normal).append(request)
+            if self._dispatcher is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix=self.name)
+                self._dispatcher = threading.Thread(target=self._dispatch, name=f"{self.name}-broker", daemon=True)
+                self._dispatcher.start()
+            self._cond.notify_all()
+        return request.future
+
+    def generate(self, prompt, priority=False, timeout=None, **params):
+        return self.submit(prompt, priority=priority, **params).result(timeout)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+            self._pool.submit(self._execute, batch)
+
+    def _next_batch(self):
+        # Caller holds the lock. Waits for a free worker, a request and a
+        # rate-limit token, re-checking the high lane whenever a new request
+        # arrives. Requests stay in their lanes until a worker can take them,
+        # so a high-priority request never queues behind routine ones.
+        while True:
+            lane = self._high or self._normal
+            if not lane:
+                if self._closed:
+                    return None
+                self._cond.wait()
+                continue
+            if self.running >= self.max_concurrency:
+                self._cond.wait()
+                continue
+            if self.bucket is not None:
+                wait = self.bucket.wait_time(1, 0 if lane is self._high else self.reserve)
+                if wait > 0:
+                    self.throttled += 1
+                    self._cond.wait(wait)
+                    continue
+                self.bucket.take(1)
+            batch = [lane.popleft()]
+            self.running += 1
+            break
+
+        if self.generate_batch is None or self.max_batch <= 1 or not self._can_batch():
+            return batch
+        # Gather same-parameter requests; the window runs from when the first
+        # one was queued, so requests already held up by the rate limit don't wait again
+        deadline = batch[0].enqueued_at + self.batch_window
+        while len(batch) < self.max_batch:
+            for queue in (self._high, self._normal):
+                for request in [r for r in queue if r.params == batch[0].params][:self.max_batch - len(batch)]:
+                    queue.remove(request)
+                    batch.append(request)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch or remaining <= 0 or self._closed:
+                break
+            self._cond.wait(remaining)
+        return batch
+
+    def _can_batch(self):
+        if self.batch_available is None:
+            return True
+        try:
+            return bool(self.batch_available())
+        except Exception as e:
+            logger.warning(f"{self.name}: batch availability check failed, sending one by one: {e}")
+            return False
+
+    def _execute(self, batch):
+        try:
+            results = self._call(batch)
+        finally:
+            with self._cond:
+                self.running -= 1
+                self._cond.notify_all()
+
+        with self._cond:
+            for request in batch:
+                self._inflight.pop(request.key, None)
+        for request, result in zip(batch, results):
+            if isinstance(result, Exception):
+                request.future.set_exception(result)
+            else:
+                request.future.set_result(result)
+
+    def _call(self, batch):
+        # One text or exception per request
+        with self._cond:
+            self.api_calls += 1
+        try:
+            if len(batch) == 1:
+                return [self.generate_one(batch[0].prompt, **batch[0].params)]
+            results = list(self.generate_batch([r.prompt for r in batch], **batch[0].params))
+            if len(results) != len(batch):
+                raise ValueError(f"Batch returned {len(results)} results for {len(batch)} prompts")
+            with self._cond:
+                self.batched_requests += len(batch)
+            return results
+        except Exception as e:
+            return [e] * len(batch)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queued_high": len(self._high),
+                "queued_normal": len(self._normal),
+                "running": self.running,
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "api_calls": self.api_calls,
+                "batched_requests": self.batched_requests,
+                "throttled": self.throttled,
+            }
+
+    def close(self, wait=True):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._pool.shutdown(wait=wait)
@@ -0,0 +1,103 @@
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Per-level fraction of records kept in structured mode; WARNING and above are never sampled
+DEFAULT_SAMPLE_RATES = {logging.DEBUG: 0.01, logging.INFO: 1.0}
+DEFAULT_MAX_PAYLOAD = 1024
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of records at each configured level."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class LazyQueueHandler(QueueHandler):
+    """QueueHandler that hands the raw record to the listener thread.
+
+    The stock handler formats the message on the calling thread; here message
+    interpolation and JSON encoding happen in the background writer. Objects
+    passed as log arguments must not be mutated after the call.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Tracebacks reference live frames; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with structured fields and size-capped payloads.
+
+    Structured fields are passed as ``extra={"fields": {...}}`` and are only
+    serialized here, in the writer thread.
+    """
+
+    def __init__(self, max_payload=DEFAULT_MAX_PAYLOAD):
+        super().__init__()
+        self.max_payload = max_payload
+
+    def _cap(self, text):
+        if len(text) > self.max_payload:
+            return f"{text[:self.max_payload]}...[{len(text) - self.max_payload} more chars]"
+        return text
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": self._cap(record.getMessage()),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            for key, value in fields.items():
+                entry[key] = value if isinstance(value, (int, float, bool)) or value is None \
+                    else self._cap(value if isinstance(value, str) else json.dumps(value, default=str))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(filename, level=logging.INFO, sample_rates=None, max_payload=DEFAULT_MAX_PAYLOAD):
+    """Route all logging through a background QueueListener writing JSON lines.
+
+    Returns the listener; it is stopped (and the queue drained) at exit.
+    """
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(filename, mode="a", encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter(max_payload))
+
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(DEFAULT_SAMPLE_RATES if sample_rates is None else sample_rates))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener):
+    # Drain and stop unless the caller already did
+    if listener._thread is not None:
+        listener.stop()
@@ -0,0 +1,213 @@
+import json
+import time
+import bisect
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from cache hits up to slow LLM calls
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Series:
+    """Latency histogram plus in-flight, error and retry counts for one kind/name pair."""
+
+    def __init__(self, kind, name):
+        self.kind = kind
+        self.name = name
+        self.lock = threading.Lock()
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.in_flight = 0
+        self.errors = 0
+        self.retries = 0
+
+    def observe(self, elapsed, error):
+        with self.lock:
+            self.buckets[bisect.bisect_left(BUCKETS, elapsed)] += 1
+            self.count += 1
+            self.total += elapsed
+            self.in_flight -= 1
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "kind": self.kind,
+                "name": self.name,
+                "count": self.count,
+                "sum": self.total,
+                "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], self.buckets)),
+                "in_flight": self.in_flight,
+                "errors": self.errors,
+                "retries": self.retries,
+            }
+
+
+class _Tracker:
+    __slots__ = ("registry", "series", "start")
+
+    def __init__(self, registry, series):
+        self.registry = registry
+        self.series = series
+
+    def __enter__(self):
+        with self.series.lock:
+            self.series.in_flight += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        self.series.observe(elapsed, exc_type is not None)
+        for hook in self.registry.hooks:
+            try:
+                hook(self.series.kind, self.series.name, elapsed, exc)
+            except Exception as e:
+                logger.error(f"Metrics hook failed: {e}")
+        return False
+
+
+class _NoopTracker:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopTracker()
+
+
+class Registry:
+    """Collects per-node and per-external-call metrics.
+
+    Disabled until an exporter or hook is attached; while disabled, track()
+    returns a shared no-op context manager so instrumented code pays only an
+    attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.hooks = []
+        self.gauges = {}
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, kind, name):
+        key = (kind, name)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, Series(kind, name))
+        return series
+
+    def track(self, kind, name):
+        # with registry.track("external", "cohere"): ...
+        if not self.enabled:
+            return _NOOP
+        return _Tracker(self, self.series(kind, name))
+
+    def count_retry(self, kind, name):
+        if not self.enabled:
+            return
+        series = self.series(kind, name)
+        with series.lock:
+            series.retries += 1
+
+    def add_hook(self, hook):
+        # hook(kind, name, elapsed_seconds, exception_or_None), called after every tracked call
+        self.hooks.append(hook)
+        self.enabled = True
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def add_gauge(self, name, fn, **labels):
+        # fn() -> current value, read at scrape time (e.g. a queue depth)
+        self.gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    def gauge_values(self):
+        values = []
+        for (name, labels), fn in list(self.gauges.items()):
+            try:
+                values.append((name, dict(labels), fn()))
+            except Exception as e:
+                logger.error(f"Metrics gauge {name} failed: {e}")
+        return values
+
+    def snapshot(self):
+        with self._lock:
+            series = list(self._series.values())
+        return [s.snapshot() for s in series]
+
+    def json_text(self):
+        # Call series plus registered gauges (queue depths etc.), as served on /metrics.json
+        gauges = [{"name": name, "labels": labels, "value": value} for name, labels, value in self.gauge_values()]
+        return json.dumps({"series": self.snapshot(), "gauges": gauges}, default=str)
+
+    def prometheus_text(self):
+        lines = [
+            "# TYPE swiftcare_call_duration_seconds histogram",
+            "# TYPE swiftcare_calls_in_flight gauge",
+            "# TYPE swiftcare_call_errors_total counter",
+            "# TYPE swiftcare_call_retries_total counter",
+        ]
+        for s in self.snapshot():
+            labels = f'kind="{s["kind"]}",name="{s["name"]}"'
+            cumulative = 0
+            for bound, count in s["buckets"].items():
+                cumulative += count
+                lines.append(f'swiftcare_call_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"swiftcare_call_duration_seconds_sum{{{labels}}} {s['sum']}")
+            lines.append(f"swiftcare_call_duration_seconds_count{{{labels}}} {s['count']}")
+            lines.append(f"swiftcare_calls_in_flight{{{labels}}} {s['in_flight']}")
+            lines.append(f"swiftcare_call_errors_total{{{labels}}} {s['errors']}")
+            lines.append(f"swiftcare_call_retries_total{{{labels}}} {s['retries']}")
+        typed = set()
+        for name, labels, value in self.gauge_values():
+            if name not in typed:
+                lines.append(f"# TYPE swiftcare_{name} gauge")
+                typed.add(name)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"swiftcare_{name}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port=9464, host="127.0.0.1"):
+        # Serves /metrics (Prometheus text) and /metrics.json from a daemon thread
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.prometheus_text().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = registry.json_text().encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        self.enabled = True
+        logger.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+
+# Process-wide registry
+registry = Registry()
@@ -0,0 +1,59 @@
+import html
+import threading
+from collections import OrderedDict
+
+from patient_queries import priority_band
+
+PRIORITY_CLASSES = {"High": "high-priority", "Medium": "medium-priority", "Low": "low-priority"}
+
+# Rendered cards keyed by the fields that change their content; kept across
+# Streamlit reruns because imported modules persist for the process
+_cards = OrderedDict()
+_cards_lock = threading.Lock()
+MAX_CACHED_CARDS = 5000
+
+
+def card_fields(patient):
+    # Everything a card displays, derived and escaped once
+    triage_score = patient.get("triage_score", 0)
+    priority_level = priority_band(triage_score)
+    return {
+        "patient_id": html.escape(str(patient.get("patient_id", "Unknown"))),
+        "triage_score": triage_score,
+        "priority_level": priority_level,
+        "priority_class": PRIORITY_CLASSES[priority_level],
+        "symptoms": html.escape(", ".join(map(str, patient.get("symptoms", [])))),
+        "vitals": html.escape(", ".join(f"{k}: {v}" for k, v in patient.get("vitals", {}).items())),
+    }
+
+
+def card_html(patient):
+    key = (patient.get("patient_id"), patient.get("last_updated"), patient.get("triage_score"))
+    with _cards_lock:
+        card = _cards.get(key)
+        if card is not None:
+            _cards.move_to_end(key)
+            return card
+
+    fields = card_fields(patient)
+    card = (
+        f'<div class="patient-card {fields["priority_class"]}">'
+        f'<h3>🆔 Patient ID: {fields["patient_id"]}</h3>'
+        '<div style="display: flex; justify-content: space-between;">'
+        f'<div><p><strong>Triage Score:</strong> {fields["triage_score"]:.2f} ({fields["priority_level"]} Priority)</p>'
+        f'<p><strong>🩺 Symptoms:</strong> {fields["symptoms"]}</p></div>'
+        f'<div><p><strong>Vitals:</strong> {fields["vitals"]}</p></div>'
+        '</div></div>'
+    )
+    with _cards_lock:
+        _cards[key] = card
+        while len(_cards) > MAX_CACHED_CARDS:
+            _cards.popitem(last=False)
+    return card
+
+
+def patient_list_html(patients, height=900):
+    # One scrollable HTML block for the whole page: a single Streamlit element
+    # regardless of how many cards it holds
+    cards = "".join(card_html(patient) for patient in patients)
+    return f'<div style="max-height: {height}px; overflow-y: auto; padding-right: 8px;">{cards}</div>'
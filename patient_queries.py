@@ -0,0 +1,62 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Priority bands as (exclusive lower bound, inclusive upper bound) on triage_score,
+# matching the dashboard's get_priority_level; highest band first
+PRIORITY_BANDS = {
+    "High": (0.8, None),
+    "Medium": (0.5, 0.8),
+    "Low": (None, 0.5),
+}
+
+
+def priority_band(score):
+    for band, (low, high) in PRIORITY_BANDS.items():
+        if (low is None or score > low) and (high is None or score <= high):
+            return band
+    return "Low"
+
+
+def band_filter(collection, band):
+    low, high = PRIORITY_BANDS[band]
+    query = collection
+    if low is not None:
+        query = query.where("triage_score", ">", low)
+    if high is not None:
+        query = query.where("triage_score", "<=", high)
+    return query
+
+
+def band_query(collection, band):
+    # Range filter plus descending order on the same field is served by
+    # Firestore's automatic single-field index; ties fall back to document ID
+    return band_filter(collection, band).order_by("triage_score", direction="DESCENDING")
+
+
+def fetch_patient_page(collection, bands, page_size=50, cursor=None):
+    """Fetch one page of patients ordered by triage score, highest first.
+
+    Each selected band is queried server-side with a limit, so a page costs
+    O(page_size) reads. Returns (patients, next_cursor); next_cursor is None
+    when there are no further pages and can be passed back in as ``cursor``.
+    """
+    ordered = [band for band in PRIORITY_BANDS if band in bands]
+    position, last = cursor or (0, None)
+    page = []
+    while position < len(ordered) and len(page) < page_size:
+        wanted = page_size - len(page)
+        query = band_query(collection, ordered[position]).limit(wanted)
+        if last is not None:
+            query = query.start_after(last)
+        snapshots = list(query.stream())
+        page.extend(snapshot.to_dict() for snapshot in snapshots)
+        if len(snapshots) < wanted:
+            # Band exhausted; continue with the next one from its top
+            position, last = position + 1, None
+        else:
+            last = snapshots[-1]
+
+    next_cursor = (position, last) if position < len(ordered) else None
+    logger.info(f"Fetched page of {len(page)} patients for bands {ordered}")
+    return page, next_cursor
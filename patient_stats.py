@@ -0,0 +1,131 @@
+import random
+import logging
+import argparse
+from collections import Counter
+
+from patient_queries import PRIORITY_BANDS, band_filter, priority_band
+from symptom_lexicon import lexicon
+
+logger = logging.getLogger(__name__)
+
+# Aggregates live in stats/{name}/shards/{n}; spreading increments over shards
+# keeps each document well under Firestore's sustained write limit
+STATS_COLLECTION = "stats"
+STATS_NAMES = ("priority", "symptoms", "hospitals")
+NUM_SHARDS = 10
+# Written by rebuild_stats; until it exists the counters only hold the
+# increments since deployment and readers must count from the patients
+STATS_MARKER = "_meta"
+
+
+def patient_counts(patient):
+    # The aggregate keys one patient contributes to
+    if not patient:
+        return {name: Counter() for name in STATS_NAMES}
+    # Canonical codes, so "SOB" and "shortness of breath" count together
+    symptoms = lexicon.canonical(patient.get("symptoms", []))
+    return {
+        "priority": Counter([priority_band(patient.get("triage_score", 0))]),
+        "symptoms": Counter(symptoms),
+        "hospitals": Counter([patient.get("recommended_hospital", "Unknown")]),
+    }
+
+
+def patient_deltas(old, new):
+    # Counter changes needed when a patient document goes from old to new
+    # (either may be None for creates and deletes)
+    before, after = patient_counts(old), patient_counts(new)
+    deltas = {}
+    for name in STATS_NAMES:
+        delta = {key: after[name][key] - before[name][key] for key in before[name].keys() | after[name].keys()}
+        delta = {key: value for key, value in delta.items() if value}
+        if delta:
+            deltas[name] = delta
+    return deltas
+
+
+def apply_deltas(writer, db, deltas):
+    # writer is anything with set(ref, data, merge=True): a WriteBatch,
+    # a Transaction or a batch_writer.BatchWriter
+    from google.cloud import firestore
+
+    for name, delta in deltas.items():
+        shard = db.collection(STATS_COLLECTION).document(name).collection("shards").document(
+            str(random.randrange(NUM_SHARDS))
+        )
+        writer.set(shard, {"counts": {key: firestore.Increment(value) for key, value in delta.items()}}, merge=True)
+
+
+def save_patient(db, patient, collection="patients"):
+    # Write a patient and update the aggregates in a single transaction
+    from google.cloud import firestore
+
+    doc_ref = db.collection(collection).document(patient["patient_id"])
+
+    @firestore.transactional
+    def write(transaction):
+        snapshot = doc_ref.get(transaction=transaction)
+        old = snapshot.to_dict() if snapshot.exists else None
+        transaction.set(doc_ref, patient)
+        apply_deltas(transaction, db, patient_deltas(old, patient))
+
+    write(db.transaction())
+
+
+def stats_initialized(db):
+    snapshot = db.collection(STATS_COLLECTION).document(STATS_MARKER).get()
+    return snapshot.exists and bool((snapshot.to_dict() or {}).get("initialized"))
+
+
+def read_stats(db, names=STATS_NAMES):
+    # Sum the shards of each aggregate: a few small reads instead of a scan.
+    # None until rebuild_stats has initialized the counters.
+    if not stats_initialized(db):
+        return None
+    stats = {}
+    for name in names:
+        totals = Counter()
+        for shard in db.collection(STATS_COLLECTION).document(name).collection("shards").stream():
+            totals.update((shard.to_dict() or {}).get("counts", {}))
+        stats[name] = {key: value for key, value in totals.items() if value > 0}
+    return stats
+
+
+def count_priority_bands(collection):
+    # Fallback when aggregates are missing: server-side count() per band
+    return {band: band_filter(collection, band).count().get()[0][0].value for band in PRIORITY_BANDS}
+
+
+def rebuild_stats(db, collection="patients"):
+    # One full scan to (re)initialize the aggregates, e.g. after a bulk import.
+    # Stop ingestion while this runs: increments committed between the scan and
+    # the reset are lost or counted twice.
+    totals = {name: Counter() for name in STATS_NAMES}
+    for snapshot in db.collection(collection).stream():
+        for name, counts in patient_counts(snapshot.to_dict()).items():
+            totals[name].update(counts)
+
+    # Every aggregate is reset and marked initialized in one batch (at most
+    # NUM_SHARDS deletes per aggregate), so readers never see a partial reset
+    batch = db.batch()
+    for name in STATS_NAMES:
+        shards = db.collection(STATS_COLLECTION).document(name).collection("shards")
+        for shard in shards.stream():
+            batch.delete(shard.reference)
+        batch.set(shards.document("0"), {"counts": dict(totals[name])})
+    batch.set(db.collection(STATS_COLLECTION).document(STATS_MARKER), {"initialized": True})
+    batch.commit()
+    logger.info(f"Rebuilt patient stats: {dict(totals['priority'])}")
+    return {name: dict(counts) for name, counts in totals.items()}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from clients import get_db
+
+    parser = argparse.ArgumentParser(description="Maintain the patient aggregate counters.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all aggregates from the patients collection")
+    args = parser.parse_args()
+
+    load_dotenv()
+    print(rebuild_stats(get_db()) if args.rebuild else read_stats(get_db()))
@@ -0,0 +1,140 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PatientCache:
+    """Process-wide in-memory mirror of the patients collection.
+
+    Kept current by a Firestore ``on_snapshot`` listener, which delivers only
+    added, modified and removed documents after the initial load. When a
+    listener cannot be attached, a background thread polls for documents whose
+    ``last_updated`` is newer than the last one seen, with a periodic full
+    resync to pick up deletes.
+    """
+
+    def __init__(self, collection, poll_interval=15.0, resync_every=20, initial_timeout=30.0):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.resync_every = resync_every
+        self.initial_timeout = initial_timeout
+        self.version = 0
+        self.mode = None
+        self._docs = {}
+        self._sorted = []
+        self._sorted_version = -1
+        self._table = None
+        self._table_version = -1
+        self._cursor = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._watch = None
+        self._thread = None
+
+    def start(self, wait=True):
+        # wait=False returns at once; the initial load finishes in the
+        # background and bumps version, and wait_ready() blocks for it
+        try:
+            self._watch = self.collection.on_snapshot(self._on_snapshot)
+            self.mode = "listener"
+        except Exception as e:
+            logger.warning(f"Snapshot listener unavailable, falling back to polling: {e}")
+            self.mode = "poll"
+            self._thread = threading.Thread(target=self._poll_loop, name="patient-sync", daemon=True)
+            self._thread.start()
+        if wait:
+            self.wait_ready()
+            logger.info(f"Patient cache started in {self.mode} mode with {len(self._docs)} patients")
+        else:
+            logger.info(f"Patient cache started in {self.mode} mode; loading in the background")
+        return self
+
+    @property
+    def ready(self):
+        # True once the initial load has finished
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        if self._ready.wait(self.initial_timeout if timeout is None else timeout):
+            return True
+        logger.warning("Timed out waiting for the initial patient snapshot.")
+        return False
+
+    def stop(self):
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def patients(self):
+        # Patients sorted by triage score, highest first; re-sorted only when data changed
+        with self._lock:
+            if self._sorted_version != self.version:
+                self._sorted = sorted(self._docs.values(), key=lambda x: x.get("triage_score", 0), reverse=True)
+                self._sorted_version = self.version
+            return self._sorted
+
+    def table(self):
+        # Columnar view (patient_table.PatientTable) for vectorized filters and
+        # counts; rebuilt only when data changed
+        from patient_table import PatientTable
+
+        with self._lock:
+            if self._table_version != self.version:
+                self._table = PatientTable.from_patients(self._docs.values())
+                self._table_version = self.version
+            return self._table
+
+    def get(self, patient_id):
+        with self._lock:
+            return self._docs.get(patient_id)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self._docs.pop(change.document.id, None)
+                else:
+                    self._docs[change.document.id] = change.document.to_dict()
+            if changes:
+                self.version += 1
+        self._ready.set()
+
+    def _poll_loop(self):
+        polls = 0
+        while not self._stop.is_set():
+            try:
+                if polls % self.resync_every == 0:
+                    self._full_sync()
+                else:
+                    self._delta_sync()
+                self._ready.set()
+            except Exception as e:
+                logger.error(f"Failed to sync patients: {e}")
+            polls += 1
+            self._stop.wait(self.poll_interval)
+
+    def _full_sync(self):
+        docs = {doc.id: doc.to_dict() for doc in self.collection.stream()}
+        cursor = max((d.get("last_updated") for d in docs.values() if d.get("last_updated")), default=None)
+        with self._lock:
+            if docs != self._docs:
+                self._docs = docs
+                self.version += 1
+            self._cursor = cursor
+
+    def _delta_sync(self):
+        if self._cursor is None:
+            return self._full_sync()
+        query = self.collection.where("last_updated", ">", self._cursor).order_by("last_updated")
+        changed = [(doc.id, doc.to_dict()) for doc in query.stream()]
+        if not changed:
+            return
+        with self._lock:
+            for doc_id, data in changed:
+                self._docs[doc_id] = data
+            self._cursor = changed[-1][1].get("last_updated", self._cursor)
+            self.version += 1
+
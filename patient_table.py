@@ -0,0 +1,256 @@
+import sys
+import logging
+import warnings
+from datetime import datetime, timezone
+
+from patient_queries import PRIORITY_BANDS
+from symptom_lexicon import lexicon
+
+logger = logging.getLogger(__name__)
+
+BAND_NAMES = tuple(PRIORITY_BANDS)  # Band codes index into this, highest first
+VITAL_FIELDS = ("heart_rate", "temperature", "oxygen_saturation")
+
+
+def parse_blood_pressure(value):
+    # "140/90" -> (140.0, 90.0); anything unparseable -> (nan, nan)
+    try:
+        systolic, diastolic = str(value).split("/")
+        return float(systolic), float(diastolic)
+    except (TypeError, ValueError):
+        return float("nan"), float("nan")
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class PatientTable:
+    """Columnar, read-only view of a patient census.
+
+    Each field is one NumPy array; derived fields (priority band, systolic and
+    diastolic pressure) are computed once at load. Hospitals are dictionary
+    encoded and symptoms are stored as one flat code array plus per-patient
+    offsets, so filtering, counting and sorting run as vectorized operations.
+    """
+
+    def __init__(self, columns, symptom_codes, symptom_offsets, symptom_vocab, hospital_vocab):
+        self.columns = columns
+        self.symptom_codes = symptom_codes
+        self.symptom_offsets = symptom_offsets
+        self.symptom_vocab = symptom_vocab
+        self.hospital_vocab = hospital_vocab
+
+    @classmethod
+    def from_patients(cls, patients):
+        import numpy as np
+
+        patients = list(patients)
+        n = len(patients)
+        # Scores stay float64 so band and range filters agree with the
+        # Firestore queries at the 0.5/0.8 bounds; vitals are fine as float32
+        score = np.empty(n, dtype=np.float64)
+        systolic = np.empty(n, dtype=np.float32)
+        diastolic = np.empty(n, dtype=np.float32)
+        vitals = {field: np.empty(n, dtype=np.float32) for field in VITAL_FIELDS}
+        hospital = np.empty(n, dtype=np.int32)
+        offsets = np.zeros(n + 1, dtype=np.int32)
+        ids, updated, codes = [], [], []
+        symptom_index, hospital_index = {}, {}
+
+        for row, patient in enumerate(patients):
+            ids.append(str(patient.get("patient_id", "")))
+            updated.append(patient.get("last_updated") or "NaT")
+            score[row] = _number(patient.get("triage_score", 0))
+            patient_vitals = patient.get("vitals") or {}
+            systolic[row], diastolic[row] = parse_blood_pressure(patient_vitals.get("blood_pressure"))
+            for field, column in vitals.items():
+                column[row] = _number(patient_vitals.get(field))
+            name = patient.get("recommended_hospital", "Unknown")
+            hospital[row] = hospital_index.setdefault(name, len(hospital_index))
+            for symptom in patient.get("symptoms") or ():
+                symptom = str(symptom).strip()
+                if symptom:
+                    codes.append(symptom_index.setdefault(symptom, len(symptom_index)))
+            offsets[row + 1] = len(codes)
+
+        # Derive the priority band once, with the same bounds as the queries
+        band = np.full(n, len(BAND_NAMES) - 1, dtype=np.int8)
+        unassigned = np.ones(n, dtype=bool)
+        for code, (low, high) in enumerate(PRIORITY_BANDS.values()):
+            match = unassigned.copy()
+            if low is not None:
+                match &= score > low
+            if high is not None:
+                match &= score <= high
+            band[match] = code
+            unassigned &= ~match
+
+        try:
+            with warnings.catch_warnings():
+                # NumPy warns on, and will stop accepting, UTC offsets
+                warnings.simplefilter("error")
+                last_updated = np.array(updated, dtype="datetime64[us]")
+        except (ValueError, UserWarning, DeprecationWarning):
+            # Offsets or other formats; parse one by one, normalizing to UTC
+            last_updated = np.array([_datetime(value) for value in updated], dtype="datetime64[us]")
+
+        columns = {
+            "patient_id": np.array(ids, dtype=str),
+            "triage_score": score,
+            "band": band,
+            "systolic": systolic,
+            "diastolic": diastolic,
+            **vitals,
+            "hospital": hospital,
+            "last_updated": last_updated,
+        }
+        return cls(columns, np.array(codes, dtype=np.int32), offsets, list(symptom_index), list(hospital_index))
+
+    def __len__(self):
+        return len(self.columns["triage_score"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def take(self, indices):
+        # New table holding the given rows, in the given order
+        import numpy as np
+
+        indices = np.asarray(indices, dtype=np.intp)
+        lengths = np.diff(self.symptom_offsets)[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=offsets[1:])
+        positions = np.repeat(self.symptom_offsets[:-1][indices] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return PatientTable(
+            {name: column[indices] for name, column in self.columns.items()},
+            self.symptom_codes[positions],
+            offsets,
+            self.symptom_vocab,
+            self.hospital_vocab,
+        )
+
+    def mask(self, bands=None, min_score=None, max_score=None, hospital=None, symptom=None):
+        # Boolean row mask; every given condition must hold
+        import numpy as np
+
+        mask = np.ones(len(self), dtype=bool)
+        if bands is not None:
+            mask &= np.isin(self.columns["band"], [BAND_NAMES.index(band) for band in bands])
+        if min_score is not None:
+            mask &= self.columns["triage_score"] >= min_score
+        if max_score is not None:
+            mask &= self.columns["triage_score"] <= max_score
+        if hospital is not None:
+            code = self.hospital_vocab.index(hospital) if hospital in self.hospital_vocab else -1
+            mask &= self.columns["hospital"] == code
+        if symptom is not None:
+            target = set(lexicon.canonical(symptom))
+            wanted = [code for code, name in enumerate(self.symptom_vocab) if target & set(lexicon.canonical(name))]
+            hits = np.isin(self.symptom_codes, wanted)
+            rows = np.repeat(np.arange(len(self)), np.diff(self.symptom_offsets))
+            mask &= np.bincount(rows[hits], minlength=len(self)) > 0
+        return mask
+
+    def filter(self, **conditions):
+        import numpy as np
+
+        return self.take(np.flatnonzero(self.mask(**conditions)))
+
+    def order(self, descending=True):
+        # Row order by triage score, ties broken by patient ID (as Firestore does)
+        import numpy as np
+
+        score = self.columns["triage_score"]
+        return np.lexsort((self.columns["patient_id"], -score if descending else score))
+
+    def sorted(self, descending=True):
+        return self.take(self.order(descending))
+
+    def band_counts(self):
+        import numpy as np
+
+        counts = np.bincount(self.columns["band"], minlength=len(BAND_NAMES))
+        return {name: int(count) for name, count in zip(BAND_NAMES, counts)}
+
+    def hospital_counts(self):
+        import numpy as np
+
+        counts = np.bincount(self.columns["hospital"], minlength=len(self.hospital_vocab))
+        return {name: int(count) for name, count in zip(self.hospital_vocab, counts) if count}
+
+    def symptom_counts(self):
+        # Patients per canonical symptom (symptom_lexicon); entries mapping to
+        # the same code count once per patient, matching patient_stats.patient_counts
+        import numpy as np
+
+        canonical = [lexicon.canonical(name) for name in self.symptom_vocab]
+        names = sorted({code for codes in canonical for code in codes})
+        index = {name: i for i, name in enumerate(names)}
+        # Vocabulary entry -> its code ids, as flat ids plus per-entry offsets
+        lengths = np.array([len(codes) for codes in canonical], dtype=np.int64)
+        starts = np.zeros(len(canonical), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        ids = np.array([index[code] for codes in canonical for code in codes], dtype=np.int64)
+
+        per_entry = lengths[self.symptom_codes]
+        rows = np.repeat(np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.symptom_offsets)), per_entry)
+        first = np.cumsum(per_entry) - per_entry
+        positions = np.repeat(starts[self.symptom_codes] - first, per_entry) + np.arange(per_entry.sum())
+        width = max(len(names), 1)
+        # Keys are already grouped by row, so a stable sort is near-linear;
+        # dropping adjacent repeats leaves one entry per (patient, symptom)
+        pairs = np.sort(rows * width + ids[positions], kind="stable")
+        keep = np.ones(len(pairs), dtype=bool)
+        np.not_equal(pairs[1:], pairs[:-1], out=keep[1:])
+        counts = np.bincount(pairs[keep] % width, minlength=len(names))
+        return {name: int(count) for name, count in zip(names, counts) if count}
+
+    def record(self, row):
+        # Rebuild a patient dict (as the dashboard cards expect) for one row
+        import numpy as np
+
+        columns = self.columns
+        start, end = self.symptom_offsets[row], self.symptom_offsets[row + 1]
+        vitals = {}
+        if not np.isnan(columns["systolic"][row]):
+            vitals["blood_pressure"] = f"{columns['systolic'][row]:g}/{columns['diastolic'][row]:g}"
+        for field in VITAL_FIELDS:
+            value = float(f"{columns[field][row]:g}")  # Drop float32 noise
+            if not np.isnan(value):
+                vitals[field] = int(value) if value.is_integer() else value
+        last_updated = columns["last_updated"][row]
+        return {
+            "patient_id": str(columns["patient_id"][row]),
+            "triage_score": float(columns["triage_score"][row]),
+            "symptoms": [self.symptom_vocab[code] for code in self.symptom_codes[start:end]],
+            "vitals": vitals,
+            "recommended_hospital": self.hospital_vocab[columns["hospital"][row]],
+            "last_updated": None if np.isnat(last_updated) else str(last_updated),
+        }
+
+    def records(self, start=0, stop=None):
+        return [self.record(row) for row in range(start, len(self) if stop is None else min(stop, len(self)))]
+
+    def memory_usage(self):
+        # Bytes per column, plus the symptom arrays and both vocabularies
+        usage = {name: int(column.nbytes) for name, column in self.columns.items()}
+        usage["symptoms"] = int(self.symptom_codes.nbytes + self.symptom_offsets.nbytes)
+        usage["vocabularies"] = sum(sys.getsizeof(name) for name in self.symptom_vocab + self.hospital_vocab)
+        usage["total"] = sum(usage.values())
+        return usage
+
+
+def _datetime(value):
+    import numpy as np
+
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return np.datetime64("NaT")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(parsed, "us")
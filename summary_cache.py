@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+import logging
+
+from cache import TTLCache, SingleFlight
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = "Summarize and prioritize these symptoms: {symptoms}."
+
+
+def normalize_symptoms(symptoms):
+    # Lowercase, collapse whitespace, drop blanks and duplicates, sort
+    normalized = {" ".join(str(s).lower().split()) for s in symptoms or []}
+    normalized.discard("")
+    return sorted(normalized)
+
+
+def summary_key(symptoms, prompt=SUMMARY_PROMPT, **params):
+    # Content address: identical symptom sets, prompt and model parameters
+    # always map to the same key
+    payload = json.dumps(
+        {"symptoms": normalize_symptoms(symptoms), "prompt": prompt, "params": params},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """Caches LLM symptom summaries and de-duplicates concurrent identical requests."""
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else TTLCache(max_entries=2048, ttl=7 * 86400)
+        self.flight = SingleFlight()
+
+    def get_or_generate(self, symptoms, generate, prompt=SUMMARY_PROMPT, **params):
+        # generate(prompt_text, **params) -> summary text; only called on a miss
+        key = summary_key(symptoms, prompt, **params)
+        summary = self.cache.get(key)
+        if summary is not None:
+            return summary
+
+        def load():
+            # Re-check: another caller may have filled the entry while we queued
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            text = generate(prompt.format(symptoms=", ".join(normalize_symptoms(symptoms))), **params)
+            self.cache.set(key, text)
+            return text
+
+        return self.flight.do(key, load)
+
+    def stats(self):
+        return {**self.cache.stats(), "deduplicated": self.flight.shared}
+
+
+# Process-wide cache used by TriageNode; set SUMMARY_CACHE_PATH="" to keep it in memory only
+summary_cache = SummaryCache(TTLCache(
+    max_entries=int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "2048")),
+    ttl=float(os.getenv("SUMMARY_CACHE_TTL", str(7 * 86400))),
+    path=os.getenv("SUMMARY_CACHE_PATH", "summary_cache.sqlite") or None,
+    table="summaries",
+))
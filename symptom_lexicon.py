@@ -0,0 +1,266 @@
+"""Symptom lexicon: free-text symptoms to canonical symptom codes.
+
+Synonyms and abbreviations ("SOB", "dyspnea", "short of breath") are compiled
+into a token-level Aho-Corasick automaton, so a description is mapped in one
+left-to-right pass over its words however large the lexicon is:
+
+    >>> lexicon.codes(["Chest pain radiating to arm", "SOB", "no fever"])
+    ['chest pain', 'shortness of breath']
+
+Misspelled words within one edit of a lexicon word ("haedache", "dizzyness")
+are corrected through a deletion-neighbourhood index; a word that doesn't
+continue the phrase being matched is also tried against the words that would
+("shortness of breathe"). Abbreviations only count in capitals or as a clause
+of their own, so "sob story" is not shortness of breath. Words after a negation
+cue ("no", "denies", "without") up to the end of the clause are not matched.
+"""
+import re
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Canonical code -> phrases that mean it. Codes are the names shown on the
+# dashboard and used by triage rules and aggregate counts.
+LEXICON = {
+    "chest pain": ["chest pain", "chest-pain", "chestpain", "chest discomfort", "thoracic pain", "angina"],
+    "chest tightness": ["chest tightness", "tight chest", "chest pressure"],
+    "shortness of breath": ["shortness of breath", "short of breath", "sob", "breathlessness", "breathless",
+                            "dyspnea", "dyspnoea"],
+    "difficulty breathing": ["difficulty breathing", "trouble breathing", "dib", "cannot breathe", "can't breathe",
+                             "labored breathing", "laboured breathing"],
+    "wheezing": ["wheezing", "wheeze"],
+    "palpitations": ["palpitations", "racing heart", "heart racing", "pounding heart"],
+    "irregular heartbeat": ["irregular heartbeat", "irregular heart beat", "arrhythmia"],
+    "headache": ["headache", "head ache", "ha", "cephalgia", "migraine"],
+    "severe headache": ["severe headache", "worst headache", "thunderclap headache"],
+    "dizziness": ["dizziness", "dizzy", "lightheaded", "light headed", "lightheadedness", "vertigo"],
+    "confusion": ["confusion", "confused", "disoriented", "altered mental status", "ams"],
+    "loss of consciousness": ["loss of consciousness", "loc", "fainted", "fainting", "syncope", "passed out"],
+    "seizure": ["seizure", "convulsions", "convulsing"],
+    "slurred speech": ["slurred speech", "slurring"],
+    "numbness": ["numbness", "numb", "tingling"],
+    "nausea": ["nausea", "nauseous", "nauseated", "n v"],
+    "vomiting": ["vomiting", "vomit", "emesis", "throwing up", "n v"],
+    "fever": ["fever", "febrile", "pyrexia", "high temperature"],
+    "cough": ["cough", "coughing"],
+    "sore throat": ["sore throat", "pharyngitis"],
+    "fatigue": ["fatigue", "tiredness", "tired", "exhaustion", "lethargy", "lethargic"],
+    "abdominal pain": ["abdominal pain", "abd pain", "stomach pain", "stomach ache", "stomachache", "belly pain"],
+    "back pain": ["back pain", "backache", "lower back pain"],
+    "sweating": ["sweating", "sweaty", "diaphoresis", "diaphoretic"],
+    "rash": ["rash", "hives"],
+    "bleeding": ["bleeding", "hemorrhage", "haemorrhage"],
+    "fracture": ["fracture", "broken bone"],
+    "head injury": ["head injury", "head trauma"],
+    "burn": ["burn", "scald"],
+}
+
+# Aliases that are also ordinary words or fragments; they match only when
+# written in capitals ("pt has SOB") or as a whole clause ("sob, fever")
+ABBREVIATIONS = {"sob", "dib", "ha", "ams", "loc", "n v"}
+
+NEGATIONS = {"no", "not", "denies", "denied", "without", "negative"}
+MIN_FUZZY_LENGTH = 5  # Shorter words (and abbreviations) must match exactly
+CACHE_SIZE = 65536
+
+_TOKEN = re.compile(r"[A-Za-z0-9]+|[,;.]")
+_CLAUSE_BREAKS = {",", ";", ".", "but", "and"}
+_MISSING = object()
+
+
+def tokenize(text):
+    # "Can't breathe, SOB" -> ["can", "t", "breathe", ",", "sob"]
+    return _TOKEN.findall(str(text).lower())
+
+
+def _within_one_edit(word, other):
+    return bool({word, *_deletions(word)} & {other, *_deletions(other)})
+
+
+def normalize(text):
+    # Fallback key for text the lexicon doesn't know
+    return " ".join(str(text).lower().split())
+
+
+def _deletions(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class SymptomLexicon:
+    """Compiled matcher from free text to canonical symptom codes."""
+
+    def __init__(self, lexicon=LEXICON, fuzzy=True):
+        self.lexicon = lexicon
+        self.fuzzy = fuzzy
+        # Trie over tokens: goto[node] maps token -> child; output[node] holds
+        # (code, phrase length, abbreviation) for phrases ending there
+        self._goto = [{}]
+        self._output = [[]]
+        for code, phrases in lexicon.items():
+            for phrase in [code, *phrases]:
+                self._insert(tokenize(phrase), code, normalize(phrase) in ABBREVIATIONS)
+        self._fail = self._link()
+        self.vocabulary = {token for node in self._goto for token in node}
+        # Every vocabulary word (long enough) and its one-character deletions,
+        # pointing back at the word: two words within one edit share a key
+        self._neighbours = {}
+        for word in sorted(self.vocabulary):
+            if len(word) >= MIN_FUZZY_LENGTH:
+                for key in {word, *_deletions(word)}:
+                    self._neighbours.setdefault(key, []).append(word)
+        self._cache = {}
+        self._corrections = {}
+
+    def _insert(self, tokens, code, abbreviation=False):
+        node = 0
+        for token in tokens:
+            child = self._goto[node].get(token)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][token] = child
+                self._goto.append({})
+                self._output.append([])
+            node = child
+        if tokens and (code, len(tokens), abbreviation) not in self._output[node]:
+            self._output[node].append((code, len(tokens), abbreviation))
+
+    def _link(self):
+        # Breadth-first failure links; each node also inherits the outputs of
+        # its failure node, so shorter phrases ending at a position are reported
+        fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())  # Depth-one nodes fail to the root
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and token not in self._goto[state]:
+                    state = fail[state]
+                fail[child] = self._goto[state].get(token, 0)
+                self._output[child] = self._output[child] + self._output[fail[child]]
+        return fail
+
+    def correct(self, token):
+        # Vocabulary word within one edit (insert, delete, substitute or swap)
+        # with the same first letter, or the token unchanged
+        if token in self.vocabulary:
+            return token
+        corrected = self._corrections.get(token)
+        if corrected is None:
+            corrected = self._correct(token)
+            if len(self._corrections) >= CACHE_SIZE:
+                self._corrections.clear()
+            self._corrections[token] = corrected
+        return corrected
+
+    def _correct(self, token):
+        if len(token) > 4 and token.endswith("s") and token[:-1] in self.vocabulary:
+            return token[:-1]  # "chest pains", "seizures"
+        if not self.fuzzy or len(token) < MIN_FUZZY_LENGTH - 1:
+            return token
+        candidates = set()
+        for key in {token, *_deletions(token)}:
+            candidates.update(self._neighbours.get(key, ()))
+        candidates = sorted(word for word in candidates if word[0] == token[0])
+        return candidates[0] if candidates else token
+
+    def _continue(self, node, token):
+        # A child word of node within one edit of token, so a misspelling that
+        # is itself a vocabulary word ("breathe") still continues "shortness of
+        # breath"; the token unchanged if there is none
+        if not self.fuzzy or len(token) < MIN_FUZZY_LENGTH - 1:
+            return token
+        candidates = sorted(word for word in self._goto[node]
+                            if len(word) >= MIN_FUZZY_LENGTH and word[0] == token[0] and _within_one_edit(token, word))
+        return candidates[0] if candidates else token
+
+    def match(self, text):
+        """All phrase matches in text as (code, start token, end token, negated).
+
+        A match inside a longer one is dropped ("severe headache" is not also
+        a "headache"); different codes for the same words are all kept.
+        """
+        raw = _TOKEN.findall(str(text))
+        tokens = [token.lower() for token in raw]
+        matches = []
+        node = 0
+        negated_from = None
+        for position, token in enumerate(tokens):
+            if token in _CLAUSE_BREAKS:
+                negated_from = None
+            elif token in NEGATIONS:
+                negated_from = position
+            token = self.correct(token)
+            if node and token not in self._goto[node]:
+                token = self._continue(node, token)
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            for code, length, abbreviation in self._output[node]:
+                start = position - length + 1
+                if abbreviation and not (all(word.isupper() for word in raw[start:position + 1])
+                                         or self._clause(tokens, start, position + 1)):
+                    continue
+                matches.append((code, start, position + 1, negated_from is not None and negated_from < start))
+        longest = {}
+        for code, start, end, negated in matches:
+            if not any(s <= start and end <= e and (s, e) != (start, end) for _, s, e, _ in matches):
+                longest.setdefault((code, start, end), negated)
+        return [(code, start, end, negated) for (code, start, end), negated in longest.items()]
+
+    @staticmethod
+    def _clause(tokens, start, end):
+        # Whether tokens[start:end] make up a whole clause
+        return ((start == 0 or tokens[start - 1] in _CLAUSE_BREAKS)
+                and (end == len(tokens) or tokens[end] in _CLAUSE_BREAKS))
+
+    def _entry(self, text):
+        # Codes for one symptom entry, or None when nothing matched; cached
+        # because the same entries recur across patients. The key keeps case,
+        # which decides whether abbreviations count.
+        key = " ".join(str(text).split())
+        cached = self._cache.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        matches = self.match(key)
+        codes = tuple(dict.fromkeys(code for code, _, _, negated in sorted(matches, key=lambda m: m[1])
+                                    if not negated)) if matches else None
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[key] = codes
+        return codes
+
+    def codes(self, symptoms):
+        """Canonical codes found in a symptom list (or one string), first appearance order."""
+        if isinstance(symptoms, str):
+            symptoms = [symptoms]
+        found = {}
+        for entry in symptoms or ():
+            for code in self._entry(entry) or ():
+                found.setdefault(code, None)
+        return list(found)
+
+    def canonical(self, symptoms):
+        """Codes for a patient's symptoms, keeping unrecognized entries as normalized text.
+
+        This is what aggregate counts and filters group by, so "SOB" and
+        "Shortness of breath" count together while novel symptoms still show.
+        """
+        if isinstance(symptoms, str):
+            symptoms = [symptoms]
+        found = {}
+        for entry in symptoms or ():
+            codes = self._entry(entry)
+            if codes is None:
+                text = normalize(entry)
+                if text:
+                    found.setdefault(text, None)
+            else:
+                for code in codes:
+                    found.setdefault(code, None)
+        return list(found)
+
+
+# Shared compiled lexicon
+lexicon = SymptomLexicon()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the top-level modules and the in-process fakes from benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
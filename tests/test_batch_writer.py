@@ -0,0 +1,139 @@
+import time
+
+import pytest
+
+from batch_writer import BatchWriter
+from fakes import FakeBatch, FakeFirestore
+
+
+class FailingBatch(FakeBatch):
+    # Commit fails whenever the batch touches a document in `bad`
+    def __init__(self, db, bad, error=RuntimeError):
+        super().__init__(db)
+        self.bad = bad
+        self.error = error
+
+    def commit(self):
+        self.db.attempts += 1
+        if any(ref.id in self.bad for _, ref, _, _ in self.ops):
+            raise self.error("rejected")
+        return super().commit()
+
+
+def failing_db(bad, error=RuntimeError):
+    db = FakeFirestore()
+    db.attempts = 0
+    db.batch = lambda: FailingBatch(db, bad, error)
+    return db
+
+
+def doc(db, doc_id):
+    return db.collection("patients").document(doc_id)
+
+
+def test_flushes_when_batch_is_full():
+    db = FakeFirestore()
+    writer = BatchWriter(db, max_batch_size=3, flush_interval=60)
+    try:
+        futures = [writer.set(doc(db, f"P{i}"), {"n": i}) for i in range(3)]
+        assert all(future.result(timeout=5) for future in futures)
+        assert db.commits == 1
+        assert writer.batches == 1 and writer.committed == 3
+    finally:
+        writer.close()
+
+
+def test_flushes_after_interval():
+    db = FakeFirestore()
+    writer = BatchWriter(db, max_batch_size=500, flush_interval=0.3)
+    try:
+        start = time.monotonic()
+        future = writer.set(doc(db, "P1"), {"n": 1})
+        assert not future.done()
+        assert future.result(timeout=5)
+        assert time.monotonic() - start >= 0.25
+        assert doc(db, "P1").get().to_dict() == {"n": 1}
+    finally:
+        writer.close()
+
+
+def test_flush_commits_on_caller_thread():
+    db = FakeFirestore()
+    writer = BatchWriter(db, flush_interval=60)
+    future = writer.set(doc(db, "P1"), {"n": 1})
+    writer.flush()
+    assert future.done() and future.result()
+    writer.close()
+
+
+def test_failed_batch_is_split_to_isolate_bad_write():
+    db = failing_db({"P2"})
+    writer = BatchWriter(db, max_batch_size=8, flush_interval=60, max_retries=0, backoff=0)
+    futures = {f"P{i}": writer.set(doc(db, f"P{i}"), {"n": i}) for i in range(4)}
+    writer.close()
+
+    assert isinstance(futures["P2"].exception(), RuntimeError)
+    for doc_id in ("P0", "P1", "P3"):
+        assert futures[doc_id].result()
+        assert doc(db, doc_id).get().exists
+    assert not doc(db, "P2").get().exists
+    assert writer.committed == 3 and writer.failed == 1
+
+
+def test_retries_transient_failures():
+    db = FakeFirestore()
+    db.attempts = 0
+    failures = [RuntimeError("transient")]
+
+    class FlakyBatch(FakeBatch):
+        def commit(self):
+            db.attempts += 1
+            if failures:
+                raise failures.pop()
+            return super().commit()
+
+    db.batch = lambda: FlakyBatch(db)
+    writer = BatchWriter(db, flush_interval=60, max_retries=2, backoff=0)
+    future = writer.set(doc(db, "P1"), {"n": 1})
+    writer.close()
+    assert future.result()
+    assert db.attempts == 2
+
+
+def test_ambiguous_failure_with_increments_is_not_retried():
+    firestore = pytest.importorskip("google.cloud.firestore")
+    from google.api_core.exceptions import DeadlineExceeded
+
+    db = failing_db({"shard"}, DeadlineExceeded)
+    writer = BatchWriter(db, flush_interval=60, max_retries=3, backoff=0)
+    future = writer.set(doc(db, "shard"), {"n": firestore.Increment(1)}, merge=True)
+    writer.close()
+    assert isinstance(future.exception(), DeadlineExceeded)
+    assert db.attempts == 1
+
+
+def test_derived_writes_see_previous_document_and_share_the_batch():
+    db = FakeFirestore()
+    db.load("patients", [{"patient_id": "P1", "band": "Low"}])
+    seen = []
+
+    def derive(batch, previous, current):
+        seen.append((previous and previous["band"], current["band"]))
+        batch.set(db.collection("stats").document(current["band"]), {"seen": True}, merge=True)
+
+    writer = BatchWriter(db, flush_interval=60)
+    writer.set(doc(db, "P1"), {"patient_id": "P1", "band": "High"}, derive=derive)
+    writer.update(doc(db, "P1"), {"band": "Medium"}, derive=derive)
+    writer.close()
+
+    # The second write sees the first, although neither was committed when read
+    assert seen == [("Low", "High"), ("High", "Medium")]
+    assert db.commits == 1
+    assert db.collection("stats").document("Medium").get().exists
+
+
+def test_rejects_writes_after_close():
+    writer = BatchWriter(FakeFirestore())
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.set(doc(FakeFirestore(), "P1"), {})
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+
+from http_client import CircuitBreaker, CircuitOpenError, HttpClient
+
+requests = pytest.importorskip("requests")
+from overpass_stub import OverpassStub  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    server = OverpassStub().start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_opens_for_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.15)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one probe at a time
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.1)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.allow()
+    breaker.record_failure()  # One failed probe is enough
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_client_retries_then_short_circuits(stub):
+    stub.error_rate = 1.0
+    client = HttpClient("stub", max_retries=2, backoff=0.001,
+                        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    try:
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.HTTPError):
+                client.get(stub.url)
+        assert stub.stats()["requests"] == 6  # Two calls, each tried three times
+        assert client.breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError):
+            client.get(stub.url)
+        assert stub.stats()["requests"] == 6  # Fails fast without the network
+        assert client.stats()["short_circuits"] == 1
+    finally:
+        client.close()
+
+
+def test_client_recovers_through_half_open_probe(stub):
+    stub.error_rate = 1.0
+    client = HttpClient("stub", max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.1))
+    try:
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.get(stub.url)
+        stub.error_rate = 0.0
+        time.sleep(0.15)
+        response = client.get(stub.url, params={"data": "around:100,1.0,2.0"})
+        assert response.status_code == 200 and response.json()["elements"]
+        assert client.breaker.state == "closed"
+    finally:
+        client.close()
+
+
+def test_client_reuses_connections(stub):
+    client = HttpClient("stub")
+    try:
+        for _ in range(5):
+            client.get(stub.url).json()
+        assert client.connection_stats() == {"connections_opened": 1, "requests_sent": 5}
+        assert stub.stats()["connections"] == 1
+    finally:
+        client.close()
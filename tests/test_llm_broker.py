@@ -0,0 +1,179 @@
+import threading
+import time
+
+import pytest
+
+from llm_broker import LLMBroker
+
+
+class Recorder:
+    """generate/generate_batch that record calls and can be held open."""
+
+    def __init__(self):
+        self.calls = []
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, **params):
+        with self._lock:
+            self.calls.append(prompt)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.release.wait(5)
+        with self._lock:
+            self.running -= 1
+        return f"text:{prompt}"
+
+    def generate_batch(self, prompts, **params):
+        self.batches.append(list(prompts))
+        return [f"text:{prompt}" for prompt in prompts]
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+def test_identical_prompts_share_one_call(recorder):
+    recorder.release.clear()
+    broker = LLMBroker(recorder.generate, name="test-coalesce")
+    try:
+        first = broker.submit("same", max_tokens=5)
+        second = broker.submit("same", max_tokens=5)
+        other = broker.submit("same", max_tokens=6)  # Different parameters
+        assert first is second and first is not other
+        recorder.release.set()
+        assert first.result(5) == second.result(5) == "text:same"
+        other.result(5)
+        assert recorder.calls.count("same") == 2
+        assert broker.stats()["coalesced"] == 1
+    finally:
+        broker.close()
+
+
+def test_high_priority_skips_queued_requests(recorder):
+    recorder.release.clear()
+    broker = LLMBroker(recorder.generate, max_concurrency=1, name="test-priority")
+    try:
+        blocker = broker.submit("blocker")
+        while not recorder.calls:
+            time.sleep(0.001)
+        routine = [broker.submit(f"routine-{i}") for i in range(3)]
+        urgent = broker.submit("urgent", priority=True)
+        stats = broker.stats()
+        assert stats["running"] == 1
+        assert (stats["queued_normal"], stats["queued_high"]) == (3, 1)
+
+        recorder.release.set()
+        for future in [blocker, urgent, *routine]:
+            future.result(5)
+        assert recorder.calls[:2] == ["blocker", "urgent"]
+    finally:
+        broker.close()
+
+
+def test_priority_submit_promotes_a_queued_duplicate(recorder):
+    recorder.release.clear()
+    broker = LLMBroker(recorder.generate, max_concurrency=1, name="test-promote")
+    try:
+        broker.submit("blocker")
+        while not recorder.calls:
+            time.sleep(0.001)
+        broker.submit("routine")
+        shared = broker.submit("shared")
+        assert broker.submit("shared", priority=True) is shared
+        recorder.release.set()
+        shared.result(5)
+        assert recorder.calls[1] == "shared"
+    finally:
+        broker.close()
+
+
+def test_concurrency_is_bounded(recorder):
+    broker = LLMBroker(recorder.generate, max_concurrency=2, name="test-bounded")
+    try:
+        recorder.release.clear()
+        futures = [broker.submit(f"p{i}") for i in range(6)]
+        time.sleep(0.05)
+        assert broker.stats()["running"] == 2
+        assert broker.stats()["queued_normal"] == 4
+        recorder.release.set()
+        for future in futures:
+            future.result(5)
+        assert recorder.peak == 2
+    finally:
+        broker.close()
+
+
+def test_rate_limit_spaces_calls(recorder):
+    broker = LLMBroker(recorder.generate, rate=20, burst=1, reserve=0, name="test-rate")
+    try:
+        start = time.monotonic()
+        for future in [broker.submit(f"p{i}") for i in range(5)]:
+            future.result(5)
+        # One token up front, then one every 50 ms
+        assert time.monotonic() - start >= 0.18
+        assert broker.stats()["throttled"] > 0
+    finally:
+        broker.close()
+
+
+def test_reserve_is_kept_for_high_priority(recorder):
+    broker = LLMBroker(recorder.generate, rate=2, burst=3, reserve=2, name="test-reserve")
+    try:
+        first = broker.submit("routine-1")
+        first.result(5)
+        second = broker.submit("routine-2")  # Would dip into the reserve
+        urgent = broker.submit("urgent", priority=True)
+        assert urgent.result(5) == "text:urgent"
+        assert not second.done()
+        assert second.result(5) == "text:routine-2"  # Once the bucket refills
+    finally:
+        broker.close()
+
+
+def test_requests_in_window_are_batched(recorder):
+    broker = LLMBroker(recorder.generate, recorder.generate_batch, batch_window=0.05, name="test-batch")
+    try:
+        futures = [broker.submit(f"p{i}", max_tokens=5) for i in range(4)]
+        assert [future.result(5) for future in futures] == [f"text:p{i}" for i in range(4)]
+        assert recorder.batches == [["p0", "p1", "p2", "p3"]]
+        assert broker.stats()["api_calls"] == 1
+    finally:
+        broker.close()
+
+
+def test_batching_follows_availability_probe(recorder):
+    available = []
+    broker = LLMBroker(recorder.generate, recorder.generate_batch, batch_window=0.05,
+                       batch_available=lambda: bool(available), name="test-probe")
+    try:
+        for future in [broker.submit(f"a{i}") for i in range(3)]:
+            future.result(5)
+        assert not recorder.batches and len(recorder.calls) == 3
+
+        available.append(True)  # e.g. a client with batch_generate installed later
+        for future in [broker.submit(f"b{i}") for i in range(3)]:
+            future.result(5)
+        assert recorder.batches == [["b0", "b1", "b2"]]
+    finally:
+        broker.close()
+
+
+def test_errors_reach_every_waiting_caller():
+    def generate(prompt, **params):
+        raise ValueError("bad prompt")
+
+    broker = LLMBroker(generate, name="test-errors")
+    try:
+        future = broker.submit("x")
+        with pytest.raises(ValueError):
+            future.result(5)
+        with pytest.raises(ValueError):
+            broker.generate("y", timeout=5)
+    finally:
+        broker.close()
@@ -0,0 +1,121 @@
+import math
+import operator
+
+from symptom_lexicon import lexicon
+
+# Declarative triage rules shared by the backend flow, the dashboard intake form
+# and the rescore backfill. A rule fires when any of its symptoms is present or
+# any of its vitals conditions holds; a patient gets the highest score of the
+# rules that fire, or DEFAULT_SCORE when none do. Symptoms are canonical codes
+# from symptom_lexicon, so spellings, synonyms and abbreviations all match.
+DEFAULT_SCORE = 0.5
+
+RULES = [
+    {
+        "name": "high_priority_symptoms",
+        "score": 0.9,
+        "symptoms": ["chest pain", "chest tightness", "difficulty breathing", "shortness of breath"],
+    },
+    {
+        "name": "critical_vitals",
+        "score": 0.9,
+        "vitals": [("temperature", ">", 39.0), ("heart_rate", ">", 120), ("oxygen_saturation", "<", 90)],
+    },
+    {
+        "name": "abnormal_vitals",
+        "score": 0.7,
+        "vitals": [("temperature", ">", 38.0), ("heart_rate", ">", 100), ("oxygen_saturation", "<", 95)],
+    },
+]
+
+_OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+def _number(value):
+    # Vitals arrive as numbers or form strings; anything unparseable is NaN,
+    # which never satisfies a threshold
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return number
+
+
+class TriageRuleEngine:
+    """Rules compiled once into lookup tables for scalar and columnar scoring."""
+
+    def __init__(self, rules=RULES, default_score=DEFAULT_SCORE):
+        self.default_score = default_score
+        # Highest score first so scalar scoring can stop at the first match
+        self.rules = sorted(rules, key=lambda rule: rule["score"], reverse=True)
+        self._compiled = [
+            (
+                rule["score"],
+                frozenset(lexicon.canonical(rule.get("symptoms", []))),
+                tuple((field, _OPERATORS[op], threshold) for field, op, threshold in rule.get("vitals", [])),
+            )
+            for rule in self.rules
+        ]
+        self.symptom_rules = [i for i, (_, symptoms, _) in enumerate(self._compiled) if symptoms]
+        self._symptom_column = {rule: col for col, rule in enumerate(self.symptom_rules)}
+        self.vital_fields = sorted({field for _, _, conditions in self._compiled for field, _, _ in conditions})
+
+    def score(self, symptoms, vitals=None):
+        # Score one patient from its raw symptom list and vitals dict
+        vitals = vitals or {}
+        codes = None
+        for score, symptom_set, conditions in self._compiled:
+            if score <= self.default_score:
+                break
+            if symptom_set:
+                if codes is None:
+                    codes = lexicon.codes(symptoms)
+                if not symptom_set.isdisjoint(codes):
+                    return score
+            for field, compare, threshold in conditions:
+                if compare(_number(vitals.get(field)), threshold):
+                    return score
+        return self.default_score
+
+    def score_patient(self, patient):
+        return self.score(patient.get("symptoms"), patient.get("vitals"))
+
+    def columns(self, patients):
+        # Columnar view of a batch of patients: one bool column per symptom
+        # rule and one float column (NaN when missing) per vitals field
+        import numpy as np
+
+        patients = list(patients)
+        flags = np.zeros((len(patients), len(self.symptom_rules)), dtype=bool)
+        vitals = {field: np.full(len(patients), np.nan) for field in self.vital_fields}
+        for row, patient in enumerate(patients):
+            codes = lexicon.codes(patient.get("symptoms"))
+            for col, rule in enumerate(self.symptom_rules):
+                flags[row, col] = not self._compiled[rule][1].isdisjoint(codes)
+            patient_vitals = patient.get("vitals") or {}
+            for field, column in vitals.items():
+                column[row] = _number(patient_vitals.get(field))
+        return flags, vitals
+
+    def score_columns(self, symptom_flags, vitals):
+        # Vectorized scoring over columns produced by columns()
+        import numpy as np
+
+        n = symptom_flags.shape[0]
+        scores = np.full(n, self.default_score)
+        with np.errstate(invalid="ignore"):
+            for index, (score, symptom_set, conditions) in enumerate(self._compiled):
+                fired = np.zeros(n, dtype=bool)
+                if symptom_set:
+                    fired |= symptom_flags[:, self._symptom_column[index]]
+                for field, compare, threshold in conditions:
+                    fired |= compare(vitals[field], threshold)
+                np.maximum(scores, np.where(fired, score, self.default_score), out=scores)
+        return scores
+
+    def score_many(self, patients):
+        return self.score_columns(*self.columns(patients))
+
+
+# Shared compiled engine
+engine = TriageRuleEngine()
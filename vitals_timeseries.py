@@ -0,0 +1,445 @@
+"""Vitals time series: ring-buffered readings, multi-resolution rollups, chunked persistence.
+
+Readings are kept per patient in fixed-size NumPy ring buffers and downsampled
+into 1 s, 1 min and 15 min rollups (count, sum, min and max per field). Each
+rollup feeds the next coarser one only when a bucket closes, so a reading
+costs one ring write and one 1 s bucket update however many resolutions there are.
+
+Closed buckets are persisted as compacted chunk documents in ``vitals_series``
+(one per patient, resolution and fixed time span, with a deterministic ID),
+so a chart reads a handful of pre-aggregated documents instead of one per reading.
+
+    python vitals_timeseries.py readings.jsonl.gz   # {"patient_id", "timestamp", "vitals"} per line
+"""
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from alert_engine import event_time, readings
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("heart_rate", "oxygen_saturation", "temperature", "systolic", "diastolic")
+COLLECTION = "vitals_series"
+
+# name: (bucket seconds, buckets kept in memory, buckets per persisted chunk)
+RESOLUTIONS = {
+    "1s": (1, 900, 300),      # 15 min in memory, 5 min chunks
+    "1m": (60, 720, 360),     # 12 h in memory, 6 h chunks
+    "15m": (900, 672, 96),    # 7 days in memory, 1 day chunks
+}
+
+
+def chunk_id(patient_id, resolution, chunk):
+    return f"{patient_id}_{resolution}_{chunk}"
+
+
+def vector(vitals):
+    # Vitals dict -> float array in FIELDS order, NaN where missing
+    import numpy as np
+
+    values = readings(vitals)
+    return np.array([values.get(field, np.nan) for field in FIELDS], dtype=np.float64)
+
+
+class _Ring:
+    """Fixed-capacity ring of raw (time, values) readings."""
+
+    __slots__ = ("times", "values", "head", "size")
+
+    def __init__(self, capacity, width):
+        import numpy as np
+
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((capacity, width), np.nan, dtype=np.float32)
+        self.head = 0
+        self.size = 0
+
+    def extend(self, times, values):
+        capacity = len(self.times)
+        if len(times) > capacity:
+            times, values = times[-capacity:], values[-capacity:]
+        n = len(times)
+        first = min(n, capacity - self.head)
+        self.times[self.head:self.head + first] = times[:first]
+        self.values[self.head:self.head + first] = values[:first]
+        self.times[:n - first] = times[first:]
+        self.values[:n - first] = values[first:]
+        self.head = (self.head + n) % capacity
+        self.size = min(self.size + n, capacity)
+
+    def ordered(self):
+        # Oldest first
+        import numpy as np
+
+        if self.size < len(self.times):
+            return self.times[:self.size], self.values[:self.size]
+        order = np.r_[self.head:len(self.times), 0:self.head]
+        return self.times[order], self.values[order]
+
+
+class _Rollup:
+    """Aggregates for one resolution: an open bucket plus a ring of closed ones."""
+
+    __slots__ = ("name", "seconds", "chunk_buckets", "index", "count", "total", "low", "high", "head", "size",
+                 "open_index", "open_count", "open_total", "open_low", "open_high", "dirty", "late")
+
+    def __init__(self, name, seconds, capacity, chunk_buckets, width):
+        import numpy as np
+
+        self.name = name
+        self.seconds = seconds
+        self.chunk_buckets = chunk_buckets
+        self.index = np.full(capacity, -1, dtype=np.int64)
+        self.count = np.zeros((capacity, width), dtype=np.int32)
+        self.total = np.zeros((capacity, width), dtype=np.float32)
+        self.low = np.full((capacity, width), np.nan, dtype=np.float32)
+        self.high = np.full((capacity, width), np.nan, dtype=np.float32)
+        self.head = 0
+        self.size = 0
+        self.open_index = None
+        self.open_count = np.zeros(width, dtype=np.int64)
+        self.open_total = np.zeros(width, dtype=np.float64)
+        self.open_low = np.full(width, np.nan)
+        self.open_high = np.full(width, np.nan)
+        self.dirty = set()  # Chunks with closed buckets not yet persisted
+        self.late = 0
+
+    def merge(self, index, count, total, low, high):
+        """Fold aggregates for bucket `index` in; returns the bucket it closed, if any."""
+        import numpy as np
+
+        closed = None
+        if self.open_index is None:
+            self.open_index = index
+        elif index > self.open_index:
+            closed = self.close()
+            self.open_index = index
+        elif index < self.open_index:
+            self.late += 1  # Its bucket has already closed
+            return None
+        self.open_count += count
+        self.open_total += total
+        np.fmin(self.open_low, low, out=self.open_low)  # fmin/fmax skip NaN
+        np.fmax(self.open_high, high, out=self.open_high)
+        return closed
+
+    def close(self):
+        # Move the open bucket into the ring; returns its aggregates for the next resolution
+        if self.open_index is None:
+            return None
+        slot = self.head
+        self.index[slot] = self.open_index
+        self.count[slot] = self.open_count
+        self.total[slot] = self.open_total
+        self.low[slot] = self.open_low
+        self.high[slot] = self.open_high
+        self.head = (self.head + 1) % len(self.index)
+        self.size = min(self.size + 1, len(self.index))
+        self.dirty.add(self.open_index // self.chunk_buckets)
+        closed = (self.open_index * self.seconds, self.count[slot].copy(), self.total[slot].astype("float64"),
+                  self.low[slot].astype("float64"), self.high[slot].astype("float64"))
+        self.open_index = None
+        self.open_count[:] = 0
+        self.open_total[:] = 0
+        self.open_low[:] = float("nan")
+        self.open_high[:] = float("nan")
+        return closed
+
+    def rows(self, include_open=True):
+        # Closed buckets oldest first, plus the open one: (index, count, total, low, high)
+        import numpy as np
+
+        capacity = len(self.index)
+        order = np.arange(self.size) if self.size < capacity else np.r_[self.head:capacity, 0:self.head]
+        columns = [self.index[order], self.count[order], self.total[order], self.low[order], self.high[order]]
+        if include_open and self.open_index is not None:
+            extra = (self.open_index, self.open_count, self.open_total, self.open_low, self.open_high)
+            columns = [np.concatenate([column, np.asarray(value, dtype=column.dtype)[None]])
+                       for column, value in zip(columns, extra)]
+        return columns
+
+
+class VitalsSeries:
+    """Raw readings and rollups for one patient."""
+
+    def __init__(self, patient_id, raw_capacity=1024, resolutions=RESOLUTIONS):
+        self.patient_id = patient_id
+        self.raw = _Ring(raw_capacity, len(FIELDS))
+        self.rollups = [_Rollup(name, seconds, capacity, chunk, len(FIELDS))
+                        for name, (seconds, capacity, chunk) in resolutions.items()]
+        self.last_time = None
+
+    def append(self, t, values):
+        import numpy as np
+
+        self.extend(np.array([t], dtype=np.float64), np.asarray(values, dtype=np.float64)[None])
+
+    def extend(self, times, values):
+        """Add readings (times in epoch seconds, values shaped (n, len(FIELDS))).
+
+        Readings in the same second are aggregated with one vectorized pass, so
+        a burst from a high-rate wearable costs per second rather than per reading.
+        """
+        import numpy as np
+
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(times), len(FIELDS))
+        if not len(times):
+            return
+        if np.any(np.diff(times) < 0):
+            order = np.argsort(times, kind="stable")
+            times, values = times[order], values[order]
+        self.raw.extend(times, values)
+        self.last_time = times[-1] if self.last_time is None else max(self.last_time, times[-1])
+
+        first = self.rollups[0]
+        present = ~np.isnan(values)
+        if len(times) == 1:
+            # Single reading (the common streaming case): skip the grouping pass
+            value = values[0]
+            self._cascade(0, int(times[0] // first.seconds), present[0], np.where(present[0], value, 0.0),
+                          value, value)
+            return
+        buckets = (times // first.seconds).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        count = np.add.reduceat(present.astype(np.int64), starts)
+        total = np.add.reduceat(np.where(present, values, 0.0), starts)
+        with np.errstate(invalid="ignore"):
+            low = np.fmin.reduceat(values, starts)
+            high = np.fmax.reduceat(values, starts)
+        for i, start in enumerate(starts):
+            self._cascade(0, buckets[start], count[i], total[i], low[i], high[i])
+
+    def _cascade(self, level, index, count, total, low, high):
+        closed = self.rollups[level].merge(index, count, total, low, high)
+        if closed is not None and level + 1 < len(self.rollups):
+            start, *aggregates = closed
+            self._cascade(level + 1, int(start // self.rollups[level + 1].seconds), *aggregates)
+
+    def close(self):
+        # Close every open bucket (e.g. at shutdown) so it gets persisted
+        for level, rollup in enumerate(self.rollups):
+            closed = rollup.close()
+            if closed is not None and level + 1 < len(self.rollups):
+                # Through _cascade, so a bucket this merge closes moves up too
+                start, *aggregates = closed
+                self._cascade(level + 1, int(start // self.rollups[level + 1].seconds), *aggregates)
+
+    def rollup(self, resolution):
+        for rollup in self.rollups:
+            if rollup.name == resolution:
+                return rollup
+        raise KeyError(f"Unknown resolution: {resolution}")
+
+    def series(self, resolution="1m", include_open=True):
+        """Pre-aggregated series: {"times", "count", "mean", "min", "max"}, per field, oldest first."""
+        import numpy as np
+
+        rollup = self.rollup(resolution)
+        index, count, total, low, high = rollup.rows(include_open)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+        return {
+            "times": index * rollup.seconds,
+            **{stat: {field: column[:, i] for i, field in enumerate(FIELDS)}
+               for stat, column in (("count", count), ("mean", mean), ("min", low), ("max", high))},
+        }
+
+    def recent(self, seconds=None):
+        # Raw readings, oldest first, optionally only the last `seconds`
+        times, values = self.raw.ordered()
+        if seconds is not None and len(times):
+            keep = times >= times[-1] - seconds
+            times, values = times[keep], values[keep]
+        return times, values
+
+    def chunk(self, resolution, chunk):
+        """Document for one persisted chunk: per-field arrays of closed buckets in its span."""
+        import numpy as np
+
+        rollup = self.rollup(resolution)
+        index, count, total, low, high = rollup.rows(include_open=False)
+        keep = index // rollup.chunk_buckets == chunk
+        index, count, total, low, high = index[keep], count[keep], total[keep], low[keep], high[keep]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+
+        def column(values, i, digits):
+            return [None if n == 0 else round(float(v), digits) for v, n in zip(values[:, i], count[:, i])]
+
+        return {
+            "patient_id": self.patient_id,
+            "resolution": resolution,
+            "seconds": rollup.seconds,
+            "chunk": int(chunk),
+            "start": datetime.fromtimestamp(chunk * rollup.chunk_buckets * rollup.seconds).isoformat(),
+            "times": [int(i) * rollup.seconds for i in index],
+            "count": {field: count[:, i].tolist() for i, field in enumerate(FIELDS)},
+            "mean": {field: column(mean, i, 2) for i, field in enumerate(FIELDS)},
+            "min": {field: column(low, i, 1) for i, field in enumerate(FIELDS)},
+            "max": {field: column(high, i, 1) for i, field in enumerate(FIELDS)},
+            "last_updated": datetime.now().isoformat(),
+        }
+
+    def memory_usage(self):
+        arrays = [self.raw.times, self.raw.values]
+        for rollup in self.rollups:
+            arrays += [rollup.index, rollup.count, rollup.total, rollup.low, rollup.high]
+        return sum(array.nbytes for array in arrays)
+
+
+class VitalsStore:
+    """Per-patient VitalsSeries, persisted as chunk documents through a BatchWriter.
+
+    A chunk is written once its span has ended (while it is still fully in
+    memory); ``flush()`` also writes partial chunks, which are overwritten in
+    place as they fill up. Without a writer the store is memory-only.
+    """
+
+    def __init__(self, writer=None, db=None, collection=COLLECTION, raw_capacity=1024, resolutions=RESOLUTIONS):
+        self.writer = writer
+        self.collection = db.collection(collection) if db is not None else None
+        self.raw_capacity = raw_capacity
+        self.resolutions = resolutions
+        self.readings = 0
+        self.chunks_written = 0
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def get(self, patient_id):
+        return self._series.get(patient_id)
+
+    def _patient(self, patient_id):
+        series = self._series.get(patient_id)
+        if series is None:
+            series = self._series[patient_id] = VitalsSeries(patient_id, self.raw_capacity, self.resolutions)
+        return series
+
+    def ingest(self, patient_id, vitals, timestamp=None):
+        """Record one reading (a vitals dict, as stored on patient documents)."""
+        import numpy as np
+
+        values = vector(vitals)
+        with self._lock:
+            series = self._patient(patient_id)
+            series.extend(np.array([event_time(timestamp)]), values[None])
+            self.readings += 1
+            self._write_completed(series)
+
+    def ingest_many(self, patient_id, times, values):
+        """Record a burst of readings: epoch times and an (n, len(FIELDS)) array in FIELDS order."""
+        with self._lock:
+            series = self._patient(patient_id)
+            series.extend(times, values)
+            self.readings += len(times)
+            self._write_completed(series)
+
+    def _write_completed(self, series):
+        # Persist chunks whose span ended, i.e. the open bucket has moved past them
+        for rollup in series.rollups:
+            if rollup.open_index is None:
+                continue
+            current = rollup.open_index // rollup.chunk_buckets
+            done = [chunk for chunk in rollup.dirty if chunk < current]
+            for chunk in done:
+                self._write(series, rollup, chunk)
+
+    def _write(self, series, rollup, chunk):
+        rollup.dirty.discard(chunk)
+        if self.writer is None:
+            return
+        doc = series.chunk(rollup.name, chunk)
+        self.writer.set(self.collection.document(chunk_id(series.patient_id, rollup.name, chunk)), doc)
+        self.chunks_written += 1
+
+    def flush(self, close=False):
+        """Write every dirty chunk; with close=True open buckets are closed first."""
+        with self._lock:
+            for series in self._series.values():
+                if close:
+                    series.close()
+                for rollup in series.rollups:
+                    for chunk in sorted(rollup.dirty):
+                        self._write(series, rollup, chunk)
+        if self.writer is not None:
+            self.writer.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "patients": len(self._series),
+                "readings": self.readings,
+                "chunks_written": self.chunks_written,
+                "late": sum(rollup.late for series in self._series.values() for rollup in series.rollups),
+                "memory_bytes": sum(series.memory_usage() for series in self._series.values()),
+            }
+
+
+def load_series(db, patient_id, resolution="1m", span=6 * 3600, end=None, collection=COLLECTION):
+    """Read a persisted series for the last `span` seconds.
+
+    Chunk IDs are derived from the time range, so this is one batched read of
+    at most span / chunk length + 1 documents, with no query or index needed.
+    Returns {"times": [...], "mean"/"min"/"max"/"count": {field: [...]}}, oldest first.
+    """
+    seconds, _, chunk_buckets = RESOLUTIONS[resolution]
+    end = time.time() if end is None else end
+    first = int((end - span) // seconds) // chunk_buckets
+    last = int(end // seconds) // chunk_buckets
+    refs = [db.collection(collection).document(chunk_id(patient_id, resolution, chunk))
+            for chunk in range(first, last + 1)]
+    docs = sorted((snapshot.to_dict() for snapshot in db.get_all(refs) if snapshot.exists),
+                  key=lambda doc: doc["chunk"])
+
+    result = {"times": [], **{stat: {field: [] for field in FIELDS} for stat in ("count", "mean", "min", "max")}}
+    for doc in docs:
+        keep = [i for i, t in enumerate(doc["times"]) if end - span <= t <= end]
+        result["times"].extend(doc["times"][i] for i in keep)
+        for stat in ("count", "mean", "min", "max"):
+            for field in FIELDS:
+                values = doc[stat].get(field, [])
+                result[stat][field].extend(values[i] for i in keep)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest vitals readings into time-series chunks.")
+    parser.add_argument("input", help="Readings as JSONL (.gz or - for stdin)")
+    parser.add_argument("--dry-run", action="store_true", help="Aggregate without writing chunks")
+    args = parser.parse_args(argv)
+
+    import json
+    from dotenv import load_dotenv
+    from clients import get_db
+    from batch_writer import BatchWriter
+    from ingest import open_input
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    writer = None if args.dry_run else BatchWriter(get_db())
+    store = VitalsStore(writer, None if args.dry_run else get_db())
+
+    start = time.perf_counter()
+    try:
+        with open_input(args.input) as lines:
+            for line in lines:
+                if line.strip():
+                    event = json.loads(line)
+                    store.ingest(event["patient_id"], event.get("vitals"), event.get("timestamp"))
+        store.flush(close=True)
+    finally:
+        if writer is not None:
+            writer.close()
+    elapsed = time.perf_counter() - start
+    stats = store.stats()
+    print(f"{stats['readings']} readings for {stats['patients']} patients, {stats['chunks_written']} chunks "
+          f"written in {elapsed:.1f}s ({stats['readings'] / elapsed if elapsed else 0:.0f} readings/s)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()